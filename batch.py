@@ -0,0 +1,221 @@
+"""
+Batch Module
+Applies sell, restock and add transactions from a CSV or JSONL file without prompts.
+
+Each record has an "op" field and the same fields the menu asks for:
+    sell     name, quantity, customer
+    restock  name, quantity, supplier
+    add      name, brand, quantity, cost_price, origin, supplier
+
+JSONL files hold one JSON object per line. CSV files need a header row using
+the field names above; unused columns can be left empty.
+"""
+
+import csv
+import json
+import time
+
+import metrics
+import operation
+from operation import sell_product, restock_product, add_new_product
+from validation import check_digit_, validate_text, validate_positive_int
+
+
+def read_transactions(path):
+    """
+    Stream transaction records from a CSV or JSONL file.
+
+    Args:
+        path (str): Name of the transaction file
+
+    Yields:
+        tuple: (line_number, record) - record is None if the line could not be parsed
+    """
+    with open(path, 'r', newline='') as file:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                record = None
+            yield line_number, record
+
+
+def _text(record, key):
+    """
+    Read a text field from a record, treating missing values as empty.
+
+    Args:
+        record (dict): Transaction record
+        key (str): Field name
+
+    Returns:
+        str: The stripped value
+    """
+    value = record.get(key)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def validate_transaction(catalog, record):
+    """
+    Check a transaction with the same rules as the interactive menu.
+
+    Args:
+        catalog (ProductCatalog): Catalog containing product information
+        record (dict): Transaction record
+
+    Returns:
+        tuple: (str, str) - The operation name and an error message, or None if valid
+    """
+    op = _text(record, 'op').lower()
+    name = _text(record, 'name')
+
+    if op == 'sell':
+        if check_digit_(name):
+            return op, "Product name cannot be just numbers."
+        product = catalog.get(name)
+        if product is None:
+            return op, "Product not found."
+        quantity, error = validate_positive_int(record.get('quantity'), "quantity")
+        if error:
+            return op, error
+        free_items = catalog.sale_terms(catalog.row_of(name), quantity)[0]
+        if product['quantity'] < quantity + free_items:
+            return op, "Insufficient stock (including free items). Available: " + str(product['quantity'])
+        return op, validate_text(_text(record, 'customer'), "Customer name")
+
+    if op == 'restock':
+        if check_digit_(name):
+            return op, "Product name cannot be numbers."
+        if not catalog.contains(name):
+            return op, "Product not found."
+        quantity, error = validate_positive_int(record.get('quantity'), "quantity")
+        if error:
+            return op, error
+        return op, validate_text(_text(record, 'supplier'), "Supplier name")
+
+    if op == 'add':
+        error = validate_text(name, "Product name")
+        if error:
+            return op, error
+        if catalog.contains(name):
+            return op, "Product already exists. Use restock option instead."
+        error = validate_text(_text(record, 'brand'), "Brand name")
+        if error:
+            return op, error
+        quantity, error = validate_positive_int(record.get('quantity'), "quantity")
+        if error:
+            return op, error
+        cost_price, error = validate_positive_int(record.get('cost_price'), "cost price")
+        if error:
+            return op, error
+        error = validate_text(_text(record, 'origin'), "Country of origin")
+        if error:
+            return op, error
+        return op, validate_text(_text(record, 'supplier'), "Supplier name")
+
+    return op, "Unknown operation '" + op + "'."
+
+
+def apply_transaction(catalog, op, record):
+    """
+    Apply a validated transaction to the catalog.
+
+    Args:
+        catalog (ProductCatalog): Catalog containing product information
+        op (str): 'sell', 'restock' or 'add'
+        record (dict): Transaction record
+
+    Returns:
+        bool: True if the transaction was applied
+    """
+    name = _text(record, 'name')
+    quantity = int(record['quantity'])
+    if op == 'sell':
+        success, catalog = sell_product(catalog, name, quantity, _text(record, 'customer'))
+    elif op == 'restock':
+        success, catalog = restock_product(catalog, name, quantity, _text(record, 'supplier'))
+    else:
+        success, catalog = add_new_product(catalog, name, _text(record, 'brand'), quantity,
+                                           int(record['cost_price']), _text(record, 'origin'),
+                                           _text(record, 'supplier'))
+    return success
+
+
+def run_batch(store, path, checkpoint=0):
+    """
+    Apply every transaction in a file and print a throughput summary.
+
+    Each checkpoint is one store transaction, so other tills wait for the
+    products lock while a checkpoint's worth of records is applied, and see
+    all of them at once when it is saved.
+
+    Args:
+        store (CatalogStore): Opened products store
+        path (str): Name of the CSV or JSONL transaction file
+        checkpoint (int): Save after this many applied transactions (0 saves only at the end)
+
+    Returns:
+        dict: Counts of applied and rejected transactions per operation
+    """
+    summary = {'applied': 0, 'rejected': 0, 'sell': 0, 'restock': 0, 'add': 0}
+    echo = operation.ECHO_INVOICES
+    operation.ECHO_INVOICES = False
+    start = time.perf_counter()
+    catalog = store.begin()
+    try:
+        for line_number, record in read_transactions(path):
+            if record is None:
+                error = "Could not parse record."
+                metrics.count('rejects')
+            else:
+                op, error = validate_transaction(catalog, record)
+                if error:
+                    metrics.count('rejects')
+                elif not apply_transaction(catalog, op, record):
+                    # The operation has counted the reject itself
+                    error = "Transaction failed."
+
+            if error:
+                summary['rejected'] += 1
+                print(f"Rejected line {line_number}: {error}")
+                continue
+
+            summary['applied'] += 1
+            summary[op] += 1
+            if checkpoint and summary['applied'] % checkpoint == 0:
+                if not store.commit():
+                    print(f"Warning: Checkpoint after line {line_number} could not be saved.")
+                catalog = store.begin()
+    except OSError as e:
+        print(f"Error reading transactions: {e}")
+    finally:
+        operation.ECHO_INVOICES = echo
+        saved = store.commit()
+
+    elapsed = time.perf_counter() - start
+    total = summary['applied'] + summary['rejected']
+    rate = total / elapsed if elapsed > 0 else 0.0
+
+    print("\nBatch Summary")
+    print("-" * 30)
+    print(f"Transactions:  {total}")
+    print(f"Applied:       {summary['applied']} "
+          f"(sell {summary['sell']}, restock {summary['restock']}, add {summary['add']})")
+    print(f"Rejected:      {summary['rejected']}")
+    print(f"Elapsed:       {elapsed:.3f} s")
+    print(f"Throughput:    {rate:.0f} transactions/sec")
+    if not saved:
+        print("Warning: Final changes could not be saved.")
+    return summary
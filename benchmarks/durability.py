@@ -0,0 +1,108 @@
+"""
+Durability Benchmark
+Measures transaction throughput and latency for each durability mode.
+
+Usage:
+    python benchmarks/durability.py [--rows 1000] [--transactions 2000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import ProductCatalog
+from write import update_product_file, Journal, DurabilityPolicy, DURABILITY_MODES
+
+
+def make_catalog(rows):
+    """
+    Build a synthetic catalog with the given number of products.
+
+    Args:
+        rows (int): Number of products
+
+    Returns:
+        ProductCatalog: The generated catalog
+    """
+    products = []
+    for i in range(rows):
+        products.append({
+            'name': 'Product ' + str(i),
+            'brand': 'Brand ' + str(i % 50),
+            'quantity': 1000000,
+            'cost_price': 100 + i % 900,
+            'origin': 'Country ' + str(i % 20),
+            'selling_price': (100 + i % 900) * 2
+        })
+    return ProductCatalog(products)
+
+
+def run(mode, rows, transactions, journal_mode=True):
+    """
+    Apply single-unit sales and save each one, timing every save.
+
+    Args:
+        mode (str): Durability mode
+        rows (int): Catalog size
+        transactions (int): Number of sales to apply
+        journal_mode (bool): Append to the journal instead of rewriting the file
+
+    Returns:
+        dict: Throughput and latency figures
+    """
+    catalog = make_catalog(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'products.txt')
+        update_product_file(catalog, filename)
+        journal = None
+        if journal_mode:
+            journal = Journal(os.path.join(directory, 'products.journal'),
+                              policy=DurabilityPolicy(mode))
+        latencies = []
+        start = time.perf_counter()
+        for i in range(transactions):
+            t0 = time.perf_counter()
+            catalog.adjust_quantity('Product ' + str(i % rows), -1)
+            changes = catalog.take_changes()
+            if journal is None:
+                update_product_file(catalog, filename, fsync=mode != 'buffered')
+            else:
+                journal.append(changes)
+                if journal.needs_compaction():
+                    journal.compact(catalog, filename)
+            latencies.append(time.perf_counter() - t0)
+        if journal is not None:
+            journal.close()
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'tps': transactions / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'storage':<14}{'mode':<10}{'txn/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for journal_mode in (True, False):
+        for mode in DURABILITY_MODES:
+            if not journal_mode and mode == 'group':
+                continue  # Group commit only applies to journal appends
+            result = run(mode, args.rows, args.transactions, journal_mode)
+            storage = 'journal' if journal_mode else 'full rewrite'
+            print(f"{storage:<14}{mode:<10}{result['tps']:>10.0f}"
+                  f"{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""
+HTTP Load Test
+Drives the catalog service (python main.py --serve) with many keep-alive
+connections and reports throughput and latency per request type.
+
+Without --url a server is started on a generated catalog in a temporary
+directory, so nothing outside the benchmark is touched. With --url the load
+goes to an already running server; sell and restock requests change its
+products file and write invoices, so point it at a copy.
+
+Request types for --mix:
+    get      GET  /products/<name>
+    list     GET  /products?page=N
+    search   GET  /search?q=<start of a name>
+    sell     POST /sell      one unit
+    restock  POST /restock   ten units
+
+Usage:
+    python benchmarks/http_load.py [--rows 1000] [--connections 50] [--duration 10]
+        [--mix get=60,list=5,search=10,sell=20,restock=5] [--url http://127.0.0.1:8080]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import ProductCatalog
+from write import update_product_file
+
+DEFAULT_MIX = 'get=60,list=5,search=10,sell=20,restock=5'
+
+
+def _letters(number):
+    """
+    Spell a number in letters, e.g. 0 -> 'a', 27 -> 'bb', since names
+    containing digits are rejected by the sell and restock rules.
+
+    Args:
+        number (int): Number to spell
+
+    Returns:
+        str: The letters
+    """
+    text = ''
+    while True:
+        number, digit = divmod(number, 26)
+        text = chr(ord('a') + digit) + text
+        if not number:
+            return text
+
+
+def make_catalog(rows):
+    """
+    Build a synthetic catalog with plenty of stock for every product.
+
+    Args:
+        rows (int): Number of products
+
+    Returns:
+        ProductCatalog: The generated catalog
+    """
+    products = []
+    for i in range(rows):
+        products.append({
+            'name': 'Product ' + _letters(i),
+            'brand': 'Brand ' + _letters(i % 50),
+            'quantity': 1000000,
+            'cost_price': 100 + i % 900,
+            'origin': 'Country ' + _letters(i % 20),
+            'selling_price': (100 + i % 900) * 2
+        })
+    return ProductCatalog(products)
+
+
+def parse_mix(text):
+    """
+    Parse a request mix such as "get=80,sell=20".
+
+    Args:
+        text (str): Comma separated type=weight pairs
+
+    Returns:
+        dict: Weight per request type
+    """
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in REQUESTS:
+            raise ValueError("unknown request type '" + kind + "'")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def _get(path, host):
+    return ('GET ' + path + ' HTTP/1.1\r\nHost: ' + host + '\r\n\r\n').encode('utf-8')
+
+
+def _post(path, host, body):
+    data = json.dumps(body).encode('utf-8')
+    return (('POST ' + path + ' HTTP/1.1\r\nHost: ' + host + '\r\nContent-Type: application/json\r\n'
+             'Content-Length: ' + str(len(data)) + '\r\n\r\n').encode('utf-8') + data)
+
+
+# Builders of each request type from a product name
+REQUESTS = {
+    'get': lambda name, host: _get('/products/' + quote(name), host),
+    'list': lambda name, host: _get('/products?page=' + str(random.randint(1, 10)), host),
+    'search': lambda name, host: _get('/search?q=' + quote(name[:4]), host),
+    'sell': lambda name, host: _post('/sell', host, {'name': name, 'quantity': 1,
+                                                     'customer': 'Load Test'}),
+    'restock': lambda name, host: _post('/restock', host, {'name': name, 'quantity': 10,
+                                                           'supplier': 'Load Supplier'}),
+}
+
+
+async def request(reader, writer, data):
+    """
+    Send one request on a keep-alive connection and read the response.
+
+    Args:
+        reader (asyncio.StreamReader): Incoming side of the connection
+        writer (asyncio.StreamWriter): Outgoing side of the connection
+        data (bytes): Complete request
+
+    Returns:
+        tuple: (int, bytes) - Status code and response body
+    """
+    writer.write(data)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        if line[:15].lower() == b'content-length:':
+            length = int(line[15:])
+    return status, await reader.readexactly(length)
+
+
+async def fetch_names(host, port, limit=500):
+    """
+    Get product names to send requests for.
+
+    Args:
+        host (str): Server address
+        port (int): Server port
+        limit (int): Most names to fetch
+
+    Returns:
+        list: Product names
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, body = await request(reader, writer, _get('/products?page_size=' + str(limit), host))
+    finally:
+        writer.close()
+    return [product['name'] for product in json.loads(body)['products']]
+
+
+async def client(host, port, names, kinds, deadline, results):
+    """
+    Send requests one after another on one connection until the deadline.
+
+    Args:
+        host (str): Server address
+        port (int): Server port
+        names (list): Product names to pick from
+        kinds (list): Request types to pick from, repeated by weight
+        deadline (float): time.perf_counter() value at which to stop
+        results (dict): Latencies and status counts per request type, updated in place
+
+    Returns:
+        None
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    clock = time.perf_counter
+    try:
+        while clock() < deadline:
+            kind = random.choice(kinds)
+            data = REQUESTS[kind](random.choice(names), host)
+            start = clock()
+            status, _ = await request(reader, writer, data)
+            latencies, statuses = results[kind]
+            latencies.append(clock() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(host, port, connections, duration, mix):
+    """
+    Run the load test against a server.
+
+    Args:
+        host (str): Server address
+        port (int): Server port
+        connections (int): Number of concurrent keep-alive connections
+        duration (float): Seconds to send requests for
+        mix (dict): Weight per request type
+
+    Returns:
+        tuple: (dict, float) - Results per request type and elapsed seconds
+    """
+    names = await fetch_names(host, port)
+    kinds = [kind for kind, weight in mix.items() for _ in range(weight)]
+    results = {kind: ([], {}) for kind in mix}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, names, kinds, start + duration, results)
+                           for _ in range(connections)))
+    return results, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of already sorted values.
+
+    Args:
+        values (list): Sorted values
+        fraction (float): Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: The value at that percentile, 0.0 if there are none
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(results, elapsed):
+    """
+    Print throughput and latency per request type.
+
+    Args:
+        results (dict): Latencies and status counts per request type
+        elapsed (float): Seconds the load ran for
+
+    Returns:
+        None
+    """
+    total = sum(len(latencies) for latencies, statuses in results.values())
+    print(f"{'Request':<8} |{'Count':>9} |{'req/s':>9} |{'p50 ms':>8} |{'p99 ms':>8} |{'max ms':>8} | Statuses")
+    print("-" * 80)
+    for kind, (latencies, statuses) in results.items():
+        latencies.sort()
+        codes = ", ".join(f"{code}: {count}" for code, count in sorted(statuses.items()))
+        print(f"{kind:<8} |{len(latencies):>9} |{len(latencies) / elapsed:>9.0f} |"
+              f"{percentile(latencies, 0.5) * 1000:>8.2f} |{percentile(latencies, 0.99) * 1000:>8.2f} |"
+              f"{(latencies[-1] if latencies else 0) * 1000:>8.2f} | {codes}")
+    print("-" * 80)
+    print(f"Total: {total} requests in {elapsed:.2f} s = {total / elapsed:.0f} req/s")
+
+
+def start_server(directory, rows):
+    """
+    Start a catalog service on a generated catalog.
+
+    Args:
+        directory (str): Empty directory to run the server in
+        rows (int): Number of products to generate
+
+    Returns:
+        tuple: (subprocess.Popen, int) - The server process and its port
+    """
+    update_product_file(make_catalog(rows), os.path.join(directory, 'products.txt'))
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--serve',
+                               '127.0.0.1:' + str(port)], cwd=directory, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("server exited with status " + str(server.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', help="running server to test, e.g. http://127.0.0.1:8080")
+    parser.add_argument('--rows', type=int, default=1000,
+                        help="products in the generated catalog when no --url is given")
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="request type weights")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    if args.url:
+        url = urlsplit(args.url)
+        results, elapsed = asyncio.run(run(url.hostname, url.port or 80, args.connections,
+                                           args.duration, mix))
+        report(results, elapsed)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        server, port = start_server(directory, args.rows)
+        try:
+            print(f"Server: {args.rows} products, {args.connections} connections, {args.duration:g} s\n")
+            results, elapsed = asyncio.run(run('127.0.0.1', port, args.connections, args.duration, mix))
+        finally:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        report(results, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Invoice Render Benchmark
+Compares per-invoice render time of the old string concatenation builders
+with the precompiled layouts in invoice_render.py, and checks both produce
+the same text.
+
+Usage:
+    python benchmarks/invoice_render.py [--invoices 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_render import (render_sales_invoice, render_purchase_invoice,
+                            render_multi_purchase_invoice)
+
+VAT_RATE = 0.13
+SHOP_VAT_NUMBER = "NP12345678"
+DATE = "2026-10-17 10:30:00"
+PRODUCT = {'name': 'Vitamin C Serum', 'brand': 'Garnier', 'origin': 'France',
+           'cost_price': 1000, 'selling_price': 2000}
+
+
+def legacy_sales(product, quantity, free_items, total_price, invoice_number, customer_name):
+    """The sales invoice builder from generate_invoice before the renderer."""
+    datetime_str = DATE
+    vat_amount = total_price * VAT_RATE
+    total_with_vat = total_price + vat_amount
+    invoice = "\n=== WeCare SKINCARE SYSTEM ===\n"
+    invoice += "        SALES INVOICE\n"
+    invoice += "==============================\n\n"
+    invoice += "Invoice No: " + invoice_number + "\n"
+    invoice += "Date: " + datetime_str + "\n"
+    invoice += "VAT No: " + SHOP_VAT_NUMBER + "\n"
+    invoice += "Customer Name: " + customer_name + "\n\n"
+    invoice += "Product Details:\n"
+    invoice += "  Name: " + product['name'] + "\n"
+    invoice += "  Brand: " + product['brand'] + "\n"
+    invoice += "  Origin: " + product['origin'] + "\n"
+    invoice += "  Quantity Purchased: " + str(quantity) + "\n"
+    invoice += "  Free Items: " + str(free_items) + "\n"
+    invoice += "  Total Items: " + str(quantity + free_items) + "\n"
+    invoice += "  Price per item: Rs. " + str(product['selling_price']) + "\n"
+    invoice += "------------------------------\n"
+    invoice += "Subtotal: Rs. " + str(total_price) + "\n"
+    invoice += "VAT (" + str(int(VAT_RATE * 100)) + "%): Rs. " + str(round(vat_amount, 2)) + "\n"
+    invoice += "Total Amount: Rs. " + str(round(total_with_vat, 2)) + "\n"
+    if free_items > 0:
+        invoice += "\n*** Buy 3 Get 1 Free Applied! ***"
+    invoice += "\nThank you for choosing WeCare Skincare SYSTEM!\n"
+    invoice += "==============================\n"
+    return invoice
+
+
+def legacy_purchase(product, quantity, supplier_name, supplier_vat, invoice_number):
+    """The purchase invoice builder inlined in restock_product before the renderer."""
+    subtotal = quantity * product['cost_price']
+    vat_amount = subtotal * VAT_RATE
+    total_amount = subtotal + vat_amount
+    invoice = "\n=== WeCare Skincare SYSTEM ===\n"
+    invoice += "        PURCHASE INVOICE\n"
+    invoice += "==============================\n\n"
+    invoice += "Invoice No: " + invoice_number + "\n"
+    invoice += "Date: " + DATE + "\n"
+    invoice += "Supplier: " + supplier_name + "\n"
+    invoice += "Supplier VAT No: " + supplier_vat + "\n\n"
+    invoice += "Product Details:\n"
+    invoice += "  Name: " + product['name'] + "\n"
+    invoice += "  Brand: " + product['brand'] + "\n"
+    invoice += "  Origin: " + product['origin'] + "\n"
+    invoice += "  Quantity: " + str(quantity) + "\n"
+    invoice += "  Cost per item: Rs. " + str(product['cost_price']) + "\n"
+    invoice += "------------------------------\n"
+    invoice += "Subtotal: Rs. " + str(subtotal) + "\n"
+    invoice += "VAT (" + str(int(VAT_RATE * 100)) + "%): Rs. " + str(round(vat_amount, 2)) + "\n"
+    invoice += "Total Amount: Rs. " + str(round(total_amount, 2)) + "\n\n"
+    invoice += "==============================\n"
+    return invoice
+
+
+def legacy_multi_purchase(items, supplier_name, invoice_number):
+    """The builder from generate_purchase_invoice before the renderer."""
+    total_amount = 0
+    for item in items:
+        total_amount += item['quantity'] * item['cost_price']
+    invoice = "\n=== WeCare Skin Care Products ===\n"
+    invoice += "        PURCHASE INVOICE\n"
+    invoice += "==============================\n\n"
+    invoice += "Invoice No: " + invoice_number + "\n"
+    invoice += "Date: " + DATE + "\n"
+    invoice += "Supplier: " + supplier_name + "\n\n"
+    invoice += "Product Details:\n"
+    for item in items:
+        product = item['product']
+        invoice += "  Product: " + product['name'] + "\n"
+        invoice += "  Brand: " + product['brand'] + "\n"
+        invoice += "  Origin: " + product['origin'] + "\n"
+        invoice += "  Quantity: " + str(item['quantity']) + "\n"
+        invoice += "  Rate per item: Rs. " + str(item['cost_price']) + "\n"
+        invoice += "  Subtotal: Rs. " + str(item['quantity'] * item['cost_price']) + "\n"
+        invoice += "-" * 50 + "\n"
+    invoice += "Total Amount: Rs. " + str(total_amount) + "\n\n"
+    invoice += "==============================\n"
+    return invoice
+
+
+def time_per_call(function, count):
+    """
+    Time a zero-argument function.
+
+    Args:
+        function (callable): Function to time
+        count (int): Number of calls
+
+    Returns:
+        float: Microseconds per call
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--invoices', type=int, default=20000)
+    args = parser.parse_args()
+    count = args.invoices
+
+    items = [{'product': PRODUCT, 'quantity': 7, 'cost_price': 1000}] * 5
+    sale = [{'product': PRODUCT, 'quantity': 7, 'free_items': 2, 'total_price': 14000}]
+
+    cases = [
+        ('sales',
+         lambda: legacy_sales(PRODUCT, 7, 2, 14000, "20261017-000001", "Ann"),
+         lambda: render_sales_invoice("20261017-000001", DATE, "Ann", sale, VAT_RATE, SHOP_VAT_NUMBER)),
+        ('purchase',
+         lambda: legacy_purchase(PRODUCT, 7, "Sup", "SUP00000001", "20261017-000001"),
+         lambda: render_purchase_invoice("20261017-000001", DATE, "Sup", "SUP00000001",
+                                         PRODUCT, 7, VAT_RATE)),
+        ('multi purchase (5 items)',
+         lambda: legacy_multi_purchase(items, "Sup", "20261017-000001"),
+         lambda: render_multi_purchase_invoice("20261017-000001", DATE, "Sup", items)),
+    ]
+
+    print(f"{'invoice':<26}{'before us':>12}{'after us':>12}{'speedup':>10}")
+    for name, before, after in cases:
+        if before() != after():
+            print(f"{name}: output differs from the old builder!")
+            return 1
+        before_us = time_per_call(before, count)
+        after_us = time_per_call(after, count)
+        print(f"{name:<26}{before_us:>12.2f}{after_us:>12.2f}{before_us / after_us:>9.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Benchmark Suite
+Times file parsing and writing, product lookups, sales and restocks end to
+end, and the invoice builders on synthetic catalogs of increasing size.
+
+Every case reports operations per second and the peak memory allocated by
+one operation (measured with tracemalloc in a separate run, so it does not
+slow the timing down). Results can be saved as JSON and compared with an
+earlier run; the comparison exits with status 1 when a case got slower or
+needs more memory by more than the threshold, so it can gate a build.
+
+Usage:
+    python benchmarks/suite.py [--sizes 1000,100000,1000000] [--cases sell,lookup]
+        [--min-time 1.0] [--output results.json] [--compare baseline.json] [--threshold 0.2]
+    python benchmarks/suite.py --results new.json --compare baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import invoice_writer
+import operation
+from catalog import ProductCatalog
+from invoice_render import (render_sales_invoice, render_purchase_invoice,
+                            render_multi_purchase_invoice)
+from invoice_store import InvoiceStore
+from operation import (sell_product, restock_product, generate_invoice, generate_cart_invoice,
+                       generate_purchase_invoice, compare_strings_case_insensitive,
+                       VAT_RATE, SHOP_VAT_NUMBER)
+from read import read_products_file, load_catalog
+from storage import TextBackend, SQLiteBackend, RecordBackend, migrate
+from store import CatalogStore
+from write import update_product_file, DurabilityPolicy
+
+DEFAULT_SIZES = '1000,100000,1000000'
+# Bumped when cases change meaning, so old results are not compared with new ones
+FORMAT_VERSION = 1
+DATE = "2026-10-17 10:30:00"
+
+
+def make_catalog(rows):
+    """
+    Build a synthetic catalog column by column, which is fast even for a million rows.
+
+    Args:
+        rows (int): Number of products
+
+    Returns:
+        ProductCatalog: The generated catalog
+    """
+    catalog = ProductCatalog()
+    catalog.extend_columns(['Product ' + str(i) for i in range(rows)],
+                           ['Brand ' + str(i % 500) for i in range(rows)],
+                           array('q', [1000000]) * rows,
+                           array('q', (100 + i % 900 for i in range(rows))),
+                           ['Country ' + str(i % 20) for i in range(rows)],
+                           ['Supplier ' + str(i % 50) for i in range(rows)])
+    return catalog
+
+
+def catalog_cases(rows, directory):
+    """
+    Cases whose cost depends on the catalog size.
+
+    Setup happens between the cases, so only the yielded functions are timed.
+
+    Args:
+        rows (int): Number of products
+        directory (str): Scratch directory for the products files
+
+    Yields:
+        tuple: (name, function) - Case name and the operation to time
+    """
+    catalog = make_catalog(rows)
+    filename = os.path.join(directory, 'products_' + str(rows) + '.txt')
+    update_product_file(catalog, filename, fsync=False)
+    pick = random.Random(rows).randrange
+
+    yield 'read_products_file', lambda: read_products_file(filename)
+    yield 'load_catalog', lambda: load_catalog(filename)
+    copy = os.path.join(directory, 'written.txt')
+    yield 'update_product_file', lambda: update_product_file(catalog, copy)
+
+    def lookup_compare_strings():
+        # How products were found before the catalog index: scan every name
+        name = 'PRODUCT ' + str(pick(rows))
+        for product in catalog:
+            if compare_strings_case_insensitive(product['name'], name):
+                return product
+        return None
+
+    yield 'lookup_compare_strings', lookup_compare_strings
+    yield 'lookup_catalog_get', lambda: catalog.get('PRODUCT ' + str(pick(rows)))
+    yield 'sell_product', lambda: sell_product(catalog, 'Product ' + str(pick(rows)), 1, 'Bench Customer')
+    yield 'restock_product', lambda: restock_product(catalog, 'Product ' + str(pick(rows)), 1,
+                                                     'Bench Supplier')
+    catalog.take_changes()
+
+    # The interactive menu's path: lock, catch up, sell, journal, fsync
+    text = TextBackend(filename, os.path.join(directory, 'products_' + str(rows) + '.journal'),
+                       policy=DurabilityPolicy('fsync'))
+    sqlite = SQLiteBackend(os.path.join(directory, 'products_' + str(rows) + '.db'),
+                           policy=DurabilityPolicy('fsync'))
+    records = RecordBackend(os.path.join(directory, 'products_' + str(rows) + '.rec'),
+                            policy=DurabilityPolicy('fsync'))
+    migrate(text, sqlite)
+    migrate(text, records)
+
+    for case, backend in (('sell_transaction', text), ('sqlite_sell_transaction', sqlite),
+                          ('records_sell_transaction', records)):
+        store = CatalogStore(backend)
+        store.open()
+
+        def sell_transaction():
+            with store.transaction() as current:
+                sell_product(current, 'Product ' + str(pick(rows)), 1, 'Bench Customer')
+
+        try:
+            yield case, sell_transaction
+        finally:
+            store.close()
+
+
+def invoice_cases():
+    """
+    Cases for each invoice builder, which do not depend on the catalog size.
+
+    Yields:
+        tuple: (name, function) - Case name and the operation to time
+    """
+    product = {'name': 'Vitamin C Serum', 'brand': 'Garnier', 'origin': 'France',
+               'cost_price': 1000, 'selling_price': 2000}
+    items = [{'product': dict(product, name='Serum ' + str(i)), 'quantity': 3 + i,
+              'free_items': 1, 'total_price': 2000 * (3 + i)} for i in range(3)]
+    purchases = [{'product': dict(product, name='Serum ' + str(i)), 'quantity': 10 + i,
+                  'cost_price': 1000} for i in range(3)]
+    numbers = itertools.count(1)
+
+    yield 'render_sales_invoice', lambda: render_sales_invoice(
+        '20261017-000001', DATE, 'Bench Customer', items, VAT_RATE, SHOP_VAT_NUMBER)
+    yield 'render_purchase_invoice', lambda: render_purchase_invoice(
+        '20261017-000001', DATE, 'Bench Supplier', 'SUP00000001', product, 10, VAT_RATE)
+    yield 'render_multi_purchase_invoice', lambda: render_multi_purchase_invoice(
+        '20261017-000001', DATE, 'Bench Supplier', purchases)
+    # The builders used by the operations also queue the invoice to be saved
+    yield 'generate_invoice', lambda: generate_invoice(
+        product, 3, 1, 6000, 'B' + str(next(numbers)), 'Bench Customer')
+    yield 'generate_cart_invoice', lambda: generate_cart_invoice(
+        items, 'B' + str(next(numbers)), 'Bench Customer')
+    yield 'generate_purchase_invoice', lambda: generate_purchase_invoice(purchases, 'Bench Supplier')
+
+
+def measure(function, min_time, max_ops):
+    """
+    Time an operation and measure its peak memory.
+
+    Args:
+        function (callable): Operation to run
+        min_time (float): Keep repeating for at least this many seconds
+        max_ops (int): Stop after this many operations even if min_time has not passed
+
+    Returns:
+        dict: ops, seconds, ops_per_sec and peak_bytes
+    """
+    clock = time.perf_counter
+    ops = 0
+    start = clock()
+    while True:
+        function()
+        ops += 1
+        elapsed = clock() - start
+        if elapsed >= min_time or ops >= max_ops:
+            break
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'ops': ops, 'seconds': round(elapsed, 6), 'ops_per_sec': round(ops / elapsed, 3),
+            'peak_bytes': peak}
+
+
+def run_suite(sizes, selected, min_time, max_ops):
+    """
+    Run every selected case, printing each result as it is measured.
+
+    Runs inside a scratch directory so invoice numbers and invoices written
+    by the sale cases do not touch the real ones.
+
+    Args:
+        sizes (list): Catalog sizes in rows
+        selected (list): Substrings of the case names to run, empty for all
+        min_time (float): Seconds to repeat each case for
+        max_ops (int): Most operations per case
+
+    Returns:
+        dict: Results keyed by "case/rows"
+    """
+    results = {}
+    echo = operation.ECHO_INVOICES
+    operation.ECHO_INVOICES = False
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        invoice_writer.configure(InvoiceStore(os.path.join(directory, 'invoice_archive')))
+        print(f"{'Case':<30}{'Rows':>9}{'ops/s':>14}{'per op':>12}{'peak memory':>14}")
+        print("-" * 79)
+        try:
+            groups = [(0, invoice_cases())] + [(rows, catalog_cases(rows, directory)) for rows in sizes]
+            for rows, cases in groups:
+                for name, function in cases:
+                    if selected and not any(part in name for part in selected):
+                        continue
+                    result = dict(measure(function, min_time, max_ops), case=name, rows=rows)
+                    results[name + '/' + str(rows)] = result
+                    print(f"{name:<30}{rows:>9}{result['ops_per_sec']:>14,.1f}"
+                          f"{_duration(1 / result['ops_per_sec']):>12}{_size(result['peak_bytes']):>14}")
+        finally:
+            invoice_writer.shutdown()
+            os.chdir(cwd)
+            operation.ECHO_INVOICES = echo
+    return results
+
+
+def _duration(seconds):
+    """
+    Format a duration with a readable unit.
+
+    Args:
+        seconds (float): Duration in seconds
+
+    Returns:
+        str: e.g. "12.3 us" or "1.20 s"
+    """
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def _size(size):
+    """
+    Format a byte count with a readable unit.
+
+    Args:
+        size (int): Number of bytes
+
+    Returns:
+        str: e.g. "512 B" or "3.4 MB"
+    """
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+def _git_revision():
+    """
+    Get the current commit of the source tree, if it is a git checkout.
+
+    Returns:
+        str: Abbreviated commit hash, or None
+    """
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def compare(baseline, current, threshold):
+    """
+    Print the change of every case present in both runs and flag regressions.
+
+    Args:
+        baseline (dict): Earlier results file contents
+        current (dict): New results file contents
+        threshold (float): Allowed slowdown or memory growth as a fraction, e.g. 0.2
+
+    Returns:
+        int: Number of regressions
+    """
+    if baseline.get('format') != current.get('format'):
+        print("Warning: The results were written by different versions of the suite.")
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('created', '?')})")
+    print(f"{'Case':<30}{'Rows':>9}{'ops/s':>10}{'memory':>10}")
+    print("-" * 62)
+    regressions = 0
+    for key, new in current['results'].items():
+        old = baseline['results'].get(key)
+        if old is None:
+            continue
+        speed = new['ops_per_sec'] / old['ops_per_sec'] - 1
+        memory = new['peak_bytes'] / old['peak_bytes'] - 1 if old['peak_bytes'] else 0.0
+        flag = ''
+        if speed < -threshold or memory > threshold:
+            regressions += 1
+            flag = '  REGRESSION'
+        print(f"{new['case']:<30}{new['rows']:>9}{speed:>+10.1%}{memory:>+10.1%}{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="catalog sizes in rows, comma separated")
+    parser.add_argument('--cases', default='', help="only cases whose name contains one of these, comma separated")
+    parser.add_argument('--min-time', type=float, default=1.0, help="seconds to repeat each case for")
+    parser.add_argument('--max-ops', type=int, default=100000, help="most operations per case")
+    parser.add_argument('--output', help="save the results to this JSON file")
+    parser.add_argument('--results', help="compare this saved JSON file instead of running")
+    parser.add_argument('--compare', help="earlier JSON results to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="slowdown or memory growth counted as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as file:
+            current = json.load(file)
+    else:
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        selected = [part.strip() for part in args.cases.split(',') if part.strip()]
+        current = {
+            'format': FORMAT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'min_time': args.min_time,
+            'results': run_suite(sizes, selected, args.min_time, args.max_ops)
+        }
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(current, file, indent=2)
+            print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(baseline, current, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,705 @@
+"""
+Catalog Module
+Keeps the products indexed by name so lookups do not scan the whole list.
+"""
+
+import operator
+import sys
+from array import array
+from collections.abc import Mapping
+from itertools import compress
+
+# Selling price is derived from the cost price instead of being stored,
+# unless a pricing engine (pricing.py) is set
+MARKUP = 2
+
+FIELDS = ('name', 'brand', 'quantity', 'cost_price', 'selling_price', 'origin', 'supplier')
+
+
+def normalize_name(name):
+    """
+    Build the lookup key for a product name.
+
+    Args:
+        name (str): Product name as typed by the user or stored in the file
+
+    Returns:
+        str: Case-folded name with surrounding spaces removed
+    """
+    return name.strip().casefold()
+
+
+class ProductView(Mapping):
+    """
+    Dictionary-like view of one catalog row.
+
+    Reads come straight from the catalog columns, so the view always shows the
+    current stock. 'quantity' and 'cost_price' can be assigned; 'selling_price'
+    is set by the pricing engine, or is the cost price times MARKUP without one.
+    'supplier' is the last supplier the product was bought from, or an empty
+    string if not known.
+    """
+
+    __slots__ = ('_catalog', '_row')
+
+    def __init__(self, catalog, row):
+        self._catalog = catalog
+        self._row = row
+
+    def __getitem__(self, key):
+        catalog = self._catalog
+        row = self._row
+        if key == 'name':
+            return catalog._names[row]
+        if key == 'brand':
+            return catalog._brands[row]
+        if key == 'quantity':
+            return catalog._quantity[row]
+        if key == 'cost_price':
+            return catalog._cost_price[row]
+        if key == 'selling_price':
+            return catalog.selling_price(row)
+        if key == 'origin':
+            return catalog._origins[row]
+        if key == 'supplier':
+            return catalog._suppliers[row]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'quantity':
+            self._catalog._set_quantity(self._row, value)
+        elif key == 'cost_price':
+            self._catalog._set_cost_price(self._row, value)
+        else:
+            raise KeyError(f"'{key}' cannot be changed")
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ProductCatalog:
+    """
+    Column-store product catalog keyed by normalized product name.
+
+    Quantity and cost price live in array('q') columns and brand and origin
+    strings are interned, so a product costs a few machine words instead of a
+    six-key dictionary. get() and iteration return ProductView objects that
+    behave like the old product dictionaries, in the order products were added.
+
+    Removing a product leaves an empty row behind, so row numbers handed out
+    by the catalog never change.
+
+    Changes made through add, remove and adjust_quantity are remembered until
+    take_changes is called, so they can be appended to the transaction journal
+    instead of rewriting the whole products file.
+    """
+
+    def __init__(self, products=None):
+        """
+        Create a catalog, optionally filled from product dictionaries.
+
+        Args:
+            products (iterable): Product dictionaries, e.g. from read_products_file
+        """
+        self._index = {}
+        self._names = []
+        self._brands = []
+        self._origins = []
+        self._suppliers = []
+        self._quantity = array('q')
+        self._cost_price = array('q')
+        self._count = 0
+        self._changes = []
+        self._search = None
+        self._groups = None
+        # Filled by the pricing engine, if one is set
+        self._pricing = None
+        self._selling_price = None
+        self._promotion = None
+        self._promotion_day = None
+        self._pricing_version = None
+        # Told about every stock change, if set
+        self._reorder = None
+        if products:
+            for product in products:
+                self.add_row(product['name'], product['brand'], product['quantity'],
+                             product['cost_price'], product['origin'], product.get('supplier', ''))
+            self._changes = []
+
+    def add_row(self, name, brand, quantity, cost_price, origin, supplier=''):
+        """
+        Add a product from its field values.
+
+        Args:
+            name (str): Name of the product
+            brand (str): Brand of the product
+            quantity (int): Units in stock
+            cost_price (int): Cost price per unit
+            origin (str): Country of origin
+            supplier (str): Supplier the product was bought from, if known
+
+        Returns:
+            int: Row number of the new product, or None if the name already exists
+        """
+        key = normalize_name(name)
+        if key in self._index:
+            return None
+        row = len(self._names)
+        self._index[key] = row
+        self._names.append(name)
+        self._brands.append(sys.intern(brand))
+        self._origins.append(sys.intern(origin))
+        self._suppliers.append(sys.intern(supplier))
+        self._quantity.append(quantity)
+        self._cost_price.append(cost_price)
+        self._count += 1
+        self._changes.append(('A', name, brand, quantity, cost_price, origin, supplier))
+        if self._pricing is not None:
+            self._pricing.add_row(self, row)
+        if self._reorder is not None:
+            self._reorder.update(row, quantity)
+        if self._search is not None:
+            self._search.add(row)
+        if self._groups is not None:
+            for field, index in self._groups.items():
+                index.add(row, self._column(field)[row], quantity, cost_price, self.selling_price(row))
+        return row
+
+    def add_rows(self, names, brands, quantity, cost_price, origins, suppliers):
+        """
+        Add many products, e.g. an import. Like add_row for each, but a pricing
+        engine prices them all in one pass at the end instead of row by row.
+
+        Args:
+            names (list): Product names
+            brands (list): Brands, one per name
+            quantity (list): Units in stock, one per name
+            cost_price (list): Cost prices, one per name
+            origins (list): Countries of origin, one per name
+            suppliers (list): Suppliers, one per name
+
+        Returns:
+            list: Row number of each new product, None where the name already exists
+        """
+        pricing = self._pricing
+        if pricing is not None:
+            self.set_pricing(None)
+        try:
+            return list(map(self.add_row, names, brands, quantity, cost_price, origins, suppliers))
+        finally:
+            if pricing is not None:
+                self.set_pricing(pricing)
+
+    def extend_columns(self, names, brands, quantity, cost_price, origins, suppliers=None, keys=None):
+        """
+        Bulk load whole columns, e.g. straight from a binary snapshot.
+
+        Products whose name is already in the catalog are skipped. Loaded rows
+        are not reported by take_changes.
+
+        Args:
+            names (list): Product names
+            brands (list): Brands, one per name
+            quantity (array): Units in stock as array('q') or a 'q' memoryview
+            cost_price (array): Cost prices as array('q') or a 'q' memoryview
+            origins (list): Countries of origin, one per name
+            suppliers (list): Suppliers, one per name, or None if not known
+            keys (list): normalize_name of each name if already known, e.g.
+                stored in the snapshot, or None to work them out
+
+        Returns:
+            None
+        """
+        if suppliers is None:
+            suppliers = [''] * len(names)
+        if self._names:
+            mark = len(self._changes)
+            for row in range(len(names)):
+                self.add_row(names[row], brands[row], quantity[row], cost_price[row], origins[row],
+                             suppliers[row])
+            del self._changes[mark:]
+            return
+        index = self._index
+        start = len(self._names)
+        if keys is None:
+            keys = list(map(normalize_name, names))
+        index.update(zip(keys, range(start, start + len(names))))
+        if len(index) != start + len(names):
+            # Duplicate names in the input: the first one keeps the name
+            for offset in range(len(names) - 1, -1, -1):
+                index[keys[offset]] = start + offset
+        self._names.extend(names)
+        self._brands.extend(map(sys.intern, brands))
+        self._origins.extend(map(sys.intern, origins))
+        self._suppliers.extend(map(sys.intern, suppliers))
+        self._quantity.frombytes(memoryview(quantity).cast('B'))
+        self._cost_price.frombytes(memoryview(cost_price).cast('B'))
+        if len(index) != start + len(names):
+            # Duplicate names in the input: keep the first, blank the rest
+            for row in range(start, len(self._names)):
+                if index[keys[row - start]] != row:
+                    self._names[row] = None
+        self._count = len(index)
+        # Rebuilt on next use rather than updated row by row
+        self._search = None
+        self._groups = None
+        if self._pricing is not None:
+            self.set_pricing(self._pricing)
+        if self._reorder is not None:
+            self._reorder.rebuild()
+
+    def columns(self):
+        """
+        Copy the catalog column by column, without removed products, e.g. to
+        write a binary snapshot.
+
+        Returns:
+            tuple: (names, brands, quantity, cost_price, origins, suppliers,
+                keys) - lists, quantity and cost_price as array('q'), keys
+                being normalize_name of each name
+        """
+        names = self._names
+        keys = [None] * len(names)
+        for key, row in self._index.items():
+            keys[row] = key
+        if self._count == len(names):
+            return (names[:], self._brands[:], array('q', self._quantity), array('q', self._cost_price),
+                    self._origins[:], self._suppliers[:], keys)
+        live = [name is not None for name in names]
+        return tuple(list(compress(column, live)) if isinstance(column, list) else array('q', compress(column, live))
+                     for column in (names, self._brands, self._quantity, self._cost_price,
+                                    self._origins, self._suppliers, keys))
+
+    def row_of(self, name):
+        """
+        Find the row number of a product.
+
+        Args:
+            name (str): Name of the product
+
+        Returns:
+            int: Row number, or None if the product is not in the catalog
+        """
+        return self._index.get(normalize_name(name))
+
+    def view(self, row):
+        """
+        Get the product stored in a row.
+
+        Args:
+            row (int): Row number as returned by row_of or add_row
+
+        Returns:
+            ProductView: Dictionary-like view of the product
+        """
+        return ProductView(self, row)
+
+    def get(self, name):
+        """
+        Find a product by name ignoring case.
+
+        Args:
+            name (str): Name of the product
+
+        Returns:
+            ProductView: The product, or None if it is not in the catalog
+        """
+        row = self._index.get(normalize_name(name))
+        if row is None:
+            return None
+        return ProductView(self, row)
+
+    def contains(self, name):
+        """
+        Check whether a product with this name exists.
+
+        Args:
+            name (str): Name of the product
+
+        Returns:
+            bool: True if the product is in the catalog
+        """
+        return normalize_name(name) in self._index
+
+    def add(self, product):
+        """
+        Add a product to the catalog.
+
+        Args:
+            product (dict): Product dictionary with name, brand, quantity,
+                cost_price and origin keys, and optionally supplier
+
+        Returns:
+            bool: True if added, False if a product with the same name exists
+        """
+        return self.add_row(product['name'], product['brand'], product['quantity'],
+                            product['cost_price'], product['origin'],
+                            product.get('supplier', '')) is not None
+
+    def remove(self, name):
+        """
+        Remove a product from the catalog.
+
+        Args:
+            name (str): Name of the product
+
+        Returns:
+            dict: The removed product's details, or None if it was not found
+        """
+        row = self._index.pop(normalize_name(name), None)
+        if row is None:
+            return None
+        product = dict(ProductView(self, row))
+        self._names[row] = None
+        self._count -= 1
+        self._changes.append(('D', product['name']))
+        if self._search is not None:
+            self._search.discard(row, product['name'], product['brand'])
+        if self._groups is not None:
+            for field, index in self._groups.items():
+                index.remove(row, product[field], product['quantity'], product['cost_price'],
+                             product['selling_price'])
+        return product
+
+    def adjust_quantity(self, name, delta):
+        """
+        Change the stock of a product by the given amount.
+
+        Args:
+            name (str): Name of the product
+            delta (int): Units to add (positive) or take away (negative)
+
+        Returns:
+            ProductView: The updated product, or None if it was not found
+        """
+        row = self._index.get(normalize_name(name))
+        if row is None:
+            return None
+        self._set_quantity(row, self._quantity[row] + delta)
+        return ProductView(self, row)
+
+    def _set_quantity(self, row, quantity):
+        """
+        Store a new stock level for a row and remember the change.
+
+        Args:
+            row (int): Row number
+            quantity (int): New units in stock
+
+        Returns:
+            None
+        """
+        if self._groups is not None:
+            units = quantity - self._quantity[row]
+            for field, index in self._groups.items():
+                index.change(self._column(field)[row], units, units * self._cost_price[row],
+                             units * self.selling_price(row))
+        self._quantity[row] = quantity
+        if self._reorder is not None:
+            self._reorder.update(row, quantity)
+        # The resulting quantity is recorded rather than the delta so that
+        # replaying a record twice leaves the same stock level.
+        self._changes.append(('Q', self._names[row], quantity))
+
+    def search_index(self):
+        """
+        Get the name and brand search index, building it on first use.
+
+        Once built, the index is updated as products are added and removed.
+
+        Returns:
+            ProductSearch: Prefix and fuzzy search over this catalog
+        """
+        if self._search is None:
+            from search import ProductSearch
+            self._search = ProductSearch(self)
+        return self._search
+
+    def select_rows(self, sort_by=None, descending=False, brand=None, origin=None,
+                    supplier=None, max_quantity=None):
+        """
+        List the rows matching the filters, optionally sorted by a column.
+
+        Brand, origin and supplier filters use the group indexes; the other
+        filters and sort keys are read straight from the columns, so no
+        product views are created.
+
+        Args:
+            sort_by (str): Field name from FIELDS, or None to keep file order
+            descending (bool): Sort from largest to smallest
+            brand (str): Only products of this brand, ignoring case
+            origin (str): Only products from this country, ignoring case
+            supplier (str): Only products last bought from this supplier, ignoring case
+            max_quantity (int): Only products with at most this many units in stock
+
+        Returns:
+            list: Row numbers to pass to view()
+
+        Raises:
+            KeyError: If sort_by is not a product field
+        """
+        names = self._names
+        groups = [self.group_index(field).rows(value)
+                  for field, value in (('brand', brand), ('origin', origin), ('supplier', supplier))
+                  if value]
+        if groups:
+            groups.sort(key=len)
+            rows = sorted(groups[0].intersection(*groups[1:]))
+        else:
+            rows = [row for row in range(len(names)) if names[row] is not None]
+        if max_quantity is not None:
+            stock = self._quantity
+            rows = [row for row in rows if stock[row] <= max_quantity]
+
+        if sort_by is not None:
+            if sort_by not in FIELDS:
+                raise KeyError(sort_by)
+            if sort_by == 'name':
+                key = lambda row: names[row].casefold()
+            elif sort_by in ('brand', 'origin', 'supplier'):
+                column = self._column(sort_by)
+                key = lambda row: column[row].casefold()
+            elif sort_by == 'selling_price' and self._selling_price is not None:
+                key = self._selling_price.__getitem__
+            else:
+                # Without a pricing engine selling price is a fixed multiple of the cost price
+                key = (self._quantity if sort_by == 'quantity' else self._cost_price).__getitem__
+            rows.sort(key=key, reverse=descending)
+        return rows
+
+    def _set_cost_price(self, row, cost_price):
+        """
+        Store a new cost price for a row.
+
+        Args:
+            row (int): Row number
+            cost_price (int): New cost price per unit
+
+        Returns:
+            None
+        """
+        old_selling_price = self.selling_price(row)
+        value = self._quantity[row] * (cost_price - self._cost_price[row])
+        self._cost_price[row] = cost_price
+        if self._pricing is not None:
+            self._selling_price[row] = self._pricing.selling_price(self, row)
+        if self._groups is not None:
+            selling_value = self._quantity[row] * (self.selling_price(row) - old_selling_price)
+            for field, index in self._groups.items():
+                index.change(self._column(field)[row], 0, value, selling_value)
+
+    def set_supplier(self, name, supplier):
+        """
+        Record the supplier a product was last bought from.
+
+        Args:
+            name (str): Name of the product
+            supplier (str): Name of the supplier
+
+        Returns:
+            ProductView: The updated product, or None if it was not found
+        """
+        row = self._index.get(normalize_name(name))
+        if row is None:
+            return None
+        old = self._suppliers[row]
+        if old != supplier:
+            if self._groups is not None and 'supplier' in self._groups:
+                index = self._groups['supplier']
+                selling_price = self.selling_price(row)
+                index.remove(row, old, self._quantity[row], self._cost_price[row], selling_price)
+                index.add(row, supplier, self._quantity[row], self._cost_price[row], selling_price)
+            self._suppliers[row] = sys.intern(supplier)
+            self._changes.append(('S', self._names[row], supplier))
+        return ProductView(self, row)
+
+    def _column(self, field):
+        """
+        Get the string column for a groupable field.
+
+        Args:
+            field (str): 'brand', 'origin' or 'supplier'
+
+        Returns:
+            list: The column, indexed by row number
+        """
+        if field == 'brand':
+            return self._brands
+        if field == 'origin':
+            return self._origins
+        return self._suppliers
+
+    def group_index(self, field):
+        """
+        Get the index grouping products by brand, origin or supplier.
+
+        Indexes are built on first use and then kept up to date, together with
+        their per-group stock totals, on every add, remove and stock change.
+
+        Args:
+            field (str): 'brand', 'origin' or 'supplier'
+
+        Returns:
+            GroupIndex: The index for that field
+
+        Raises:
+            KeyError: If the field cannot be grouped on
+        """
+        if self._groups is None:
+            self._groups = {}
+        index = self._groups.get(field)
+        if index is None:
+            from groups import GROUP_FIELDS, GroupIndex
+            if field not in GROUP_FIELDS:
+                raise KeyError(field)
+            index = GroupIndex(field)
+            column = self._column(field)
+            names = self._names
+            for row in range(len(names)):
+                if names[row] is not None:
+                    index.add(row, column[row], self._quantity[row], self._cost_price[row],
+                              self.selling_price(row))
+            self._groups[field] = index
+        return index
+
+    def group_totals(self, field, value):
+        """
+        Get the stock totals for one brand, origin or supplier.
+
+        Args:
+            field (str): 'brand', 'origin' or 'supplier'
+            value (str): The brand, country or supplier, any case
+
+        Returns:
+            dict: Products, units, cost_value and selling_value of the group,
+                or None if no product matches
+        """
+        return self.group_index(field).totals(value)
+
+    def selling_price(self, row):
+        """
+        Get the selling price of a row.
+
+        Args:
+            row (int): Row number
+
+        Returns:
+            int: Selling price per unit
+        """
+        if self._selling_price is not None:
+            return self._selling_price[row]
+        return self._cost_price[row] * MARKUP
+
+    def set_pricing(self, engine):
+        """
+        Price the catalog with a pricing engine's rules, or go back to MARKUP
+        and buy 3 get 1 free.
+
+        Every selling price and promotion is computed in one pass; products
+        added later are priced as they are added.
+
+        Args:
+            engine (PricingEngine): The rules, or None
+
+        Returns:
+            None
+        """
+        self._pricing = engine
+        # Group totals read selling prices while the engine finds its rows,
+        # so drop the old columns first; the totals are corrected below
+        self._selling_price = None
+        self._promotion = None
+        self._promotion_day = None
+        self._pricing_version = None
+        if engine is not None:
+            engine.reprice(self)
+        if self._groups is not None:
+            if self._selling_price is not None:
+                prices = self._selling_price
+            else:
+                prices = map(MARKUP.__mul__, self._cost_price)
+            values = array('q', map(operator.mul, self._quantity, prices))
+            for index in self._groups.values():
+                index.revalue(values)
+
+    def set_reorder(self, engine):
+        """
+        Tell a reorder engine about every stock change from now on.
+
+        Args:
+            engine (ReorderEngine): The engine, or None to stop
+
+        Returns:
+            None
+        """
+        self._reorder = engine
+        if engine is not None:
+            engine.rebuild()
+
+    def sale_terms(self, row, quantity):
+        """
+        Work out the free units and price of selling a product, using the
+        promotion precomputed for its row.
+
+        Args:
+            row (int): Row number
+            quantity (int): Units bought
+
+        Returns:
+            tuple: (free units, total price before VAT, name of the promotion
+                that changed the sale or None)
+        """
+        if self._pricing is not None:
+            promotion = self._pricing.promotion(self, row)
+        else:
+            from pricing import DEFAULT_PROMOTION
+            promotion = DEFAULT_PROMOTION
+        price = self.selling_price(row)
+        if promotion is None:
+            return 0, price * quantity, None
+        free_items, total_price = promotion.apply(quantity, price)
+        if free_items == 0 and total_price == price * quantity:
+            return 0, total_price, None
+        return free_items, total_price, promotion.name
+
+    def record_invoice(self, invoice_number):
+        """
+        Note that the changes made so far are covered by an invoice, so crash
+        recovery can match saved changes against the invoices written.
+
+        Args:
+            invoice_number (str): Number of the sales or purchase invoice
+
+        Returns:
+            None
+        """
+        self._changes.append(('I', invoice_number))
+
+    def take_changes(self):
+        """
+        Return the changes made since the last call and forget them.
+
+        Returns:
+            list: Change records as tuples, oldest first
+        """
+        changes = self._changes
+        self._changes = []
+        return changes
+
+    def __contains__(self, name):
+        return self.contains(name)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        names = self._names
+        for row in range(len(names)):
+            if names[row] is not None:
+                yield ProductView(self, row)
@@ -0,0 +1,115 @@
+"""
+File Lock Module
+Advisory locks shared between processes, e.g. several tills on one products file.
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def lock_file(file):
+    """
+    Take an exclusive lock on an open file, waiting until it is free.
+
+    Args:
+        file: Open file object
+
+    Returns:
+        None
+    """
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def unlock_file(file):
+    """
+    Release a lock taken with lock_file.
+
+    Args:
+        file: Open file object
+
+    Returns:
+        None
+    """
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    Exclusive lock held through a small lock file, for threads and processes.
+
+    The lock file is opened once and kept open, so taking the lock is a single
+    system call. File locks do not exclude other threads of the same process,
+    so a thread lock is taken first.
+    """
+
+    def __init__(self, lock_file):
+        """
+        Create a lock; the lock file is created on first use.
+
+        Args:
+            lock_file (str): Name of the lock file
+        """
+        self.lock_file = lock_file
+        self._file = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait for the lock and take it.
+
+        Returns:
+            None
+        """
+        self._thread_lock.acquire()
+        try:
+            if self._file is None:
+                fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+                self._file = os.fdopen(fd, 'r+')
+            lock_file(self._file)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        """
+        Release the lock.
+
+        Returns:
+            None
+        """
+        try:
+            unlock_file(self._file)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.release()
+
+    def close(self):
+        """
+        Close the lock file. The lock must not be held.
+
+        Returns:
+            None
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,165 @@
+"""
+Groups Module
+Secondary indexes of the catalog by brand, origin or supplier, with running
+totals per group so stock reports do not scan the catalog.
+"""
+
+from catalog import normalize_name
+
+# Catalog columns that can be grouped on
+GROUP_FIELDS = ('brand', 'origin', 'supplier')
+
+
+class GroupIndex:
+    """
+    Rows and stock totals for every value of one catalog column.
+
+    Groups are matched ignoring case, like product names. Each group keeps its
+    product count, units in stock and stock value at cost and at selling
+    price, updated by the catalog on every change, so reading the totals of a
+    group costs the same however large the catalog is.
+    """
+
+    def __init__(self, field):
+        """
+        Create an empty index.
+
+        Args:
+            field (str): Column the index groups on, one of GROUP_FIELDS
+        """
+        self.field = field
+        self._rows = {}
+        self._labels = {}
+        self._totals = {}
+
+    def add(self, row, value, quantity, cost_price, selling_price):
+        """
+        Put a row into the group for its column value.
+
+        Args:
+            row (int): Catalog row number
+            value (str): The row's value in the grouped column
+            quantity (int): Units in stock
+            cost_price (int): Cost price per unit
+            selling_price (int): Selling price per unit
+
+        Returns:
+            None
+        """
+        key = normalize_name(value)
+        if not key:
+            # Products without a value, e.g. no known supplier, are not grouped
+            return
+        rows = self._rows.get(key)
+        if rows is None:
+            rows = self._rows[key] = set()
+            self._labels[key] = value.strip()
+            self._totals[key] = [0, 0, 0, 0]
+        rows.add(row)
+        totals = self._totals[key]
+        totals[0] += 1
+        totals[1] += quantity
+        totals[2] += quantity * cost_price
+        totals[3] += quantity * selling_price
+
+    def remove(self, row, value, quantity, cost_price, selling_price):
+        """
+        Take a row out of its group, dropping the group once it is empty.
+
+        Args:
+            row (int): Catalog row number
+            value (str): The row's value in the grouped column
+            quantity (int): Units in stock
+            cost_price (int): Cost price per unit
+            selling_price (int): Selling price per unit
+
+        Returns:
+            None
+        """
+        key = normalize_name(value)
+        rows = self._rows.get(key)
+        if rows is None or row not in rows:
+            return
+        rows.discard(row)
+        if not rows:
+            del self._rows[key], self._labels[key], self._totals[key]
+            return
+        totals = self._totals[key]
+        totals[0] -= 1
+        totals[1] -= quantity
+        totals[2] -= quantity * cost_price
+        totals[3] -= quantity * selling_price
+
+    def change(self, value, units, cost_value, selling_value):
+        """
+        Adjust a group's totals after a row's stock or prices changed.
+
+        Args:
+            value (str): The row's value in the grouped column
+            units (int): Change in units in stock
+            cost_value (int): Change in stock value at cost
+            selling_value (int): Change in stock value at selling price
+
+        Returns:
+            None
+        """
+        totals = self._totals.get(normalize_name(value))
+        if totals is not None:
+            totals[1] += units
+            totals[2] += cost_value
+            totals[3] += selling_value
+
+    def revalue(self, selling_values):
+        """
+        Recompute every group's stock value at selling price, e.g. after repricing.
+
+        Args:
+            selling_values (array): Stock value at selling price by row
+
+        Returns:
+            None
+        """
+        for key, rows in self._rows.items():
+            self._totals[key][3] = sum(map(selling_values.__getitem__, rows))
+
+    def rows(self, value):
+        """
+        Get the rows in a group.
+
+        Args:
+            value (str): Group to look up, any case
+
+        Returns:
+            set: Catalog row numbers, empty if there is no such group
+        """
+        return self._rows.get(normalize_name(value), set())
+
+    def totals(self, value):
+        """
+        Get the running totals of a group.
+
+        Args:
+            value (str): Group to look up, any case
+
+        Returns:
+            dict: Group name, products, units, cost_value and selling_value,
+                or None if there is no such group
+        """
+        key = normalize_name(value)
+        totals = self._totals.get(key)
+        if totals is None:
+            return None
+        return {
+            self.field: self._labels[key],
+            'products': totals[0],
+            'units': totals[1],
+            'cost_value': totals[2],
+            'selling_value': totals[3]
+        }
+
+    def __iter__(self):
+        for key in self._totals:
+            yield self.totals(key)
+
+    def __len__(self):
+        return len(self._totals)
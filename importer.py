@@ -0,0 +1,217 @@
+"""
+Importer Module
+Adds a range of new products from a CSV file in one go, e.g. a new
+supplier's catalog, instead of one menu option 4 round at a time.
+
+The file needs a header row with these columns; supplier may be left out
+when a default supplier is given:
+
+    name,brand,quantity,cost_price,origin,supplier
+    Rose Water Toner,Heritage,120,350,India,Acme Traders
+
+The file is read once and every column is checked in one pass with the same
+rules as the menu's prompts. A product already in the catalog, or named twice
+in the file, is rejected; the first row with a name wins. The accepted
+products are added in a single store transaction, so the catalog is saved
+once, and each supplier gets one purchase invoice for everything bought from
+it. Rejected rows are written to <file>.rejects.csv with the reason.
+
+Usage:
+    python main.py --import new_range.csv [--supplier "Acme Traders"]
+"""
+
+import csv
+import os
+import time
+from itertools import repeat
+
+import metrics
+import operation
+from catalog import ProductView, normalize_name
+from operation import generate_purchase_invoice
+from validation import validate_text, validate_positive_int
+
+# Columns of the import file, in the order the menu asks for them
+COLUMNS = ('name', 'brand', 'quantity', 'cost_price', 'origin', 'supplier')
+# Labels used in error messages, as in the menu's prompts
+_TEXT_LABELS = {'name': "Product name", 'brand': "Brand name", 'origin': "Country of origin",
+                'supplier': "Supplier name"}
+_NUMBER_LABELS = {'quantity': "quantity", 'cost_price': "cost price"}
+
+
+def read_columns(path, supplier=''):
+    """
+    Read an import file into one list per column.
+
+    Args:
+        path (str): Name of the CSV file
+        supplier (str): Supplier for rows that do not name one
+
+    Returns:
+        tuple: (dict, list) - column name -> stripped values, and the line
+            number of each row
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the header is missing a column
+    """
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file)
+        header = [field.strip().lower() for field in next(reader, [])]
+        missing = [column for column in COLUMNS if column not in header and
+                   not (column == 'supplier' and supplier)]
+        if missing:
+            raise ValueError("The header row has no " + ", ".join(missing) + " column")
+        positions = [header.index(column) if column in header else None for column in COLUMNS]
+        columns = {column: [] for column in COLUMNS}
+        appends = [columns[column].append for column in COLUMNS]
+        lines = []
+        for row in reader:
+            if not any(field.strip() for field in row):
+                continue
+            lines.append(reader.line_num)
+            for append, position in zip(appends, positions):
+                append(row[position].strip() if position is not None and position < len(row) else '')
+    if supplier:
+        default = supplier.strip()
+        columns['supplier'] = [value or default for value in columns['supplier']]
+    return columns, lines
+
+
+def validate_columns(catalog, columns, lines):
+    """
+    Check every row of an import, a whole column at a time.
+
+    Columns are checked in the order the menu asks for them, and a row keeps
+    the first error found, as it would at the prompts.
+
+    Args:
+        catalog (ProductCatalog): Catalog the products are added to
+        columns (dict): Column name -> values, as returned by read_columns
+        lines (list): Line number of each row
+
+    Returns:
+        tuple: (list, list, list) - Error message per row (None if the row
+            is accepted), and the parsed quantity and cost price columns
+    """
+    rows = len(lines)
+    errors = list(map(validate_text, columns['name'], repeat(_TEXT_LABELS['name'], rows)))
+
+    # Duplicates: against the catalog's index, then within the file
+    first_line = {}
+    for row, name in enumerate(columns['name']):
+        if errors[row] is not None:
+            continue
+        key = normalize_name(name)
+        if catalog.contains(name):
+            errors[row] = "Product already exists. Use restock option instead."
+        elif key in first_line:
+            errors[row] = "Duplicate of line " + str(first_line[key]) + "."
+        else:
+            first_line[key] = lines[row]
+
+    numbers = {}
+    for column in COLUMNS[1:]:
+        if column in _NUMBER_LABELS:
+            parsed = list(map(validate_positive_int, columns[column], repeat(_NUMBER_LABELS[column], rows)))
+            numbers[column] = [number for number, _ in parsed]
+            column_errors = [error for _, error in parsed]
+        else:
+            column_errors = map(validate_text, columns[column], repeat(_TEXT_LABELS[column], rows))
+        errors = [error if error is not None else new for error, new in zip(errors, column_errors)]
+    return errors, numbers['quantity'], numbers['cost_price']
+
+
+def write_rejects(path, columns, lines, errors):
+    """
+    Write the rejected rows with their reasons.
+
+    Args:
+        path (str): Name of the rejects file
+        columns (dict): Column name -> values
+        lines (list): Line number of each row
+        errors (list): Error message per row, None for accepted rows
+
+    Returns:
+        int: Number of rows written
+    """
+    rejected = [row for row, error in enumerate(errors) if error is not None]
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(('line', 'error') + COLUMNS)
+        writer.writerows([lines[row], errors[row]] + [columns[column][row] for column in COLUMNS]
+                         for row in rejected)
+    return len(rejected)
+
+
+@metrics.timed('import_products')
+def import_products(store, path, supplier=''):
+    """
+    Add every valid product in an import file and print a summary.
+
+    Args:
+        store (CatalogStore): Opened products store
+        path (str): Name of the CSV file
+        supplier (str): Supplier for rows that do not name one
+
+    Returns:
+        dict: Counts of added and rejected rows and of purchase invoices
+    """
+    summary = {'added': 0, 'rejected': 0, 'invoices': 0}
+    start = time.perf_counter()
+    try:
+        columns, lines = read_columns(path, supplier)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"Error reading '{path}': {e}")
+        return summary
+
+    echo = operation.ECHO_INVOICES
+    operation.ECHO_INVOICES = False
+    catalog = store.begin()
+    try:
+        # Validated under the lock, so a product another till just added is a duplicate
+        errors, quantity, cost_price = validate_columns(catalog, columns, lines)
+        accepted = [row for row, error in enumerate(errors) if error is None]
+        names, brands, origins, suppliers = ([columns[column][row] for row in accepted]
+                                             for column in ('name', 'brand', 'origin', 'supplier'))
+        quantity = [quantity[row] for row in accepted]
+        cost_price = [cost_price[row] for row in accepted]
+        added = catalog.add_rows(names, brands, quantity, cost_price, origins, suppliers)
+
+        orders = {}
+        labels = {}
+        for index, row in enumerate(added):
+            key = normalize_name(suppliers[index])
+            labels.setdefault(key, suppliers[index])
+            orders.setdefault(key, []).append({'product': ProductView(catalog, row), 'quantity': quantity[index],
+                                               'cost_price': cost_price[index]})
+        for key, items in orders.items():
+            catalog.record_invoice(generate_purchase_invoice(items, labels[key]))
+        summary['added'] = sum(map(len, orders.values()))
+        summary['invoices'] = len(orders)
+    finally:
+        operation.ECHO_INVOICES = echo
+        saved = store.commit()
+
+    summary['rejected'] = len(errors) - summary['added']
+    metrics.count('products_added', summary['added'])
+    metrics.count('rejects', summary['rejected'])
+    elapsed = time.perf_counter() - start
+
+    print("\nImport Summary")
+    print("-" * 30)
+    print(f"Rows:          {len(lines)}")
+    print(f"Added:         {summary['added']}")
+    print(f"Rejected:      {summary['rejected']}")
+    print(f"Invoices:      {summary['invoices']} (one per supplier)")
+    print(f"Elapsed:       {elapsed:.3f} s")
+    if summary['rejected']:
+        rejects_file = os.path.splitext(path)[0] + '.rejects.csv'
+        try:
+            write_rejects(rejects_file, columns, lines, errors)
+            print(f"Rejected rows and reasons: {rejects_file}")
+        except OSError as e:
+            print(f"Error writing rejects report: {e}")
+    if not saved:
+        print("Warning: The imported products could not be saved.")
+    return summary
@@ -0,0 +1,243 @@
+"""
+Invoice Render Module
+Builds the text of sales and purchase invoices from precompiled layouts.
+
+Every layout is split into fixed sections whose str.format methods are looked
+up once at import time. An invoice is rendered by formatting its sections into
+a list and joining it once, instead of growing a string piece by piece. The
+common one-product sale and the single-product purchase invoice are each a
+single format call.
+"""
+
+import metrics
+
+# Sales invoice, one product section per line of the sale
+_SALES_HEADER = (
+    "\n=== WeCare SKINCARE SYSTEM ===\n"
+    "        SALES INVOICE\n"
+    "==============================\n\n"
+    "Invoice No: {0}\n"
+    "Date: {1}\n"
+    "VAT No: {2}\n"
+    "Customer Name: {3}\n\n"
+    "Product Details:\n"
+).format
+_SALES_ITEM = (
+    "  Name: {0}\n"
+    "  Brand: {1}\n"
+    "  Origin: {2}\n"
+    "  Quantity Purchased: {3}\n"
+    "  Free Items: {4}\n"
+    "  Total Items: {5}\n"
+    "  Price per item: Rs. {6}\n"
+).format
+_SALES_LINE_TOTAL = "  Line Total: Rs. {0}\n".format
+_SALES_TOTALS = (
+    "Subtotal: Rs. {0}\n"
+    "VAT ({1}%): Rs. {2}\n"
+    "Total Amount: Rs. {3}\n"
+).format
+_SALES_PROMOTION = "\n*** {0} Applied! ***".format
+_SALES_FOOTER = (
+    "\nThank you for choosing WeCare Skincare SYSTEM!\n"
+    "==============================\n"
+)
+# The common one-product sale is rendered with a single format call
+_SALES_SINGLE = (
+    "\n=== WeCare SKINCARE SYSTEM ===\n"
+    "        SALES INVOICE\n"
+    "==============================\n\n"
+    "Invoice No: {0}\n"
+    "Date: {1}\n"
+    "VAT No: {2}\n"
+    "Customer Name: {3}\n\n"
+    "Product Details:\n"
+    "  Name: {4}\n"
+    "  Brand: {5}\n"
+    "  Origin: {6}\n"
+    "  Quantity Purchased: {7}\n"
+    "  Free Items: {8}\n"
+    "  Total Items: {9}\n"
+    "  Price per item: Rs. {10}\n"
+    "------------------------------\n"
+    "Subtotal: Rs. {11}\n"
+    "VAT ({12}%): Rs. {13}\n"
+    "Total Amount: Rs. {14}\n"
+    "{15}"
+    "\nThank you for choosing WeCare Skincare SYSTEM!\n"
+    "==============================\n"
+).format
+
+# Purchase invoice for restocking or adding a single product, with VAT
+_PURCHASE = (
+    "\n=== WeCare Skincare SYSTEM ===\n"
+    "        PURCHASE INVOICE\n"
+    "==============================\n\n"
+    "Invoice No: {0}\n"
+    "Date: {1}\n"
+    "Supplier: {2}\n"
+    "Supplier VAT No: {3}\n\n"
+    "Product Details:\n"
+    "  Name: {4}\n"
+    "  Brand: {5}\n"
+    "  Origin: {6}\n"
+    "  Quantity: {7}\n"
+    "  Cost per item: Rs. {8}\n"
+    "------------------------------\n"
+    "Subtotal: Rs. {9}\n"
+    "VAT ({10}%): Rs. {11}\n"
+    "Total Amount: Rs. {12}\n\n"
+    "==============================\n"
+).format
+
+# Purchase invoice covering several products from one supplier
+_MULTI_PURCHASE_HEADER = (
+    "\n=== WeCare Skin Care Products ===\n"
+    "        PURCHASE INVOICE\n"
+    "==============================\n\n"
+    "Invoice No: {0}\n"
+    "Date: {1}\n"
+    "Supplier: {2}\n\n"
+    "Product Details:\n"
+).format
+_MULTI_PURCHASE_ITEM = (
+    "  Product: {0}\n"
+    "  Brand: {1}\n"
+    "  Origin: {2}\n"
+    "  Quantity: {3}\n"
+    "  Rate per item: Rs. {4}\n"
+    "  Subtotal: Rs. {5}\n"
+    + "-" * 50 + "\n"
+).format
+_MULTI_PURCHASE_FOOTER = (
+    "Total Amount: Rs. {0}\n\n"
+    "==============================\n"
+).format
+
+_RULE = "------------------------------\n"
+
+
+@metrics.timed('render_sales_invoice')
+def render_sales_invoice(invoice_number, date, customer_name, items, vat_rate, shop_vat_number):
+    """
+    Render a sales invoice for one or more products.
+
+    A single product uses the original one-product layout; several products
+    also get a line total each.
+
+    Args:
+        invoice_number (str): Unique invoice number
+        date (str): Invoice date as YYYY-MM-DD HH:MM:SS
+        customer_name (str): Name of the customer
+        items (list): Dictionaries with product, quantity, free_items and total_price,
+            and optionally the name of the promotion applied
+        vat_rate (float): VAT rate, e.g. 0.13
+        shop_vat_number (str): The shop's VAT number
+
+    Returns:
+        str: The rendered invoice
+    """
+    if len(items) == 1:
+        item = items[0]
+        product = item['product']
+        quantity = item['quantity']
+        free_items = item['free_items']
+        subtotal = item['total_price']
+        vat_amount = subtotal * vat_rate
+        return _SALES_SINGLE(invoice_number, date, shop_vat_number, customer_name,
+                             product['name'], product['brand'], product['origin'], quantity,
+                             free_items, quantity + free_items, product['selling_price'],
+                             subtotal, int(vat_rate * 100), round(vat_amount, 2),
+                             round(subtotal + vat_amount, 2), _promotions([item]))
+
+    parts = [_SALES_HEADER(invoice_number, date, shop_vat_number, customer_name)]
+    subtotal = 0
+    for item in items:
+        product = item['product']
+        quantity = item['quantity']
+        free_items = item['free_items']
+        subtotal += item['total_price']
+        parts.append(_SALES_ITEM(product['name'], product['brand'], product['origin'], quantity,
+                                 free_items, quantity + free_items, product['selling_price']))
+        parts.append(_SALES_LINE_TOTAL(item['total_price']))
+        parts.append(_RULE)
+
+    vat_amount = subtotal * vat_rate
+    parts.append(_SALES_TOTALS(subtotal, int(vat_rate * 100), round(vat_amount, 2),
+                               round(subtotal + vat_amount, 2)))
+    parts.append(_promotions(items))
+    parts.append(_SALES_FOOTER)
+    return "".join(parts)
+
+
+def _promotions(items):
+    """
+    Render a message for each promotion applied to a sale.
+
+    Args:
+        items (list): Sales invoice items
+
+    Returns:
+        str: The messages, or an empty string if no promotion was applied
+    """
+    names = []
+    for item in items:
+        name = item.get('promotion')
+        if name is None and item['free_items'] > 0:
+            # Items made before promotions were named
+            name = "Buy 3 Get 1 Free"
+        if name is not None and name not in names:
+            names.append(name)
+    return "".join(_SALES_PROMOTION(name) for name in names)
+
+
+@metrics.timed('render_purchase_invoice')
+def render_purchase_invoice(invoice_number, date, supplier_name, supplier_vat, product,
+                            quantity, vat_rate):
+    """
+    Render a purchase invoice with VAT for restocking or adding one product.
+
+    Args:
+        invoice_number (str): Unique invoice number
+        date (str): Invoice date as YYYY-MM-DD HH:MM:SS
+        supplier_name (str): Name of the supplier
+        supplier_vat (str): Supplier's VAT number
+        product (dict): Product with name, brand, origin and cost_price
+        quantity (int): Units purchased
+        vat_rate (float): VAT rate, e.g. 0.13
+
+    Returns:
+        str: The rendered invoice
+    """
+    subtotal = quantity * product['cost_price']
+    vat_amount = subtotal * vat_rate
+    return _PURCHASE(invoice_number, date, supplier_name, supplier_vat, product['name'],
+                     product['brand'], product['origin'], quantity, product['cost_price'],
+                     subtotal, int(vat_rate * 100), round(vat_amount, 2),
+                     round(subtotal + vat_amount, 2))
+
+
+@metrics.timed('render_multi_purchase_invoice')
+def render_multi_purchase_invoice(invoice_number, date, supplier_name, items):
+    """
+    Render one purchase invoice covering several products.
+
+    Args:
+        invoice_number (str): Unique invoice number
+        date (str): Invoice date as YYYY-MM-DD HH:MM:SS
+        supplier_name (str): Name of the supplier
+        items (list): Dictionaries with product, quantity and cost_price
+
+    Returns:
+        str: The rendered invoice
+    """
+    parts = [_MULTI_PURCHASE_HEADER(invoice_number, date, supplier_name)]
+    total_amount = 0
+    for item in items:
+        product = item['product']
+        item_total = item['quantity'] * item['cost_price']
+        total_amount += item_total
+        parts.append(_MULTI_PURCHASE_ITEM(product['name'], product['brand'], product['origin'],
+                                          item['quantity'], item['cost_price'], item_total))
+    parts.append(_MULTI_PURCHASE_FOOTER(total_amount))
+    return "".join(parts)
@@ -0,0 +1,273 @@
+"""
+Invoice Store Module
+Keeps invoices in daily segment files with an offset index instead of one file each.
+
+    invoice_archive/20261017.seg   rendered invoices appended one after another
+    invoice_archive/index.csv      invoice number, kind, segment, offset, length
+
+Usage:
+    python invoice_store.py migrate [--delete]   pack invoices/ and purchase_invoices/
+    python invoice_store.py show INVOICE_NUMBER  print one invoice
+    python invoice_store.py list                 list archived invoice numbers
+"""
+
+import csv
+import os
+import sys
+import threading
+from datetime import datetime
+
+ARCHIVE_DIR = 'invoice_archive'
+INDEX_FILE = 'index.csv'
+
+# Where the one-file-per-invoice layout keeps each kind of invoice
+LEGACY_DIRS = {
+    'sales': ('invoices', 'invoice_'),
+    'purchase': ('purchase_invoices', 'purchase_invoice_'),
+}
+
+
+class InvoiceStore:
+    """
+    Append-only invoice archive with an in-memory index.
+
+    Each invoice is appended to the segment file for the day it was saved and
+    its position is added to the index, so fetching an invoice is one dictionary
+    lookup and one seek. Segments are written before the index, so a crash can
+    leave unindexed bytes at the end of a segment but never an index entry
+    pointing at missing data. Other tills append to the same index, so a
+    lookup that misses reads the entries added since the last read.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        """
+        Open an archive, creating its directory if needed, and load the index.
+
+        Args:
+            directory (str): Directory holding the segments and the index
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._index = {}
+        # Bytes of the index file read so far, whole lines only
+        self._index_offset = 0
+        self._lock = threading.Lock()
+        self._segment_name = None
+        self._segment = None
+        self._index_file = None
+        self._load_index()
+
+    def _load_index(self):
+        """
+        Read the index entries added since the last read, by this or another
+        process, stopping before a half-written last line.
+
+        Returns:
+            None
+        """
+        try:
+            with open(self._index_path, 'rb') as file:
+                file.seek(self._index_offset)
+                data = file.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b'\n') + 1
+        self._index_offset += end
+        for row in csv.reader(data[:end].decode('utf-8').splitlines()):
+            try:
+                number, kind, segment, offset, length = row
+                self._index[number] = (kind, segment, int(offset), int(length))
+            except ValueError:
+                continue
+
+    def _lookup(self, invoice_number):
+        """
+        Find an invoice's index entry, reading entries added by other tills
+        if it is not known yet.
+
+        Args:
+            invoice_number (str): Invoice number
+
+        Returns:
+            tuple: (kind, segment, offset, length), or None if it is not archived
+        """
+        entry = self._index.get(invoice_number)
+        if entry is None:
+            with self._lock:
+                self._load_index()
+            entry = self._index.get(invoice_number)
+        return entry
+
+    def save(self, kind, invoice_number, text, day=None):
+        """
+        Append an invoice to the segment for the given day and index it.
+
+        Args:
+            kind (str): 'sales' or 'purchase'
+            invoice_number (str): Unique invoice number
+            text (str): Rendered invoice
+            day (str): Segment date as YYYYMMDD, today by default
+
+        Returns:
+            None
+
+        Raises:
+            OSError: If the invoice could not be written
+            ValueError: If the invoice number is already archived
+        """
+        data = text.encode('utf-8')
+        segment_name = (day or datetime.now().strftime("%Y%m%d")) + '.seg'
+        with self._lock:
+            if invoice_number in self._index:
+                raise ValueError("Invoice " + invoice_number + " is already archived")
+            if segment_name != self._segment_name:
+                if self._segment is not None:
+                    self._segment.close()
+                # Unbuffered, so each invoice is one O_APPEND write
+                self._segment = open(os.path.join(self.directory, segment_name), 'ab', buffering=0)
+                self._segment_name = segment_name
+            if self._segment.write(data) != len(data):
+                raise OSError("Short write to segment " + segment_name)
+            # Other tills append to the same segment, so the end before the
+            # write may not be where this invoice landed; the end after it is
+            offset = self._segment.tell() - len(data)
+
+            if self._index_file is None:
+                self._index_file = open(self._index_path, 'a', newline='')
+                self._index_writer = csv.writer(self._index_file, lineterminator='\n')
+            self._index_writer.writerow((invoice_number, kind, segment_name, offset, len(data)))
+            self._index_file.flush()
+            self._index[invoice_number] = (kind, segment_name, offset, len(data))
+
+    def get(self, invoice_number):
+        """
+        Fetch an invoice by number.
+
+        Args:
+            invoice_number (str): Invoice number
+
+        Returns:
+            str: The invoice text, or None if it is not in the archive
+        """
+        entry = self._lookup(invoice_number)
+        if entry is None:
+            return None
+        kind, segment_name, offset, length = entry
+        with open(os.path.join(self.directory, segment_name), 'rb') as file:
+            file.seek(offset)
+            return file.read(length).decode('utf-8')
+
+    def kind_of(self, invoice_number):
+        """
+        Get whether an archived invoice is a sales or a purchase invoice.
+
+        Args:
+            invoice_number (str): Invoice number
+
+        Returns:
+            str: 'sales' or 'purchase', or None if it is not in the archive
+        """
+        entry = self._lookup(invoice_number)
+        return entry[0] if entry else None
+
+    def __contains__(self, invoice_number):
+        return self._lookup(invoice_number) is not None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(list(self._index))
+
+    def close(self):
+        """
+        Close the open segment and index files.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for file in (self._segment, self._index_file):
+                if file is not None:
+                    file.close()
+            self._segment = None
+            self._segment_name = None
+            self._index_file = None
+
+
+def migrate(store, delete=False):
+    """
+    Pack the one-file-per-invoice directories into the archive.
+
+    Each file goes into the segment for the day it was last modified. Files
+    whose invoice number is already archived are left where they are.
+
+    Args:
+        store (InvoiceStore): Archive to pack the invoices into
+        delete (bool): Remove each file once it has been archived
+
+    Returns:
+        tuple: (int, int) - Number of invoices packed and number skipped
+    """
+    packed = 0
+    skipped = 0
+    for kind, (directory, prefix) in LEGACY_DIRS.items():
+        try:
+            names = sorted(os.listdir(directory))
+        except FileNotFoundError:
+            continue
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith('.txt')):
+                continue
+            path = os.path.join(directory, name)
+            invoice_number = name[len(prefix):-len('.txt')]
+            if invoice_number in store:
+                print("Warning: Skipping " + path + ", invoice " + invoice_number + " is already archived.")
+                skipped += 1
+                continue
+            with open(path, 'r') as file:
+                text = file.read()
+            day = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y%m%d")
+            store.save(kind, invoice_number, text, day)
+            packed += 1
+            if delete:
+                os.remove(path)
+    return packed, skipped
+
+
+def main(argv):
+    """
+    Command line access to the invoice archive.
+
+    Args:
+        argv (list): Command line arguments without the program name
+
+    Returns:
+        int: Exit status
+    """
+    store = InvoiceStore()
+    try:
+        if argv[:1] == ['migrate'] and set(argv[1:]) <= {'--delete'}:
+            packed, skipped = migrate(store, delete='--delete' in argv)
+            print(f"Packed {packed} invoices into '{store.directory}', skipped {skipped}.")
+            return 0
+        if len(argv) == 2 and argv[0] == 'show':
+            text = store.get(argv[1])
+            if text is None:
+                print("Error: Invoice " + argv[1] + " not found.")
+                return 1
+            print(text)
+            return 0
+        if argv == ['list']:
+            for invoice_number in store:
+                print(invoice_number + "  " + store.kind_of(invoice_number))
+            return 0
+        print(__doc__.split('Usage:')[1].rstrip())
+        return 2
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,265 @@
+"""
+Invoice Writer Module
+Saves invoices on a background thread so sales do not wait for the disk.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import metrics
+from invoice_store import LEGACY_DIRS
+
+# Invoices waiting to be written before submit() starts to block
+MAX_PENDING = 256
+
+
+class FileInvoiceSink:
+    """
+    Saves every invoice as its own file under invoices/ or purchase_invoices/.
+    """
+
+    def save(self, kind, invoice_number, text):
+        """
+        Write one invoice file, creating its directory if needed.
+
+        Args:
+            kind (str): 'sales' or 'purchase'
+            invoice_number (str): Unique invoice number
+            text (str): Rendered invoice
+
+        Returns:
+            None
+        """
+        directory, prefix = LEGACY_DIRS[kind]
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, prefix + invoice_number + ".txt"), 'w') as f:
+            f.write(text)
+
+    def close(self):
+        """
+        Nothing to release; present so sinks can be closed uniformly.
+
+        Returns:
+            None
+        """
+
+
+class InvoiceWriter:
+    """
+    Bounded queue of invoices drained by a single worker thread into a sink,
+    either a FileInvoiceSink or an InvoiceStore archive.
+
+    submit() returns as soon as the invoice is queued. When MAX_PENDING
+    invoices are already waiting it blocks until the worker catches up, so a
+    slow disk slows the tills down instead of using unbounded memory.
+    Invoices that could not be written are kept, with the error, until
+    take_failures() is called.
+    """
+
+    def __init__(self, sink=None, max_pending=MAX_PENDING, ledger=None):
+        """
+        Create a writer; the worker thread starts with the first invoice.
+
+        Args:
+            sink: Object with save(kind, invoice_number, text), one file per
+                invoice by default
+            max_pending (int): Invoices that may wait in the queue
+            ledger (Ledger): Ledger the invoice lines are recorded in, or None
+        """
+        self.sink = sink if sink is not None else FileInvoiceSink()
+        self.ledger = ledger
+        self._queue = queue.Queue(max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._failures = []
+        self._failures_lock = threading.Lock()
+        self._held = threading.local()
+
+    @contextmanager
+    def deferred(self):
+        """
+        Hold back invoices submitted by this thread until the block ends.
+
+        Used around a catalog transaction so that waiting for room in the
+        queue never happens while the products lock is held, and invoices
+        are only queued once the stock change has been saved. If the block
+        raises, the transaction was rolled back and the invoices are dropped.
+
+        Yields:
+            list: The held (kind, invoice_number, text, entries) tuples; any
+                the caller takes out of the list are not submitted when the block ends
+        """
+        held = []
+        self._held.invoices = held
+        try:
+            yield held
+        finally:
+            self._held.invoices = None
+        for invoice in held:
+            self.submit(*invoice)
+
+    def submit(self, kind, invoice_number, text, entries=None):
+        """
+        Queue an invoice to be saved.
+
+        Args:
+            kind (str): 'sales' or 'purchase'
+            invoice_number (str): Unique invoice number
+            text (str): Rendered invoice
+            entries (list): Ledger lines of the invoice, recorded after it is saved
+
+        Returns:
+            None
+        """
+        held = getattr(self._held, 'invoices', None)
+        if held is not None:
+            held.append((kind, invoice_number, text, entries))
+            return
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="invoice-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put((kind, invoice_number, text, entries))
+
+    def _run(self):
+        """
+        Worker loop writing queued invoices until close() is called.
+
+        Returns:
+            None
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                kind, invoice_number, text, entries = item
+                started = metrics.start()
+                try:
+                    self.sink.save(kind, invoice_number, text)
+                except (OSError, ValueError) as e:
+                    with self._failures_lock:
+                        self._failures.append((invoice_number, text, e))
+                else:
+                    metrics.stop('invoice_write', started)
+                    if metrics.ENABLED:
+                        metrics.count('invoices_written')
+                        metrics.count('written_bytes', len(text.encode('utf-8')))
+                # The sale or purchase happened even if its invoice was not saved
+                if entries and self.ledger is not None:
+                    try:
+                        self.ledger.record(entries)
+                    except OSError as e:
+                        print("\nWarning: Could not record invoice " + invoice_number +
+                              " in the ledger: " + str(e))
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until every queued invoice has been written or has failed.
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def take_failures(self):
+        """
+        Return the invoices that could not be written and forget them.
+
+        Returns:
+            list: (invoice_number, text, error) tuples
+        """
+        with self._failures_lock:
+            failures = self._failures
+            self._failures = []
+        return failures
+
+    def close(self):
+        """
+        Write everything still queued, stop the worker thread and close the
+        sink and ledger.
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.sink.close()
+        if self.ledger is not None:
+            self.ledger.close()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def configure(sink, ledger=None):
+    """
+    Choose where the shared writer saves invoices. Call before the first sale.
+
+    Args:
+        sink: FileInvoiceSink, InvoiceStore or any object with save() and
+            close(); None for one file per invoice
+        ledger (Ledger): Ledger the invoice lines are recorded in, or None
+
+    Returns:
+        InvoiceWriter: The shared writer
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = InvoiceWriter(sink, ledger=ledger)
+        return _writer
+
+
+def get_writer():
+    """
+    Get the shared invoice writer, creating it on first use.
+
+    Returns:
+        InvoiceWriter: The shared writer
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = InvoiceWriter()
+        return _writer
+
+
+def report_failures(writer=None):
+    """
+    Print a warning with the full text of every invoice that could not be saved.
+
+    Args:
+        writer (InvoiceWriter): Writer to check, the shared writer by default
+
+    Returns:
+        int: Number of failed invoices
+    """
+    failures = (writer or get_writer()).take_failures()
+    for invoice_number, text, error in failures:
+        print("\nWarning: Could not save invoice " + invoice_number + ": " + str(error))
+        print("\nInvoice details:")
+        print(text)
+    return len(failures)
+
+
+def shutdown():
+    """
+    Flush the shared writer and report failed writes; registered to run on exit.
+
+    Returns:
+        None
+    """
+    if _writer is not None:
+        _writer.close()
+        report_failures(_writer)
@@ -0,0 +1,401 @@
+"""
+Ledger Module
+Structured record of every sale and purchase, with running totals for reports.
+
+    sales_ledger.csv           one line per invoice line, appended as invoices are saved
+    sales_ledger.rollup.json   totals per product, day, customer and supplier, and
+                               how much of the ledger they include
+
+Ledger columns: invoice number, date and time, kind ('sale' or 'purchase'),
+customer or supplier, product, quantity, free items, amount before VAT, VAT.
+
+The totals are updated as lines are appended, so a report is a dictionary
+lookup. Lines appended by other tills are added to the totals the next time
+this process reads them. Each total holds the units, free items, amount
+(revenue for sales, cost for purchases), VAT and number of invoice lines.
+
+Usage:
+    python ledger.py rebuild
+    python ledger.py report product|day|customer|supplier [KEY] [--purchases] [--from DAY] [--to DAY]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+
+from write import atomic_write
+
+LEDGER_FILE = 'sales_ledger.csv'
+ROLLUP_FORMAT = 1
+
+# Totals kept for each kind of ledger line, besides the per day and product totals
+DIMENSIONS = {
+    'sale': ('product', 'day', 'customer'),
+    'purchase': ('product', 'day', 'supplier'),
+}
+TOTALS = ('units', 'free_items', 'amount', 'vat', 'lines')
+
+
+def _empty_rollups():
+    """
+    Create empty totals for every kind and dimension.
+
+    Returns:
+        dict: kind -> dimension -> key -> totals list; 'day_product' maps
+            day -> product -> totals list
+    """
+    rollups = {}
+    for kind, dimensions in DIMENSIONS.items():
+        rollups[kind] = {dimension: {} for dimension in dimensions}
+        rollups[kind]['day_product'] = {}
+    return rollups
+
+
+def _add(totals, key, quantity, free_items, amount, vat):
+    """
+    Add one ledger line to the totals for a key.
+
+    Args:
+        totals (dict): Key -> totals list
+        key (str): Product, day, customer or supplier
+        quantity (int): Units bought or sold
+        free_items (int): Units given free
+        amount (float): Amount before VAT
+        vat (float): VAT
+
+    Returns:
+        None
+    """
+    entry = totals.get(key)
+    if entry is None:
+        totals[key] = [quantity, free_items, amount, vat, 1]
+    else:
+        entry[0] += quantity
+        entry[1] += free_items
+        entry[2] += amount
+        entry[3] += vat
+        entry[4] += 1
+
+
+def _as_dict(entry):
+    """
+    Turn a totals list into a report row.
+
+    Args:
+        entry (list): Totals list
+
+    Returns:
+        dict: units, free_items, amount, vat and lines
+    """
+    totals = dict(zip(TOTALS, entry))
+    totals['amount'] = round(totals['amount'], 2)
+    totals['vat'] = round(totals['vat'], 2)
+    return totals
+
+
+class Ledger:
+    """
+    Append-only ledger file with totals kept up to date in memory.
+
+    Safe to use from several threads; several processes may append to the
+    same ledger.
+    """
+
+    def __init__(self, ledger_file=LEDGER_FILE, rollup_file=None):
+        """
+        Open a ledger, loading the saved totals and adding anything appended since.
+
+        Args:
+            ledger_file (str): Name of the ledger file
+            rollup_file (str): Where the totals are saved, the ledger name
+                with '.rollup.json' instead of its extension by default
+        """
+        self.ledger_file = ledger_file
+        self.rollup_file = rollup_file or os.path.splitext(ledger_file)[0] + '.rollup.json'
+        self._lock = threading.Lock()
+        self.rollups = _empty_rollups()
+        self.offset = 0
+        self._load_rollups()
+        self.catch_up()
+
+    def _load_rollups(self):
+        """
+        Load the saved totals if they are usable; otherwise start from nothing.
+
+        Returns:
+            None
+        """
+        try:
+            with open(self.rollup_file, 'r') as file:
+                saved = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring saved ledger totals: {e}")
+            return
+        try:
+            ledger_size = os.path.getsize(self.ledger_file)
+        except OSError:
+            ledger_size = 0
+        if saved.get('format') != ROLLUP_FORMAT or saved.get('offset', 0) > ledger_size:
+            # Saved for a different ledger; catching up from 0 rebuilds them
+            return
+        self.rollups = saved['rollups']
+        self.offset = saved['offset']
+
+    def _apply(self, row):
+        """
+        Add one ledger line to the totals. The lock must be held.
+
+        Args:
+            row (list): Ledger columns as strings
+
+        Returns:
+            None
+        """
+        invoice_number, date, kind, party, product, quantity, free_items, amount, vat = row
+        quantity = int(quantity)
+        free_items = int(free_items)
+        amount = float(amount)
+        vat = float(vat)
+        day = date[:10]
+        rollups = self.rollups[kind]
+        _add(rollups['product'], product, quantity, free_items, amount, vat)
+        _add(rollups['day'], day, quantity, free_items, amount, vat)
+        _add(rollups[DIMENSIONS[kind][2]], party, quantity, free_items, amount, vat)
+        by_product = rollups['day_product'].get(day)
+        if by_product is None:
+            by_product = rollups['day_product'][day] = {}
+        _add(by_product, product, quantity, free_items, amount, vat)
+
+    def _catch_up(self):
+        """
+        Add the lines appended since the last read, in one streaming pass. The
+        lock must be held.
+
+        Returns:
+            int: Number of lines added
+        """
+        try:
+            size = os.path.getsize(self.ledger_file)
+        except OSError:
+            size = 0
+        if size < self.offset:
+            # The ledger was replaced; start again
+            self.rollups = _empty_rollups()
+            self.offset = 0
+        if size == self.offset:
+            return 0
+        added = 0
+        with open(self.ledger_file, 'rb') as file:
+            file.seek(self.offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # Still being written by another till
+                self.offset += len(line)
+                try:
+                    self._apply(next(csv.reader([line.decode('utf-8')])))
+                    added += 1
+                except (ValueError, KeyError, StopIteration):
+                    print(f"Warning: Skipping invalid ledger line: {line.strip()}")
+        return added
+
+    def catch_up(self):
+        """
+        Add the lines other processes appended since the last read.
+
+        Returns:
+            int: Number of lines added
+        """
+        with self._lock:
+            return self._catch_up()
+
+    def record(self, entries):
+        """
+        Append ledger lines and add them to the totals.
+
+        Args:
+            entries (list): Tuples of the ledger columns
+
+        Returns:
+            None
+
+        Raises:
+            OSError: If the lines could not be written
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(entries)
+        data = buffer.getvalue().encode('utf-8')
+        with self._lock:
+            self._catch_up()
+            # One unbuffered O_APPEND write, so lines from several tills never
+            # interleave and tell() is where our lines really end
+            with open(self.ledger_file, 'ab', buffering=0) as file:
+                if file.write(data) != len(data):
+                    raise OSError("Short write to ledger " + self.ledger_file)
+                end = file.tell()
+            if end == self.offset + len(data):
+                # Nobody else appended in between: add the lines without reading them back
+                for entry in entries:
+                    self._apply([str(value) for value in entry])
+                self.offset = end
+            else:
+                self._catch_up()
+
+    def totals(self, kind, dimension, key):
+        """
+        Get the totals for one product, day, customer or supplier.
+
+        Args:
+            kind (str): 'sale' or 'purchase'
+            dimension (str): One of DIMENSIONS[kind]
+            key (str): Product name, day as YYYY-MM-DD, customer or supplier
+
+        Returns:
+            dict: units, free_items, amount, vat and lines, or None if there are none
+        """
+        with self._lock:
+            self._catch_up()
+            entry = self.rollups[kind][dimension].get(key)
+            return _as_dict(entry) if entry is not None else None
+
+    def report(self, kind, dimension, first_day=None, last_day=None):
+        """
+        Get the totals for every product, day, customer or supplier.
+
+        Without a date range this copies one rollup. With one, product totals
+        are added up from the per day totals of the days in the range.
+
+        Args:
+            kind (str): 'sale' or 'purchase'
+            dimension (str): One of DIMENSIONS[kind]
+            first_day (str): First day as YYYY-MM-DD, or None
+            last_day (str): Last day as YYYY-MM-DD, or None
+
+        Returns:
+            dict: Key -> totals dict
+        """
+        with self._lock:
+            self._catch_up()
+            rollups = self.rollups[kind]
+            if first_day is None and last_day is None:
+                return {key: _as_dict(entry) for key, entry in rollups[dimension].items()}
+            first_day = first_day or ''
+            last_day = last_day or '9999-12-31'
+            if dimension == 'day':
+                return {day: _as_dict(entry) for day, entry in rollups['day'].items()
+                        if first_day <= day <= last_day}
+            if dimension != 'product':
+                raise ValueError("A date range can only be used with the product or day report")
+            combined = {}
+            for day, by_product in rollups['day_product'].items():
+                if first_day <= day <= last_day:
+                    for product, entry in by_product.items():
+                        total = combined.setdefault(product, [0, 0, 0, 0, 0])
+                        for index, value in enumerate(entry):
+                            total[index] += value
+            return {product: _as_dict(entry) for product, entry in combined.items()}
+
+    def rebuild(self):
+        """
+        Recompute every total from the ledger in one streaming pass and save them.
+
+        Returns:
+            int: Number of ledger lines read
+        """
+        with self._lock:
+            self.rollups = _empty_rollups()
+            self.offset = 0
+            lines = self._catch_up()
+        self.save()
+        return lines
+
+    def save(self):
+        """
+        Save the totals so the next start only reads lines appended after now.
+
+        Returns:
+            bool: True if the totals were saved, False otherwise
+        """
+        with self._lock:
+            self._catch_up()
+            data = json.dumps({'format': ROLLUP_FORMAT, 'offset': self.offset,
+                               'rollups': self.rollups}, separators=(',', ':'))
+        try:
+            atomic_write(self.rollup_file, data.encode(), fsync=False)
+            return True
+        except OSError as e:
+            print(f"Error saving ledger totals: {e}")
+            return False
+
+    def close(self):
+        """
+        Save the totals.
+
+        Returns:
+            None
+        """
+        self.save()
+
+
+def main(argv):
+    """
+    Rebuild the ledger totals or print a report.
+
+    Args:
+        argv (list): Command line arguments without the program name
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(prog='ledger.py', description="Sales and purchase ledger")
+    parser.add_argument('--ledger', default=LEDGER_FILE, help="ledger file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help="recompute the totals from the ledger")
+    report = commands.add_parser('report', help="print totals")
+    report.add_argument('dimension', choices=('product', 'day', 'customer', 'supplier'))
+    report.add_argument('key', nargs='?', help="only this product, day, customer or supplier")
+    report.add_argument('--purchases', action='store_true', help="purchases instead of sales")
+    report.add_argument('--from', dest='first_day', help="first day, YYYY-MM-DD")
+    report.add_argument('--to', dest='last_day', help="last day, YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    ledger = Ledger(args.ledger)
+    if args.command == 'rebuild':
+        lines = ledger.rebuild()
+        print(f"Rebuilt the totals from {lines} ledger lines.")
+        return 0
+
+    kind = 'purchase' if args.purchases else 'sale'
+    if args.dimension not in DIMENSIONS[kind]:
+        parser.error(f"{'purchases' if args.purchases else 'sales'} have no {args.dimension} report")
+    try:
+        if args.key is not None and args.first_day is None and args.last_day is None:
+            totals = ledger.totals(kind, args.dimension, args.key)
+            rows = {args.key: totals} if totals else {}
+        else:
+            rows = ledger.report(kind, args.dimension, args.first_day, args.last_day)
+            if args.key is not None:
+                rows = {args.key: rows[args.key]} if args.key in rows else {}
+    except ValueError as e:
+        parser.error(str(e))
+    ledger.save()
+
+    if not rows:
+        print("No matching ledger lines.")
+        return 0
+    amount = 'Revenue' if kind == 'sale' else 'Cost'
+    print(f"{args.dimension.capitalize():<30} {'Units':>8} {'Free':>6} {amount:>14} {'VAT':>12} {'Lines':>7}")
+    print("-" * 82)
+    for key, totals in sorted(rows.items()):
+        print(f"{key:<30.30} {totals['units']:>8} {totals['free_items']:>6} {totals['amount']:>14.2f} "
+              f"{totals['vat']:>12.2f} {totals['lines']:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -3,102 +3,421 @@ WeCare Skin Care Products Management System
 Main module for product display and sales operations.
 """
 
+import argparse
+import atexit
 from datetime import datetime
-from read import read_products_file
-from write import update_product_file
-from operation import (display_products, sell_product, restock_product, 
-                      add_new_product, generate_purchase_invoice, compare_strings_case_insensitive)
-
-def check_digit_(string):
-    is_digit=False
-    for each in string:
-        try:
-            int(each)
-            is_digit = True
-        except ValueError:
-            pass
-    return is_digit
-
-def main():
+import metrics
+from catalog import FIELDS
+from groups import GROUP_FIELDS
+from write import DurabilityPolicy
+from store import CatalogStore
+from storage import TextBackend, SQLiteBackend, RecordBackend
+from validation import check_digit_
+from batch import run_batch
+from importer import import_products
+from service import serve
+import invoice_writer
+from invoice_store import InvoiceStore, ARCHIVE_DIR
+from ledger import Ledger
+from pricing import PricingEngine
+from reorder import ReorderEngine, reorder_low_stock
+from recovery import recover
+from operation import (display_products, sell_product, sell_cart, restock_product, 
+                      add_new_product, generate_purchase_invoice)
+
+# Where the catalog is kept: 'text' (products.txt), 'sqlite' (SQLITE_FILE) or
+# 'records' (RECORD_FILE). Convert between them with storage.py
+STORAGE_BACKEND = 'text'
+SQLITE_FILE = 'products.db'
+RECORD_FILE = 'products.rec'
+
+# Append stock changes to a journal instead of rewriting products.txt each time
+JOURNAL_MODE = True
+JOURNAL_FILE = 'products.journal'
+JOURNAL_MAX_RECORDS = 1000
+JOURNAL_MAX_BYTES = 64 * 1024
+
+# Binary copy of products.txt refreshed on compaction for faster startup (None to disable)
+SNAPSHOT_FILE = 'products.snap'
+
+# Keep invoices in daily segment files under invoice_archive/ instead of one file each
+INVOICE_ARCHIVE = True
+
+# Record every sale and purchase line in LEDGER_FILE with running totals (ledger.py)
+SALES_LEDGER = True
+LEDGER_FILE = 'sales_ledger.csv'
+
+# Markup rules and promotions (pricing.py); without the file every product is
+# sold at MARKUP times cost with buy 3 get 1 free
+PRICING_FILE = 'pricing.json'
+
+# When saved changes are forced to disk: 'fsync', 'group' or 'buffered'
+DURABILITY_MODE = 'fsync'
+GROUP_COMMIT_MS = 50
+GROUP_COMMIT_SIZE = 32
+
+# Stock level at or below which the display's low stock filter shows a product
+LOW_STOCK_LEVEL = 10
+
+# Products at or below the low stock level are topped up to REORDER_LEVEL by
+# "Reorder Low Stock" or --reorder, one purchase invoice per supplier (reorder.py)
+REORDER_LEVEL = 50
+# Seconds between automatic reorders while serving HTTP (None for on demand only)
+REORDER_INTERVAL = None
+
+# Record operation timings and counters (metrics.py); also turned on by --metrics
+METRICS_ENABLED = False
+# Rewritten every METRICS_FLUSH_SECONDS in Prometheus text format (None to only serve /metrics)
+METRICS_FILE = 'metrics.prom'
+METRICS_FLUSH_SECONDS = 10
+
+# Refuse to start on storage that keeps no invoice markers for --recover
+# (recovery.py). Only text mode without the journal keeps none, so by default
+# this is on wherever the chosen storage can keep them
+CRASH_RECOVERY = STORAGE_BACKEND != 'text' or JOURNAL_MODE
+
+def open_catalog(filename, reorder=None):
+    """
+    Open the catalog for sharing with other tills according to the settings above.
+
+    Args:
+        filename (str): Name of the products file, used by the text backend
+        reorder (ReorderEngine): Engine to keep following the catalog, or None
+
+    Returns:
+        CatalogStore: The opened store; its catalog is empty if it could not be
+            read. None if the storage keeps no invoice markers and CRASH_RECOVERY
+            is set
+    """
+    policy = DurabilityPolicy(DURABILITY_MODE, GROUP_COMMIT_MS, GROUP_COMMIT_SIZE)
+    if STORAGE_BACKEND == 'sqlite':
+        backend = SQLiteBackend(SQLITE_FILE, policy)
+    elif STORAGE_BACKEND == 'records':
+        backend = RecordBackend(RECORD_FILE, policy)
+    elif JOURNAL_MODE:
+        backend = TextBackend(filename, JOURNAL_FILE, SNAPSHOT_FILE, policy,
+                              JOURNAL_MAX_RECORDS, JOURNAL_MAX_BYTES)
+    else:
+        backend = TextBackend(filename, policy=policy)
+    if CRASH_RECOVERY and not backend.recoverable:
+        print("Error: This storage keeps no invoice numbers, so a crash could not be checked with --recover.")
+        print("Set JOURNAL_MODE = True, use the 'sqlite' or 'records' backend, or set CRASH_RECOVERY = False.")
+        backend.close()
+        return None
+    try:
+        pricing = PricingEngine.load(PRICING_FILE)
+    except ValueError as e:
+        print(f"Error: {e}. Using the default prices.")
+        pricing = PricingEngine(filename=PRICING_FILE)
+    store = CatalogStore(backend, pricing, reorder)
+    store.open()
+    return store
+
+def print_suggestions(catalog, product_name):
+    """
+    Print products with a similar name or brand after a failed lookup.
+
+    Args:
+        catalog (ProductCatalog): Catalog containing product information
+        product_name (str): Product name as typed
+
+    Returns:
+        None
+    """
+    suggestions = catalog.search_index().suggest(product_name)
+    if suggestions:
+        print("Did you mean: " + ", ".join(suggestions) + "?")
+
+def browse_products(catalog, filename):
+    """
+    Show the catalog a page at a time with sorting and filtering.
+
+    The matching rows are worked out once per sort or filter change, so
+    moving between pages only formats the page being shown.
+
+    Args:
+        catalog (ProductCatalog): Catalog containing product information
+        filename (str): Name of the products file
+
+    Returns:
+        None
+    """
+    options = {}
+    rows = catalog.select_rows()
+    page = 1
+    while True:
+        pages = display_products(catalog, filename, rows, page)
+        if pages == 0:
+            return
+        command = input("[n]ext, [p]revious, page number, [s]ort, [f]ilter, Enter to go back: ").strip().lower()
+        if command == '':
+            return
+        elif command == 'n':
+            page = min(page + 1, pages)
+        elif command == 'p':
+            page = max(page - 1, 1)
+        elif command.isdigit():
+            page = int(command)
+            if not 1 <= page <= pages:
+                print("\nError: Choose a page between 1 and " + str(pages) + ".")
+                page = max(1, min(page, pages))
+        elif command == 's':
+            field = input("Sort by (name, brand, quantity, cost_price, selling_price, origin, "
+                          "supplier; Enter for file order): ").strip().lower()
+            if field and field not in FIELDS:
+                print("\nError: Unknown column '" + field + "'.")
+                continue
+            options['sort_by'] = field or None
+            options['descending'] = bool(field) and input("Descending? (y/n): ").strip() in ('y', 'Y')
+            rows = catalog.select_rows(**options)
+            page = 1
+        elif command == 'f':
+            options['brand'] = input("Brand (Enter for any): ").strip() or None
+            options['origin'] = input("Origin (Enter for any): ").strip() or None
+            options['supplier'] = input("Supplier (Enter for any): ").strip() or None
+            options['max_quantity'] = None
+            if input("Only low stock (" + str(LOW_STOCK_LEVEL) + " or fewer)? (y/n): ").strip() in ('y', 'Y'):
+                options['max_quantity'] = LOW_STOCK_LEVEL
+            rows = catalog.select_rows(**options)
+            page = 1
+            if not rows:
+                print("\nNo products match the filter.")
+        else:
+            print("\nInvalid choice!")
+
+def stock_report(catalog):
+    """
+    Print stock totals per brand, origin or supplier.
+
+    The totals are kept up to date by the catalog's group indexes, so the
+    report costs the same however many products there are.
+
+    Args:
+        catalog (ProductCatalog): Catalog containing product information
+
+    Returns:
+        None
+    """
+    field = input("Group by (brand, origin, supplier): ").strip().lower()
+    if field not in GROUP_FIELDS:
+        print("\nError: Choose brand, origin or supplier.")
+        return
+    value = input("Which " + field + "? (Enter for all): ").strip()
+    if value:
+        totals = catalog.group_totals(field, value)
+        if totals is None:
+            print("\nNo products found for " + field + " '" + value + "'.")
+            return
+        groups = [totals]
+    else:
+        groups = sorted(catalog.group_index(field), key=lambda totals: totals[field].casefold())
+
+    lines = ["", f"{field.capitalize():<20} |{'Products':>9} |{'Units':>9} |{'Value at Cost':>15} |{'Value at Price':>15}",
+             "-" * 76]
+    for totals in groups:
+        lines.append(f"{totals[field][:20]:<20} |{totals['products']:>9} |{totals['units']:>9} |"
+                     f"{'Rs.' + str(totals['cost_value']):>15} |{'Rs.' + str(totals['selling_value']):>15}")
+    print("\n".join(lines))
+
+def reorder_stock(store, reorder):
+    """
+    Restock every product at or below the low stock level and print what was ordered.
+
+    Args:
+        store (CatalogStore): Opened products store
+        reorder (ReorderEngine): The reorder engine
+
+    Returns:
+        None
+    """
+    try:
+        ordered, unknown = reorder_low_stock(store, reorder)
+    except OSError as e:
+        print(f"\nError: {e} Low stock may be only partly reordered; run the reorder again.")
+        return
+    if not ordered and not unknown:
+        print("\nNo products at or below " + str(LOW_STOCK_LEVEL) + " units.")
+    for supplier, units in ordered.items():
+        print(f"\nOrdered {units} units from {supplier}.")
+    if unknown:
+        print("\nNo supplier known for: " + ", ".join(unknown) + ". Restock them manually.")
+
+def main(argv=None):
     """
     Main function to run the WeCare product management system.
     Handles product display, sales, and inventory operations.
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
     
     Returns:
         None
     """
+    parser = argparse.ArgumentParser(description="WeCare Skin Care Products Management System")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="apply sell/restock/add transactions from a CSV or JSONL file")
+    parser.add_argument('--checkpoint', type=int, default=0, metavar='N',
+                        help="in batch mode, save after every N applied transactions")
+    parser.add_argument('--import', dest='import_file', metavar='FILE',
+                        help="add new products from a CSV file, one purchase invoice per supplier")
+    parser.add_argument('--supplier', default='',
+                        help="with --import, supplier for rows that do not name one")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="serve the catalog over HTTP instead of showing the menu")
+    parser.add_argument('--reorder', action='store_true',
+                        help="reorder low stock from each supplier and exit, e.g. from cron")
+    parser.add_argument('--recover', action='store_true',
+                        help="after a crash, check the saved stock changes against the invoices written and exit")
+    parser.add_argument('--metrics', action='store_true',
+                        help="record operation timings and counters")
+    args = parser.parse_args(argv)
+
+    if METRICS_ENABLED or args.metrics:
+        metrics.enable()
+        if METRICS_FILE:
+            # The file is written a last time when the program exits
+            atexit.register(metrics.MetricsFile(METRICS_FILE, METRICS_FLUSH_SECONDS).start().stop)
+
+    if args.serve:
+        host, _, port = args.serve.rpartition(':')
+        if not port.isdigit():
+            parser.error("--serve needs a port number, e.g. 8080 or 0.0.0.0:8080")
+
     filename = 'products.txt'
-    products = read_products_file(filename)
+    # Follows every stock change from here on, also after the store reloads the catalog
+    reorder = ReorderEngine(LOW_STOCK_LEVEL, REORDER_LEVEL)
+    store = open_catalog(filename, reorder)
+    if store is None:
+        return
+    catalog = store.catalog
 
-    if not products:
-        print("Error: No products found. Kindly check the products.txt file.")
+    if args.recover:
+        # Opening the catalog replayed the changes since the last checkpoint
+        recover(store, LEDGER_FILE if SALES_LEDGER else None, ARCHIVE_DIR if INVOICE_ARCHIVE else None)
+        store.close()
+        return
+
+    # Invoices are saved in the background; make sure they reach the disk
+    if INVOICE_ARCHIVE or SALES_LEDGER:
+        invoice_writer.configure(InvoiceStore(ARCHIVE_DIR) if INVOICE_ARCHIVE else None,
+                                 Ledger(LEDGER_FILE) if SALES_LEDGER else None)
+    atexit.register(invoice_writer.shutdown)
+
+    if args.import_file:
+        # Also fills an empty catalog
+        import_products(store, args.import_file, args.supplier)
+        store.close()
+        invoice_writer.shutdown()
+        return
+
+    if not catalog:
+        if STORAGE_BACKEND in ('sqlite', 'records'):
+            target = SQLITE_FILE if STORAGE_BACKEND == 'sqlite' else RECORD_FILE
+            print(f"Error: No products found in {target}. To copy them from products.txt run:")
+            print(f"    python storage.py to-{STORAGE_BACKEND} {filename} {target} --journal {JOURNAL_FILE}")
+        else:
+            print("Error: No products found. Kindly check the products.txt file.")
+        return
+
+    if args.batch:
+        run_batch(store, args.batch, args.checkpoint)
+        store.close()
+        invoice_writer.shutdown()
+        return
+
+    if args.reorder:
+        reorder_stock(store, reorder)
+        store.close()
+        invoice_writer.shutdown()
+        return
+
+    if args.serve:
+        serve(store, host or '127.0.0.1', int(port), reorder, REORDER_INTERVAL)
+        store.close()
+        invoice_writer.shutdown()
         return
 
     while True:
+        invoice_writer.report_failures()
+        # Pick up sales made by other tills since the last choice
+        catalog = store.refresh()
         print("\nOptions:")
         print("1. Display Products")
         print("2. Sell Product")
         print("3. Restock Existing Product")
         print("4. Add New Product")
-        print("5. Exit")
-        choice = input("Enter your choice (1-5): ")
+        print("5. Stock Report")
+        print("6. Reorder Low Stock")
+        print("7. Exit")
+        # Kept next to the options so the prompt and the error grow with the menu
+        choices = "1-7"
+        choice = input("Enter your choice (" + choices + "): ")
 
-        if choice == '5':
+        if choice == '7':
+            store.close()
+            invoice_writer.shutdown()
             print("\nThank you for using WeCare Skin Care Products System!")
             break
             
         elif choice == '1':
-            display_products(products, filename)
+            browse_products(catalog, filename)
+
+        elif choice == '5':
+            stock_report(catalog)
+
+        elif choice == '6':
+            reorder_stock(store, reorder)
             
         elif choice == '2':
-            # Get and validate product name
+            cart = []
+            in_cart = {}
             while True:
-                product_name = input("Enter product name to sell: ")
+                # Get and validate product name
+                while True:
+                    product_name = input("Enter product name to sell: ")
                 
-                # Check if product name is only numbers
-                if check_digit_(product_name):
-                    print("Error: Product name cannot be just numbers.")
-                    continue
+                    # Check if product name is only numbers
+                    if check_digit_(product_name):
+                        print("Error: Product name cannot be just numbers.")
+                        continue
                 
-                # Check if product exists before asking for more details
-                product_exists = False
-                for product in products:
-                    if compare_strings_case_insensitive(product['name'], product_name):
-                        product_exists = True
-                        break
-                        
-                if not product_exists:
-                    print("\nError: Product not found.")
-                    continue
+                    # Check if product exists before asking for more details
+                    if not catalog.contains(product_name):
+                        print("\nError: Product not found.")
+                        print_suggestions(catalog, product_name)
+                        continue
                 
-                break  # Valid product name, exit the loop
+                    break  # Valid product name, exit the loop
                 
-            # Get and validate quantity
-            while True:
-                try:
-                    quantity = int(input("Enter quantity to sell: "))
-                    if quantity <= 0:
-                        print("Invalid quantity! Please enter a positive number.")
-                        continue
+                # Get and validate quantity
+                while True:
+                    try:
+                        quantity = int(input("Enter quantity to sell: "))
+                        if quantity <= 0:
+                            print("Invalid quantity! Please enter a positive number.")
+                            continue
                     
-                    # Check if sufficient stock is available
-                    sufficient_stock = False
-                    for product in products:
-                        if compare_strings_case_insensitive(product['name'], product_name):
-                            if product['quantity'] >= quantity:
-                                sufficient_stock = True
-                            else:
-                                print("\nError: Insufficient stock. Available:", product['quantity'])
-                            break
+                        # Check if sufficient stock is available, counting free items
+                        # and what is already in the cart
+                        product = catalog.get(product_name)
+                        row = catalog.row_of(product_name)
+                        available = product['quantity'] - in_cart.get(row, 0)
+                        free_items = catalog.sale_terms(row, quantity)[0]
+                        if available < quantity + free_items:
+                            print("\nError: Insufficient stock (including free items). Available:", available)
+                            continue
                     
-                    if not sufficient_stock:
-                        continue
+                        break  # Valid quantity, exit the loop
                     
-                    break  # Valid quantity, exit the loop
-                    
-                except ValueError:
-                    print("Invalid input! Please enter a number.")
-            
+                    except ValueError:
+                        print("Invalid input! Please enter a number.")
+
+                cart.append((product_name, quantity))
+                in_cart[row] = in_cart.get(row, 0) + quantity + free_items
+
+                if input("Add another product to the cart? (y/n): ").strip() not in ('y', 'Y'):
+                    break
+
             # Get and validate customer name
             while True:
                 customer_name = input("Enter customer name: ")
@@ -113,9 +432,16 @@ def main():
                 
                 break  # Valid customer name, exit the loop
 
-            success, products = sell_product(products, product_name, quantity, customer_name)
-            if success:
-                update_product_file(products, filename)
+            # Stock is checked again inside the transaction, so a sale made by
+            # another till in the meantime cannot be oversold
+            try:
+                with invoice_writer.get_writer().deferred(), store.transaction() as catalog:
+                    if len(cart) == 1:
+                        success, catalog = sell_product(catalog, product_name, quantity, customer_name)
+                    else:
+                        success, catalog = sell_cart(catalog, cart, customer_name)
+            except OSError as e:
+                print(f"\nError: {e} The sale was not made; the invoice above is void.")
                 
         elif choice == '3':
             # Get and validate product name
@@ -128,14 +454,9 @@ def main():
                     continue
                 
                 # Check if product exists
-                product_exists = False
-                for product in products:
-                    if compare_strings_case_insensitive(product['name'], product_name):
-                        product_exists = True
-                        break
-                
-                if not product_exists:
+                if not catalog.contains(product_name):
                     print("\nError: Product not found.")
+                    print_suggestions(catalog, product_name)
                     continue
                 
                 break  # Valid product name, exit the loop
@@ -167,9 +488,11 @@ def main():
                 
                 break  # Valid supplier name, exit the loop
 
-            success, products = restock_product(products, product_name, quantity, supplier_name)
-            if success:
-                update_product_file(products, filename)
+            try:
+                with invoice_writer.get_writer().deferred(), store.transaction() as catalog:
+                    success, catalog = restock_product(catalog, product_name, quantity, supplier_name)
+            except OSError as e:
+                print(f"\nError: {e} The restock was not made; the invoice above is void.")
 
         elif choice == '4':
             print("\nAdd New Product")
@@ -188,13 +511,7 @@ def main():
                     continue
                 
                 # Check if product already exists
-                product_exists = False
-                for product in products:
-                    if compare_strings_case_insensitive(product['name'], product_name):
-                        product_exists = True
-                        break
-                
-                if product_exists:
+                if catalog.contains(product_name):
                     print("\nError: Product already exists. Use restock option instead.")
                     continue
                 
@@ -268,14 +585,18 @@ def main():
                 
                 break  # Valid supplier name, exit the loop
 
-            success, products = add_new_product(products, product_name, brand, quantity, 
-                                              cost_price, origin, supplier_name)
+            try:
+                with invoice_writer.get_writer().deferred(), store.transaction() as catalog:
+                    success, catalog = add_new_product(catalog, product_name, brand, quantity, 
+                                                     cost_price, origin, supplier_name)
+            except OSError as e:
+                print(f"\nError: {e} The product was not added; the invoice above is void.")
+                success = False
             if success:
-                update_product_file(products, filename)
                 print("\nProduct added successfully!")
 
         else:
-            print("Invalid choice! Please sct 1-5.")
+            print("Invalid choice! Please select " + choices + ".")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+"""
+Metrics Module
+Timers and counters for the hot paths, exported as Prometheus text.
+
+Instrumentation is off until enable() is called. While it is off, a timed
+function costs one extra call and one flag check, and count() returns at
+once, so the instrumentation can stay in the code permanently.
+
+Each timed operation keeps a latency histogram with fixed buckets, a quarter
+decade apart from 1 microsecond to 10 seconds. Percentiles are estimated from
+the buckets, so they are accurate to within one bucket. Counters track sales,
+restocks, rejected transactions and bytes read and written.
+
+The metrics are exported as Prometheus text, by MetricsFile to a file that is
+rewritten periodically, or by the HTTP service at GET /metrics.
+"""
+
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Set by enable() and disable(); read on every instrumented call
+ENABLED = False
+
+# Upper bounds of the latency buckets in nanoseconds, 1 us to 10 s
+BUCKETS = tuple(round(10 ** (3 + step / 4)) for step in range(29))
+
+# Percentiles exported for each operation
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Counters always exported, even before anything is counted
+COUNTERS = ('sales', 'units_sold', 'restocks', 'products_added', 'rejects',
+            'read_bytes', 'written_bytes', 'invoices_written')
+
+PREFIX = 'wecare_'
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = dict.fromkeys(COUNTERS, 0)
+
+
+class Histogram:
+    """
+    Latency distribution of one operation.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def observe(self, nanoseconds):
+        """
+        Record one duration. The caller must hold the metrics lock.
+
+        Args:
+            nanoseconds (int): Duration of the operation
+
+        Returns:
+            None
+        """
+        self.counts[bisect_left(BUCKETS, nanoseconds)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.maximum:
+            self.maximum = nanoseconds
+
+    def percentile(self, fraction):
+        """
+        Estimate a percentile by interpolating within its bucket.
+
+        Args:
+            fraction (float): Percentile as a fraction, e.g. 0.99
+
+        Returns:
+            float: Duration in seconds, 0.0 if nothing was recorded
+        """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = BUCKETS[index - 1] if index else 0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.maximum
+                upper = min(upper, self.maximum)
+                estimate = lower + (upper - lower) * (target - seen) / count
+                return estimate / 1e9
+            seen += count
+        return self.maximum / 1e9
+
+
+def enable():
+    """
+    Start recording metrics.
+
+    Returns:
+        None
+    """
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    """
+    Stop recording metrics; what was recorded is kept.
+
+    Returns:
+        None
+    """
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """
+    Forget everything recorded so far.
+
+    Returns:
+        None
+    """
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _counters.update(dict.fromkeys(COUNTERS, 0))
+
+
+def observe(name, nanoseconds):
+    """
+    Record the duration of an operation.
+
+    Args:
+        name (str): Operation name
+        nanoseconds (int): Duration in nanoseconds
+
+    Returns:
+        None
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(nanoseconds)
+
+
+def count(name, amount=1):
+    """
+    Add to a counter if metrics are enabled.
+
+    Args:
+        name (str): Counter name, e.g. 'sales' or 'written_bytes'
+        amount (int): Amount to add
+
+    Returns:
+        None
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def start():
+    """
+    Start timing a section of code; pass the result to stop().
+
+    Returns:
+        int: Start time in nanoseconds, or 0 if metrics are disabled
+    """
+    return time.perf_counter_ns() if ENABLED else 0
+
+
+def stop(name, started):
+    """
+    Record the time since start() if it was timing.
+
+    Args:
+        name (str): Operation name
+        started (int): Value returned by start()
+
+    Returns:
+        None
+    """
+    if started:
+        observe(name, time.perf_counter_ns() - started)
+
+
+def timed(name):
+    """
+    Decorator recording the duration of every call of a function.
+
+    Args:
+        name (str): Operation name the durations are recorded under
+
+    Returns:
+        callable: The decorator
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            started = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter_ns() - started)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """
+    Copy the current metrics.
+
+    Returns:
+        dict: 'counters' (name -> value) and 'operations' (name -> count,
+            total_seconds, max_seconds and p50/p95/p99 in seconds)
+    """
+    with _lock:
+        operations = {}
+        for name, histogram in _histograms.items():
+            operations[name] = {
+                'count': histogram.count,
+                'total_seconds': histogram.total / 1e9,
+                'max_seconds': histogram.maximum / 1e9,
+                'p50': histogram.percentile(0.5),
+                'p95': histogram.percentile(0.95),
+                'p99': histogram.percentile(0.99)
+            }
+        return {'counters': dict(_counters), 'operations': operations}
+
+
+def render_prometheus():
+    """
+    Format the metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics text
+    """
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            metric = PREFIX + name + '_total'
+            lines.append('# TYPE ' + metric + ' counter')
+            lines.append(f'{metric} {value}')
+
+        histograms = sorted(_histograms.items())
+        metric = PREFIX + 'operation_seconds'
+        lines.append('# HELP ' + metric + ' Duration of instrumented operations.')
+        lines.append('# TYPE ' + metric + ' histogram')
+        for name, histogram in histograms:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{operation="{name}",le="{bound / 1e9:.6g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{operation="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{operation="{name}"}} {histogram.total / 1e9:.9f}')
+            lines.append(f'{metric}_count{{operation="{name}"}} {histogram.count}')
+
+        metric = PREFIX + 'operation_quantile_seconds'
+        lines.append('# HELP ' + metric + ' Percentiles estimated from the histogram buckets.')
+        lines.append('# TYPE ' + metric + ' gauge')
+        for name, histogram in histograms:
+            for quantile in QUANTILES:
+                lines.append(f'{metric}{{operation="{name}",quantile="{quantile}"}} '
+                             f'{histogram.percentile(quantile):.9f}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsFile:
+    """
+    Rewrites a metrics file in Prometheus text format every few seconds, e.g.
+    for the node exporter's textfile collector.
+    """
+
+    def __init__(self, filename, interval=10.0):
+        """
+        Describe the file; call start() to begin writing it.
+
+        Args:
+            filename (str): Name of the metrics file
+            interval (float): Seconds between rewrites
+        """
+        self.filename = filename
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start rewriting the file on a background thread.
+
+        Returns:
+            MetricsFile: This object
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Rewrite the file now. Readers never see a half-written file.
+
+        Returns:
+            bool: True if the file was written, False otherwise
+        """
+        temp_name = self.filename + '.tmp'
+        try:
+            with open(temp_name, 'w') as file:
+                file.write(render_prometheus())
+            os.replace(temp_name, self.filename)
+            return True
+        except OSError as e:
+            print(f"Error writing metrics file: {e}")
+            return False
+
+    def stop(self):
+        """
+        Stop the background thread and write the file a last time.
+
+        Returns:
+            None
+        """
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -4,168 +4,131 @@ Handles core business operations like displaying products, sales, and invoice ge
 """
 
 from datetime import datetime
+import sys
+import zlib
+
+import metrics
+from invoice_ids import next_invoice_number
+from invoice_writer import get_writer
+from invoice_render import (render_sales_invoice, render_purchase_invoice,
+                            render_multi_purchase_invoice)
 
 # Fixed VAT rate 13 %
 VAT_RATE = 0.13 
 SHOP_VAT_NUMBER = "NP12345678"  # Fixed VAT number for the shop to add when selling
 
-def display_products(products, filename):
+# Print each invoice after saving it (turned off for batch runs)
+ECHO_INVOICES = True
+
+# Products shown per page by display_products
+PAGE_SIZE = 20
+
+# Inventory table layout: name, brand, quantity, cost price, selling price, origin
+_TABLE_HEADER = (
+    "\n" + "=" * 92 + "\n"
+    + " " * 25 + " WeCare Skin Care Products Inventory\n"
+    + "=" * 92 + "\n"
+    "Product Name         |Brand           |Quantity |  Cost Price | Selling Price |Origin          \n"
+    + "-" * 92
+)
+_TABLE_ROW = "{0:<20.20} |{1:<15.15} |{2:>8} |{3:>12} |{4:>14} |{5:<15.15}".format
+
+@metrics.timed('display_products')
+def display_products(catalog, filename, rows=None, page=1, page_size=PAGE_SIZE):
     """
-    Display all products with their details in a nicely formatted table.
-    
+    Display one page of products in a nicely formatted table.
+
+    The page is formatted into a single string and written at once, so the
+    time taken depends on the page size rather than the size of the catalog.
+
     Args:
-        products (list): List of dictionaries containing product information
+        catalog (ProductCatalog): Catalog containing product information
         filename (str): Name of the file containing product data
-        
+        rows (list): Row numbers to show, e.g. from catalog.select_rows;
+            every product in file order by default
+        page (int): Page number, starting at 1
+        page_size (int): Products per page
+
     Returns:
-        None
+        int: Number of pages
     """
-    if not products:
+    if not catalog:
         print("\nNo products available.")
-        return
-
-    # Define column widths
-    name_width = 20
-    brand_width = 15
-    quantity_width = 8
-    cost_price_width = 12
-    selling_price_width = 14
-    origin_width = 15
-
-    # Print header
-    print("\n" + "=" * 92)
-    print(" "*25,"WeCare Skin Care Products Inventory")
-    print("=" * 92)
-    
-    # Print column headers using manual padding
-    header = "Product Name" + " " * (name_width - len("Product Name")) + " |"
-    header += "Brand" + " " * (brand_width - len("Brand")) + " |"
-    
-    # Right align quantity with manual padding
-    quantity_spaces = quantity_width - len("Quantity")
-    header += " " * quantity_spaces + "Quantity" + " |"
-    
-    # Right align cost price with manual padding
-    cost_spaces = cost_price_width - len("Cost Price")
-    header += " " * cost_spaces + "Cost Price" + " |"
-    
-    # Right align selling price with manual padding
-    selling_spaces = selling_price_width - len("Selling Price")
-    header += " " * selling_spaces + "Selling Price" + " |"
-    
-    header += "Origin" + " " * (origin_width - len("Origin")) + " "
-    print(header)
-    print("-" * 92)
-    
-    # Print each product using manual padding
-    for product in products:
-        # If name too long it slices and takes only the character that fits from the first
-        name = product['name']
-        if len(name) > name_width:
-            name = name[:name_width]
-        
-        # Left align name with manual padding
-        row = name + " " * (name_width - len(name)) + " |"
-        
-        # it also slices brand name same as name
-        brand = product['brand']
-        if len(brand) > brand_width:
-            brand = brand[:brand_width]
-            
-        # Left align brand with manual padding
-        row += brand + " " * (brand_width - len(brand)) + " |"
-        
-        # Right align quantity with manual padding
-        quantity_str = str(product['quantity'])
-        quantity_spaces = quantity_width - len(quantity_str)
-        row += " " * quantity_spaces + quantity_str + " |"
-        
-        # Right align cost price with manual padding
-        cost_str = "Rs." + str(product['cost_price'])
-        cost_spaces = cost_price_width - len(cost_str)
-        row += " " * cost_spaces + cost_str + " |"
-        
-        # Right align selling price with manual padding
-        selling_str = "Rs." + str(product['selling_price'])
-        selling_spaces = selling_price_width - len(selling_str)
-        row += " " * selling_spaces + selling_str + " |"
-        
-        # If origin too long it slices and takes only the character that fits from the first
-        origin = product['origin']
-        if len(origin) > origin_width:
-            origin = origin[:origin_width]
-            
-        # Left align origin with manual padding
-        row += origin + " " * (origin_width - len(origin))
-        
-        print(row)
-    
-    print("-" * 92)
-    print("Total Products: " + str(len(products)))
-    print("=" * 92 + "\n")
+        return 0
+
+    if rows is None:
+        rows = catalog.select_rows()
+    pages = max(1, -(-len(rows) // page_size))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * page_size
 
-def sell_product(products, product_name, quantity, customer_name):
+    lines = [_TABLE_HEADER]
+    for row in rows[start:start + page_size]:
+        product = catalog.view(row)
+        # Names, brands and origins too long for their column are cut off
+        lines.append(_TABLE_ROW(product['name'], product['brand'], product['quantity'],
+                                "Rs." + str(product['cost_price']),
+                                "Rs." + str(product['selling_price']), product['origin']))
+    lines.append("-" * 92)
+    if len(rows) == len(catalog):
+        lines.append("Total Products: " + str(len(catalog)))
+    else:
+        lines.append("Matching Products: " + str(len(rows)) + " of " + str(len(catalog)))
+    if pages > 1:
+        lines.append("Page " + str(page) + " of " + str(pages))
+    lines.append("=" * 92 + "\n\n")
+    sys.stdout.write("\n".join(lines))
+    return pages
+
+@metrics.timed('sell_product')
+def sell_product(catalog, product_name, quantity, customer_name):
     """
-    Process a sale transaction with buy 3 get 1 free policy.
+    Process a sale transaction, applying the product's promotion.
     
     Args:
-        products (list): List of dictionaries containing product information
+        catalog (ProductCatalog): Catalog containing product information
         product_name (str): Name of the product to sell
         quantity (int): Quantity of product to sell
         customer_name (str): Name of the customer making the purchase
         
     Returns:
-        tuple: (bool, list) - Success status and updated products list
+        tuple: (bool, ProductCatalog) - Success status and updated catalog
     """
-    for product in products:
-        if compare_strings_case_insensitive(product['name'], product_name):
-            if product['quantity'] >= quantity:
-                free_items = quantity // 3
-                total_items = quantity + free_items
-                
-                if product['quantity'] < total_items:
-                    print("\nError: Insufficient stock for free items. Available: " + str(product['quantity']))
-                    return False, products
-
-                total_price = product['selling_price'] * quantity
-                product['quantity'] -= total_items
-
-                # Generate invoice number manually
-                now = datetime.now()
-                # Manual padding with zeros
-                year_str = str(now.year)
-                month_str = str(now.month)
-                if len(month_str) == 1:
-                    month_str = "0" + month_str
-                    
-                day_str = str(now.day)
-                if len(day_str) == 1:
-                    day_str = "0" + day_str
-                    
-                hour_str = str(now.hour)
-                if len(hour_str) == 1:
-                    hour_str = "0" + hour_str
-                    
-                minute_str = str(now.minute)
-                if len(minute_str) == 1:
-                    minute_str = "0" + minute_str
-                    
-                second_str = str(now.second)
-                if len(second_str) == 1:
-                    second_str = "0" + second_str
-                    
-                invoice_number = year_str + month_str + day_str + hour_str + minute_str + second_str
-
-                generate_invoice(product, quantity, free_items, total_price, invoice_number, customer_name)
-                return True, products
-            else:
-                print("\nError: Insufficient stock. Available: " + str(product['quantity']))
-                return False, products
-    print("\nError: Product not found.")
-    return False, products
-
-
-def generate_invoice(product, quantity, free_items, total_price, invoice_number, customer_name):
+    started = metrics.start()
+    product = catalog.get(product_name)
+    metrics.stop('lookup', started)
+    if product is None:
+        print("\nError: Product not found.")
+        metrics.count('rejects')
+        return False, catalog
+
+    if product['quantity'] < quantity:
+        print("\nError: Insufficient stock. Available: " + str(product['quantity']))
+        metrics.count('rejects')
+        return False, catalog
+
+    free_items, total_price, promotion = catalog.sale_terms(catalog.row_of(product_name), quantity)
+    total_items = quantity + free_items
+
+    if product['quantity'] < total_items:
+        print("\nError: Insufficient stock for free items. Available: " + str(product['quantity']))
+        metrics.count('rejects')
+        return False, catalog
+
+    catalog.adjust_quantity(product['name'], -total_items)
+
+    invoice_number = next_invoice_number()
+    catalog.record_invoice(invoice_number)
+
+    generate_invoice(product, quantity, free_items, total_price, invoice_number, customer_name,
+                     promotion)
+    metrics.count('sales')
+    metrics.count('units_sold', total_items)
+    return True, catalog
+
+
+def generate_invoice(product, quantity, free_items, total_price, invoice_number, customer_name,
+                     promotion=None):
     """
     Generate and save a sales invoice including free items and VAT.
     
@@ -176,194 +139,164 @@ def generate_invoice(product, quantity, free_items, total_price, invoice_number,
         total_price (int): Total price before VAT
         invoice_number (str): Unique invoice number
         customer_name (str): Name of the customer
+        promotion (str): Name of the promotion applied, or None
         
     Returns:
         None
     """
-    # Get current date and time
-    now = datetime.now()
-    
-    # Manual padding with zeros for date and time
-    year_str = str(now.year)
-    month_str = str(now.month)
-    if len(month_str) == 1:
-        month_str = "0" + month_str
-        
-    day_str = str(now.day)
-    if len(day_str) == 1:
-        day_str = "0" + day_str
-        
-    hour_str = str(now.hour)
-    if len(hour_str) == 1:
-        hour_str = "0" + hour_str
-        
-    minute_str = str(now.minute)
-    if len(minute_str) == 1:
-        minute_str = "0" + minute_str
-        
-    second_str = str(now.second)
-    if len(second_str) == 1:
-        second_str = "0" + second_str
-    
-    # Format date manually
-    date_str = year_str + "-" + month_str + "-" + day_str
-    time_str = hour_str + ":" + minute_str + ":" + second_str
-    datetime_str = date_str + " " + time_str
-    
-    # Calculate VAT
-    vat_amount = total_price * VAT_RATE
-    total_with_vat = total_price + vat_amount
-    
-    invoice = "\n=== WeCare SKINCARE SYSTEM ===\n"
-    invoice += "        SALES INVOICE\n"
-    invoice += "==============================\n\n"
-    invoice += "Invoice No: " + invoice_number + "\n"
-    invoice += "Date: " + datetime_str + "\n"
-    invoice += "VAT No: " + SHOP_VAT_NUMBER + "\n"
-    invoice += "Customer Name: " + customer_name + "\n\n"
-    invoice += "Product Details:\n"
-    invoice += "  Name: " + product['name'] + "\n"
-    invoice += "  Brand: " + product['brand'] + "\n"
-    invoice += "  Origin: " + product['origin'] + "\n"
-    invoice += "  Quantity Purchased: " + str(quantity) + "\n"
-    invoice += "  Free Items: " + str(free_items) + "\n"
-    invoice += "  Total Items: " + str(quantity + free_items) + "\n"
-    invoice += "  Price per item: Rs. " + str(product['selling_price']) + "\n"
-    invoice += "------------------------------\n"
-    invoice += "Subtotal: Rs. " + str(total_price) + "\n"
-    invoice += "VAT (" + str(int(VAT_RATE * 100)) + "%): Rs. " + str(round(vat_amount, 2)) + "\n"
-    invoice += "Total Amount: Rs. " + str(round(total_with_vat, 2)) + "\n"
-
-    # Only add the promotional message if free items were given
-    if free_items > 0:
-        invoice += "\n*** Buy 3 Get 1 Free Applied! ***"
-        
-    invoice += "\nThank you for choosing WeCare Skincare SYSTEM!\n"
-    invoice += "==============================\n"
-    
-    try:
-        with open("invoices/invoice_" + invoice_number + ".txt", 'w') as f:
-            f.write(invoice)
+    item = {'product': product, 'quantity': quantity, 'free_items': free_items, 'total_price': total_price,
+            'promotion': promotion}
+    date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    invoice = render_sales_invoice(invoice_number, date, customer_name, [item], VAT_RATE, SHOP_VAT_NUMBER)
+
+    get_writer().submit('sales', invoice_number, invoice,
+                        _sales_entries(invoice_number, date, customer_name, [item]))
+    if ECHO_INVOICES:
         print("\nInvoice generated successfully!")
         print(invoice)
-    except:
-        print("\nWarning: Could not save invoice to file.")
-        print("\nInvoice details:")
+
+@metrics.timed('sell_cart')
+def sell_cart(catalog, lines, customer_name):
+    """
+    Process a sale of several products with a single invoice.
+
+    Every line is checked before any stock is taken, so either the whole cart
+    is sold or nothing changes. Each line gets its product's promotion.
+
+    Args:
+        catalog (ProductCatalog): Catalog containing product information
+        lines (list): (product_name, quantity) pairs
+        customer_name (str): Name of the customer making the purchase
+
+    Returns:
+        tuple: (bool, ProductCatalog) - Success status and updated catalog
+    """
+    if not lines:
+        print("\nError: The cart is empty.")
+        metrics.count('rejects')
+        return False, catalog
+
+    # Validate every line and work out the units needed per product
+    items = []
+    needed = {}
+    started = metrics.start()
+    for product_name, quantity in lines:
+        product = catalog.get(product_name)
+        if product is None:
+            print("\nError: Product not found: " + product_name)
+            metrics.count('rejects')
+            return False, catalog
+        if quantity <= 0:
+            print("\nError: Invalid quantity for " + product['name'])
+            metrics.count('rejects')
+            return False, catalog
+
+        row = catalog.row_of(product_name)
+        free_items, total_price, promotion = catalog.sale_terms(row, quantity)
+        needed[row] = needed.get(row, 0) + quantity + free_items
+        if product['quantity'] < needed[row]:
+            print("\nError: Insufficient stock for " + product['name'] +
+                  ". Available: " + str(product['quantity']))
+            metrics.count('rejects')
+            return False, catalog
+
+        items.append({
+            'product': product,
+            'quantity': quantity,
+            'free_items': free_items,
+            'total_price': total_price,
+            'promotion': promotion
+        })
+
+    metrics.stop('lookup', started)
+
+    # All lines are valid, take the stock
+    units = 0
+    for item in items:
+        units += item['quantity'] + item['free_items']
+        catalog.adjust_quantity(item['product']['name'], -(item['quantity'] + item['free_items']))
+
+    invoice_number = next_invoice_number()
+    catalog.record_invoice(invoice_number)
+    generate_cart_invoice(items, invoice_number, customer_name)
+    metrics.count('sales')
+    metrics.count('units_sold', units)
+    return True, catalog
+
+
+def generate_cart_invoice(items, invoice_number, customer_name):
+    """
+    Generate and save one sales invoice covering several products.
+
+    Args:
+        items (list): Dictionaries with product, quantity, free_items and total_price
+        invoice_number (str): Unique invoice number
+        customer_name (str): Name of the customer
+
+    Returns:
+        None
+    """
+    date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    invoice = render_sales_invoice(invoice_number, date, customer_name, items, VAT_RATE, SHOP_VAT_NUMBER)
+
+    get_writer().submit('sales', invoice_number, invoice,
+                        _sales_entries(invoice_number, date, customer_name, items))
+    if ECHO_INVOICES:
+        print("\nInvoice generated successfully!")
         print(invoice)
 
-def restock_product(products, product_name, quantity, supplier_name):
+@metrics.timed('restock_product')
+def restock_product(catalog, product_name, quantity, supplier_name):
     """
     Restock an existing product and generate purchase invoice with VAT.
     
     Args:
-        products (list): List of dictionaries containing product information
+        catalog (ProductCatalog): Catalog containing product information
         product_name (str): Name of the product to restock
         quantity (int): Quantity to add to inventory
         supplier_name (str): Name of the supplier
         
     Returns:
-        tuple: (bool, list) - Success status and updated products list
+        tuple: (bool, ProductCatalog) - Success status and updated catalog
     """
-    for product in products:
-        # Compare strings without using .lower()
-        product_name_input = product_name
-        product_name_stored = product['name']
-        
-        # Manual case-insensitive comparison
-        if compare_strings_case_insensitive(product_name_stored, product_name_input):
-            product['quantity'] += quantity
-            
-            # Generate purchase invoice
-            now = datetime.now()
-            # Manual padding with zeros
-            month_str = str(now.month)
-            if len(month_str) == 1:
-                month_str = "0" + month_str
-                
-            day_str = str(now.day)
-            if len(day_str) == 1:
-                day_str = "0" + day_str
-                
-            hour_str = str(now.hour)
-            if len(hour_str) == 1:
-                hour_str = "0" + hour_str
-                
-            minute_str = str(now.minute)
-            if len(minute_str) == 1:
-                minute_str = "0" + minute_str
-                
-            second_str = str(now.second)
-            if len(second_str) == 1:
-                second_str = "0" + second_str
-                
-            invoice_number = str(now.year) + month_str + day_str + hour_str + minute_str + second_str
-            
-            # Calculate costs with VAT
-            subtotal = quantity * product['cost_price']
-            vat_amount = subtotal * VAT_RATE
-            total_amount = subtotal + vat_amount
-            
-            # Generate "random" supplier VAT number using microseconds from datetime
-            micro_seconds = str(now.microsecond)
-            # Manual padding to ensure 8 digits
-            while len(micro_seconds) < 8:
-                micro_seconds = "0" + micro_seconds
-            if len(micro_seconds) > 8:
-                micro_seconds = micro_seconds[:8]
-            supplier_vat = "SUP" + micro_seconds
-            
-            invoice = "\n=== WeCare Skincare SYSTEM ===\n"
-            invoice += "        PURCHASE INVOICE\n"
-            invoice += "==============================\n\n"
-            invoice += "Invoice No: " + invoice_number + "\n"
-            
-            # Format date manually
-            date_str = str(now.year) + "-" + month_str + "-" + day_str
-            time_str = hour_str + ":" + minute_str + ":" + second_str
-            invoice += "Date: " + date_str + " " + time_str + "\n"
-            invoice += "Supplier: " + supplier_name + "\n"
-            invoice += "Supplier VAT No: " + supplier_vat + "\n\n"
-            invoice += "Product Details:\n"
-            invoice += "  Name: " + product['name'] + "\n"
-            invoice += "  Brand: " + product['brand'] + "\n"
-            invoice += "  Origin: " + product['origin'] + "\n"
-            invoice += "  Quantity: " + str(quantity) + "\n"
-            invoice += "  Cost per item: Rs. " + str(product['cost_price']) + "\n"
-            invoice += "------------------------------\n"
-            invoice += "Subtotal: Rs. " + str(subtotal) + "\n"
-            invoice += "VAT (" + str(int(VAT_RATE * 100)) + "%): Rs. " + str(round(vat_amount, 2)) + "\n"
-            invoice += "Total Amount: Rs. " + str(round(total_amount, 2)) + "\n\n"
-            invoice += "==============================\n"
-
-            try:
-                # Try to create the directory by writing to a file
-                try:
-                    with open("purchase_invoices/test_dir.txt", 'w') as f:
-                        f.write("Test directory creation")
-                except:
-                    print("\nWarning: Could not create purchase_invoices directory.")
-                    
-                invoice_file = "purchase_invoices/purchase_invoice_" + invoice_number + ".txt"
-                with open(invoice_file, 'w') as f:
-                    f.write(invoice)
-                print("\nPurchase invoice generated successfully!")
-                print(invoice)
-            except:
-                print("\nWarning: Could not save purchase invoice to file.")
-                print("\nPurchase Invoice details:")
-                print(invoice)
-            
-            return True, products
+    started = metrics.start()
+    product = catalog.get(product_name)
+    metrics.stop('lookup', started)
+    if product is None:
+        print("\nError: Product not found in inventory.")
+        metrics.count('rejects')
+        return False, catalog
+
+    catalog.adjust_quantity(product['name'], quantity)
+    catalog.set_supplier(product['name'], supplier_name.strip())
     
-    print("\nError: Product not found in inventory.")
-    return False, products
+    # Generate purchase invoice
+    now = datetime.now()
+    invoice_number = next_invoice_number()
+    catalog.record_invoice(invoice_number)
+    
+    date = now.strftime("%Y-%m-%d %H:%M:%S")
+    invoice = render_purchase_invoice(invoice_number, date, supplier_name,
+                                      supplier_vat_number(supplier_name), product, quantity, VAT_RATE)
+
+    amount = product['cost_price'] * quantity
+    get_writer().submit('purchase', invoice_number, invoice,
+                        [(invoice_number, date, 'purchase', supplier_name.strip(), product['name'],
+                          quantity, 0, amount, round(amount * VAT_RATE, 2))])
+    if ECHO_INVOICES:
+        print("\nPurchase invoice generated successfully!")
+        print(invoice)
+    
+    metrics.count('restocks')
+    return True, catalog
 
-def add_new_product(products, product_name, brand, quantity, cost_price, origin, supplier_name):
+@metrics.timed('add_new_product')
+def add_new_product(catalog, product_name, brand, quantity, cost_price, origin, supplier_name):
     """
     Add a completely new product to inventory and generate purchase invoice with VAT.
     
     Args:
-        products (list): List of dictionaries containing product information
+        catalog (ProductCatalog): Catalog containing product information
         product_name (str): Name of the new product
         brand (str): Brand of the new product
         quantity (int): Initial quantity to add
@@ -372,107 +305,37 @@ def add_new_product(products, product_name, brand, quantity, cost_price, origin,
         supplier_name (str): Name of the supplier
         
     Returns:
-        tuple: (bool, list) - Success status and updated products list
+        tuple: (bool, ProductCatalog) - Success status and updated catalog
     """
     # Check if product already exists
-    for product in products:
-        # Manual case-insensitive comparison
-        if compare_strings_case_insensitive(product['name'], product_name):
-            print("\nError: Product already exists. Use restock option instead.")
-            return False, products
-
-    # Create new product with selling price as 2x of cost price
-    new_product = {
-        'name': product_name,
-        'brand': brand,
-        'quantity': quantity,
-        'cost_price': cost_price,
-        'selling_price': cost_price * 2,  # 2x markup
-        'origin': origin
-    }
-    products.append(new_product)
+    if catalog.contains(product_name):
+        print("\nError: Product already exists. Use restock option instead.")
+        metrics.count('rejects')
+        return False, catalog
+
+    # Selling price is derived from the cost price by the catalog
+    catalog.add_row(product_name, brand, quantity, cost_price, origin, supplier_name.strip())
 
     # Generate purchase invoice
     now = datetime.now()
-    # Manual padding with zeros
-    month_str = str(now.month)
-    if len(month_str) == 1:
-        month_str = "0" + month_str
-        
-    day_str = str(now.day)
-    if len(day_str) == 1:
-        day_str = "0" + day_str
-        
-    hour_str = str(now.hour)
-    if len(hour_str) == 1:
-        hour_str = "0" + hour_str
-        
-    minute_str = str(now.minute)
-    if len(minute_str) == 1:
-        minute_str = "0" + minute_str
-        
-    second_str = str(now.second)
-    if len(second_str) == 1:
-        second_str = "0" + second_str
-        
-    invoice_number = str(now.year) + month_str + day_str + hour_str + minute_str + second_str
-    
-    # Calculate costs with VAT
-    subtotal = quantity * cost_price
-    vat_amount = subtotal * VAT_RATE
-    total_amount = subtotal + vat_amount
-    
-    # Generate "random" supplier VAT number using microseconds from datetime
-    micro_seconds = str(now.microsecond)
-    # Manual padding to ensure 8 digits
-    while len(micro_seconds) < 8:
-        micro_seconds = "0" + micro_seconds
-    if len(micro_seconds) > 8:
-        micro_seconds = micro_seconds[:8]
-    supplier_vat = "SUP" + micro_seconds
+    invoice_number = next_invoice_number()
+    catalog.record_invoice(invoice_number)
     
-    invoice = "\n=== WeCare Skincare SYSTEM ===\n"
-    invoice += "        PURCHASE INVOICE\n"
-    invoice += "==============================\n\n"
-    invoice += "Invoice No: " + invoice_number + "\n"
-    
-    # Format date manually
-    date_str = str(now.year) + "-" + month_str + "-" + day_str
-    time_str = hour_str + ":" + minute_str + ":" + second_str
-    invoice += "Date: " + date_str + " " + time_str + "\n"
-    invoice += "Supplier: " + supplier_name + "\n"
-    invoice += "Supplier VAT No: " + supplier_vat + "\n\n"
-    invoice += "Product Details:\n"
-    invoice += "  Name: " + product_name + "\n"
-    invoice += "  Brand: " + brand + "\n"
-    invoice += "  Origin: " + origin + "\n"
-    invoice += "  Quantity: " + str(quantity) + "\n"
-    invoice += "  Cost per item: Rs. " + str(cost_price) + "\n"
-    invoice += "------------------------------\n"
-    invoice += "Subtotal: Rs. " + str(subtotal) + "\n"
-    invoice += "VAT (" + str(int(VAT_RATE * 100)) + "%): Rs. " + str(round(vat_amount, 2)) + "\n"
-    invoice += "Total Amount: Rs. " + str(round(total_amount, 2)) + "\n\n"
-    invoice += "==============================\n"
-
-    try:
-        # Try to create the directory by writing to a file
-        try:
-            with open("purchase_invoices/test_dir.txt", 'w') as f:
-                f.write("Test directory creation")
-        except:
-            print("\nWarning: Could not create purchase_invoices directory.")
-            
-        invoice_file = "purchase_invoices/purchase_invoice_" + invoice_number + ".txt"
-        with open(invoice_file, 'w') as f:
-            f.write(invoice)
+    date = now.strftime("%Y-%m-%d %H:%M:%S")
+    product = catalog.get(product_name)
+    invoice = render_purchase_invoice(invoice_number, date, supplier_name,
+                                      supplier_vat_number(supplier_name), product, quantity, VAT_RATE)
+
+    amount = cost_price * quantity
+    get_writer().submit('purchase', invoice_number, invoice,
+                        [(invoice_number, date, 'purchase', supplier_name.strip(), product['name'],
+                          quantity, 0, amount, round(amount * VAT_RATE, 2))])
+    if ECHO_INVOICES:
         print("\nPurchase invoice generated successfully!")
         print(invoice)
-    except:
-        print("\nWarning: Could not save purchase invoice to file.")
-        print("\nPurchase Invoice details:")
-        print(invoice)
 
-    return True, products
+    metrics.count('products_added')
+    return True, catalog
 
 def generate_purchase_invoice(items, supplier_name):
     """
@@ -483,87 +346,55 @@ def generate_purchase_invoice(items, supplier_name):
         supplier_name (str): Name of the supplier
 
     Returns:
-        None
+        str: The invoice number, for ProductCatalog.record_invoice
     """
-    # Generate invoice number manually
     now = datetime.now()
-    # Manual padding with zeros
-    year_str = str(now.year)
-    month_str = str(now.month)
-    if len(month_str) == 1:
-        month_str = "0" + month_str
-        
-    day_str = str(now.day)
-    if len(day_str) == 1:
-        day_str = "0" + day_str
-        
-    hour_str = str(now.hour)
-    if len(hour_str) == 1:
-        hour_str = "0" + hour_str
-        
-    minute_str = str(now.minute)
-    if len(minute_str) == 1:
-        minute_str = "0" + minute_str
-        
-    second_str = str(now.second)
-    if len(second_str) == 1:
-        second_str = "0" + second_str
-        
-    invoice_number = year_str + month_str + day_str + hour_str + minute_str + second_str
-    
-    # Calculate total amount
-    total_amount = 0
-    for item in items:
-        item_total = item['quantity'] * item['cost_price']
-        total_amount += item_total
-    
-    # Format date manually
-    date_str = year_str + "-" + month_str + "-" + day_str
-    time_str = hour_str + ":" + minute_str + ":" + second_str
-    datetime_str = date_str + " " + time_str
+    invoice_number = next_invoice_number()
     
-    invoice = "\n=== WeCare Skin Care Products ===\n"
-    invoice += "        PURCHASE INVOICE\n"
-    invoice += "==============================\n\n"
-    invoice += "Invoice No: " + invoice_number + "\n"
-    invoice += "Date: " + datetime_str + "\n"
-    invoice += "Supplier: " + supplier_name + "\n\n"
-    invoice += "Product Details:\n"
-    
-    # Add each product to the invoice
-    for item in items:
-        product = item['product']
-        invoice += "  Product: " + product['name'] + "\n"
-        invoice += "  Brand: " + product['brand'] + "\n"
-        invoice += "  Origin: " + product['origin'] + "\n"
-        invoice += "  Quantity: " + str(item['quantity']) + "\n"
-        invoice += "  Rate per item: Rs. " + str(item['cost_price']) + "\n"
-        invoice += "  Subtotal: Rs. " + str(item['quantity'] * item['cost_price']) + "\n"
-        invoice += "-" * 50 + "\n"
-
-    invoice += "Total Amount: Rs. " + str(total_amount) + "\n\n"
-    invoice += "==============================\n"
-
-    # Try to create the directory by writing to a file
-    try:
-        with open("purchase_invoices/test_dir.txt", 'w') as f:
-            f.write("Test directory creation")
-    except:
-        print("\nWarning: Could not create purchase_invoices directory.")
-        
-    invoice_file = "purchase_invoices/purchase_invoice_" + invoice_number + ".txt"
-    
-    try:
-        with open(invoice_file, 'w') as f:
-            f.write(invoice)
-        
+    date = now.strftime("%Y-%m-%d %H:%M:%S")
+    invoice = render_multi_purchase_invoice(invoice_number, date, supplier_name, items)
+
+    # This invoice shows no VAT, so none is recorded
+    entries = [(invoice_number, date, 'purchase', supplier_name.strip(), item['product']['name'],
+                item['quantity'], 0, item['quantity'] * item['cost_price'], 0) for item in items]
+    get_writer().submit('purchase', invoice_number, invoice, entries)
+    if ECHO_INVOICES:
         print("\nPurchase invoice generated successfully!")
         print(invoice)
-        print("Invoice saved as: " + invoice_file)
-    except:
-        print("\nWarning: Could not save purchase invoice to file.")
-        print("\nPurchase Invoice details:")
-        print(invoice)
+    return invoice_number
+
+def _sales_entries(invoice_number, date, customer_name, items):
+    """
+    Build the ledger lines of a sales invoice.
+
+    Args:
+        invoice_number (str): Unique invoice number
+        date (str): Invoice date as YYYY-MM-DD HH:MM:SS
+        customer_name (str): Name of the customer
+        items (list): Dictionaries with product, quantity, free_items and total_price
+
+    Returns:
+        list: One ledger line tuple per item
+    """
+    return [(invoice_number, date, 'sale', customer_name.strip(), item['product']['name'], item['quantity'],
+             item['free_items'], item['total_price'], round(item['total_price'] * VAT_RATE, 2))
+            for item in items]
+
+def supplier_vat_number(supplier_name):
+    """
+    Build the VAT number shown for a supplier on purchase invoices.
+
+    The number is derived from the supplier name, so the same supplier always
+    gets the same number.
+
+    Args:
+        supplier_name (str): Name of the supplier
+
+    Returns:
+        str: VAT number such as SUP01234567
+    """
+    checksum = zlib.crc32(supplier_name.strip().casefold().encode('utf-8'))
+    return "SUP" + str(checksum % 100000000).zfill(8)
 
 def compare_strings_case_insensitive(str1, str2):
     """
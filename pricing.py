@@ -0,0 +1,509 @@
+"""
+Pricing Module
+Markup rules and promotions, applied to the whole catalog at once.
+
+Rules are read from pricing.json:
+
+    {
+        "markup": 2,
+        "markups": {
+            "origin": {"France": 2.5},
+            "brand": {"Cetaphil": 2.2},
+            "product": {"Sunscreen": 1.8}
+        },
+        "promotions": [
+            {"name": "Garnier Week", "percent_off": 10, "brand": "Garnier",
+             "start": "2026-11-01", "end": "2026-11-07"},
+            {"name": "Buy 3 Get 1 Free", "buy": 3, "get": 1}
+        ]
+    }
+
+A product's markup is the rule for its name, else for its brand, else for its
+origin, else the default. Selling prices are cost price times markup, rounded
+to whole rupees. A promotion gives 'get' free units for every 'buy' units, or
+takes 'percent_off' off the price. It applies to one product, brand or origin,
+or to every product if none is given, between its optional start and end
+days. Of the promotions running today, the first in the list that covers a
+product is the one it gets. Without pricing.json the markup is 2 and every
+product gets buy 3 get 1 free.
+
+When the rules are loaded, every selling price and every product's promotion
+are computed in one pass over the catalog columns. The pass uses NumPy when it
+is installed and plain arrays otherwise. Sales then look the promotion up by
+row instead of working it out.
+
+Usage:
+    python pricing.py check [pricing.json] [--products products.txt]
+"""
+
+import json
+import os
+import sys
+import time
+from array import array
+from datetime import date
+
+import metrics
+from catalog import MARKUP, normalize_name
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PRICING_FILE = 'pricing.json'
+
+# Fields a markup rule or promotion can select products by, weakest first
+SCOPES = ('origin', 'brand', 'product')
+
+
+def _parse_day(name, field, value):
+    """
+    Check a promotion's start or end day.
+
+    Args:
+        name (str): Name of the promotion, for the error message
+        field (str): 'start' or 'end'
+        value (str): Day as YYYY-MM-DD, or None
+
+    Returns:
+        str: The day as YYYY-MM-DD, or None
+
+    Raises:
+        ValueError: If the value is not a valid day
+    """
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"Promotion '{name}' has an invalid {field} day {value!r}, expected YYYY-MM-DD")
+
+
+class Promotion:
+    """
+    One promotion: free units or a percentage off, for some products and days.
+    """
+
+    def __init__(self, name, buy=0, get=0, percent_off=0, product=None, brand=None, origin=None,
+                 start=None, end=None):
+        """
+        Create a promotion.
+
+        Args:
+            name (str): Name shown on invoices
+            buy (int): Units to buy for each 'get' free units
+            get (int): Free units per 'buy' units bought
+            percent_off (float): Percentage taken off the price
+            product (str): Only this product
+            brand (str): Only this brand
+            origin (str): Only products from this country
+            start (str): First day as YYYY-MM-DD, or None
+            end (str): Last day as YYYY-MM-DD, or None
+
+        Raises:
+            ValueError: If a value has the wrong type, the days are not valid
+                or out of order, or the promotion gives nothing or gives it twice
+        """
+        # JSON has no integer type of its own, so 2.5 or true would otherwise
+        # slip through and break every sale of the products it covers
+        for field, value in (('buy', buy), ('get', get)):
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f"Promotion '{name}' needs a whole number of units for {field}")
+        if isinstance(percent_off, bool) or not isinstance(percent_off, (int, float)):
+            raise ValueError(f"Promotion '{name}' needs a number for percent_off")
+        start = _parse_day(name, 'start', start)
+        end = _parse_day(name, 'end', end)
+        if start is not None and end is not None and start > end:
+            raise ValueError(f"Promotion '{name}' ends before it starts")
+        if (buy > 0 and get > 0) == (0 < percent_off <= 100):
+            raise ValueError(f"Promotion '{name}' needs either buy and get, or percent_off")
+        if sum(value is not None for value in (product, brand, origin)) > 1:
+            raise ValueError(f"Promotion '{name}' can select by only one of product, brand or origin")
+        self.name = name
+        self.buy = buy
+        self.get = get
+        self.percent_off = percent_off
+        self.product = product
+        self.brand = brand
+        self.origin = origin
+        self.start = start
+        self.end = end
+
+    def runs_on(self, day):
+        """
+        Check whether the promotion runs on a day.
+
+        Args:
+            day (str): Day as YYYY-MM-DD
+
+        Returns:
+            bool: True if the day is within the promotion's window
+        """
+        return (self.start is None or self.start <= day) and (self.end is None or day <= self.end)
+
+    def scope(self):
+        """
+        Get what the promotion selects products by.
+
+        Returns:
+            tuple: (field, value), e.g. ('brand', 'Garnier'), or (None, None) for every product
+        """
+        for field in SCOPES:
+            value = getattr(self, field)
+            if value is not None:
+                return field, value
+        return None, None
+
+    def free_items(self, quantity):
+        """
+        Count the free units given with a purchase.
+
+        Args:
+            quantity (int): Units bought
+
+        Returns:
+            int: Free units
+        """
+        if self.buy:
+            return quantity // self.buy * self.get
+        return 0
+
+    def apply(self, quantity, price):
+        """
+        Work out a purchase under this promotion.
+
+        Args:
+            quantity (int): Units bought
+            price (int): Selling price per unit
+
+        Returns:
+            tuple: (free units, total price before VAT)
+        """
+        total = price * quantity
+        if self.percent_off:
+            total = round(total * (100 - self.percent_off) / 100)
+        return self.free_items(quantity), total
+
+
+# Used when no pricing rules are loaded
+DEFAULT_PROMOTION = Promotion("Buy 3 Get 1 Free", buy=3, get=1)
+
+
+class PricingEngine:
+    """
+    Markup rules and promotions, kept in a catalog's selling price and
+    promotion columns.
+    """
+
+    def __init__(self, markup=MARKUP, markups=None, promotions=None, filename=None):
+        """
+        Create an engine from rules.
+
+        Args:
+            markup (float): Default markup on the cost price
+            markups (dict): 'product', 'brand' or 'origin' -> value -> markup
+            promotions (list): Promotion objects, strongest first
+            filename (str): File the rules were read from, checked by refresh()
+        """
+        self.markup = markup
+        # Matched ignoring case, like product names
+        markups = markups or {}
+        self.markups = {field: {normalize_name(value): rate for value, rate in markups.get(field, {}).items()}
+                        for field in SCOPES}
+        self.promotions = [DEFAULT_PROMOTION] if promotions is None else promotions
+        self.filename = filename
+        self._stamp = self._file_stamp()
+        self.version = 0
+
+    @classmethod
+    def load(cls, filename=PRICING_FILE):
+        """
+        Read the rules from a JSON file.
+
+        Args:
+            filename (str): Name of the rules file
+
+        Returns:
+            PricingEngine: The engine, with the default rules if the file is missing
+
+        Raises:
+            ValueError: If the file is not valid
+        """
+        try:
+            with open(filename, 'r') as file:
+                rules = json.load(file)
+        except FileNotFoundError:
+            return cls(filename=filename)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not read '{filename}': {e}")
+        try:
+            markups = rules.get('markups', {})
+            for field, values in markups.items():
+                if field not in SCOPES:
+                    raise ValueError(f"unknown markup field '{field}'")
+                for value, rate in values.items():
+                    if not rate > 0:
+                        raise ValueError(f"markup for {field} '{value}' must be positive")
+            promotions = None
+            if 'promotions' in rules:
+                promotions = [Promotion(**promotion) for promotion in rules['promotions']]
+            markup = rules.get('markup', MARKUP)
+            if not markup > 0:
+                raise ValueError("markup must be positive")
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid pricing rules in '{filename}': {e}")
+        return cls(markup, markups, promotions, filename)
+
+    def _file_stamp(self):
+        """
+        Identify the current version of the rules file.
+
+        Returns:
+            tuple: (modification time, size), or None if there is no file
+        """
+        if self.filename is None:
+            return None
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self):
+        """
+        Reload the rules if the rules file changed. Invalid rules are reported
+        and the current ones kept.
+
+        Returns:
+            bool: True if the rules changed and catalogs need repricing
+        """
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            loaded = PricingEngine.load(self.filename)
+        except ValueError as e:
+            print(f"Error: {e}. Keeping the current prices.")
+            return False
+        self.markup = loaded.markup
+        self.markups = loaded.markups
+        self.promotions = loaded.promotions
+        self.version += 1
+        return True
+
+    def markup_of(self, catalog, row):
+        """
+        Find the markup of one product.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+            row (int): Row number
+
+        Returns:
+            float: The markup
+        """
+        markups = self.markups
+        for field, column in (('product', catalog._names), ('brand', catalog._brands),
+                              ('origin', catalog._origins)):
+            rate = markups[field].get(normalize_name(column[row]))
+            if rate is not None:
+                return rate
+        return self.markup
+
+    def selling_price(self, catalog, row):
+        """
+        Work out the selling price of one product.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+            row (int): Row number
+
+        Returns:
+            int: Selling price per unit
+        """
+        return round(catalog._cost_price[row] * self.markup_of(catalog, row))
+
+    def promotion_of(self, catalog, row, day):
+        """
+        Find the promotion of one product.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+            row (int): Row number
+            day (str): Day as YYYY-MM-DD
+
+        Returns:
+            int: Index into self.promotions, or -1 for none
+        """
+        values = {'product': normalize_name(catalog._names[row]),
+                  'brand': normalize_name(catalog._brands[row]),
+                  'origin': normalize_name(catalog._origins[row])}
+        for number, promotion in enumerate(self.promotions):
+            if promotion.runs_on(day):
+                field, value = promotion.scope()
+                if field is None or values[field] == normalize_name(value):
+                    return number
+        return -1
+
+    def _rows(self, catalog, field, value):
+        """
+        Find the rows a rule applies to.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+            field (str): 'product', 'brand' or 'origin'
+            value (str): Product name, brand or country, any case
+
+        Returns:
+            list: Row numbers
+        """
+        if field == 'product':
+            row = catalog.row_of(value)
+            return [] if row is None else [row]
+        return list(catalog.group_index(field).rows(value))
+
+    @metrics.timed('reprice')
+    def reprice(self, catalog):
+        """
+        Recompute the selling price and promotion of every product in one pass.
+
+        Rules are applied weakest first, so stronger rules overwrite weaker
+        ones: markups by origin, then brand, then product; promotions from the
+        last in the list to the first.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+
+        Returns:
+            None
+        """
+        rows = len(catalog._names)
+        day = date.today().isoformat()
+        markup_rules = [(self._rows(catalog, field, value), rate)
+                        for field in SCOPES for value, rate in self.markups[field].items()]
+        promotion_rules = []
+        for number in range(len(self.promotions) - 1, -1, -1):
+            promotion = self.promotions[number]
+            if promotion.runs_on(day):
+                field, value = promotion.scope()
+                promotion_rules.append((None if field is None else self._rows(catalog, field, value), number))
+
+        if numpy is not None:
+            markups = numpy.full(rows, self.markup, dtype=numpy.float64)
+            for selected, rate in markup_rules:
+                markups[selected] = rate
+            cost = numpy.frombuffer(catalog._cost_price, dtype=numpy.int64, count=rows)
+            prices = numpy.rint(cost * markups).astype(numpy.int64)
+            promotions = numpy.full(rows, -1, dtype=numpy.int32)
+            for selected, number in promotion_rules:
+                if selected is None:
+                    promotions[:] = number
+                else:
+                    promotions[selected] = number
+            selling_price = array('q')
+            selling_price.frombytes(prices.tobytes())
+            promotion_column = array('i')
+            promotion_column.frombytes(promotions.tobytes())
+        else:
+            markups = array('d', [self.markup]) * rows
+            for selected, rate in markup_rules:
+                for row in selected:
+                    markups[row] = rate
+            selling_price = array('q', map(round, map(float.__mul__, map(float, catalog._cost_price), markups)))
+            promotion_column = array('i', [-1]) * rows
+            for selected, number in promotion_rules:
+                if selected is None:
+                    promotion_column = array('i', [number]) * rows
+                else:
+                    for row in selected:
+                        promotion_column[row] = number
+
+        catalog._selling_price = selling_price
+        catalog._promotion = promotion_column
+        catalog._promotion_day = day
+        catalog._pricing_version = self.version
+
+    def add_row(self, catalog, row):
+        """
+        Price a product just added to the catalog.
+
+        Args:
+            catalog (ProductCatalog): The catalog, with the product's row already appended
+            row (int): Row number of the new product
+
+        Returns:
+            None
+        """
+        catalog._selling_price.append(self.selling_price(catalog, row))
+        catalog._promotion.append(self.promotion_of(catalog, row, catalog._promotion_day))
+
+    def promotion(self, catalog, row):
+        """
+        Look up the promotion of one product, repricing if the day changed.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+            row (int): Row number
+
+        Returns:
+            Promotion: The product's promotion, or None
+        """
+        if catalog._promotion_day != date.today().isoformat():
+            # Promotions may have started or ended overnight
+            self.reprice(catalog)
+        number = catalog._promotion[row]
+        return self.promotions[number] if number >= 0 else None
+
+
+def main(argv):
+    """
+    Check a rules file and optionally time repricing a products file with it.
+
+    Args:
+        argv (list): Command line arguments without the program name
+
+    Returns:
+        int: Exit status
+    """
+    import argparse
+    from read import load_catalog  # read imports catalog, which this module extends
+
+    parser = argparse.ArgumentParser(prog='pricing.py', description="Check pricing rules")
+    parser.add_argument('command', choices=('check',))
+    parser.add_argument('rules', nargs='?', default=PRICING_FILE)
+    parser.add_argument('--products', help="products file to reprice with the rules")
+    args = parser.parse_args(argv)
+
+    try:
+        engine = PricingEngine.load(args.rules)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Default markup: {engine.markup}")
+    for field in SCOPES:
+        for value, rate in engine.markups[field].items():
+            print(f"Markup for {field} '{value}': {rate}")
+    today = date.today().isoformat()
+    for promotion in engine.promotions:
+        field, value = promotion.scope()
+        offer = (f"buy {promotion.buy} get {promotion.get} free" if promotion.buy
+                 else f"{promotion.percent_off}% off")
+        running = "running" if promotion.runs_on(today) else "not running today"
+        print(f"Promotion '{promotion.name}': {offer} on {value or 'every product'} ({running})")
+
+    if args.products:
+        catalog = load_catalog(args.products)
+        if not catalog:
+            return 1
+        started = time.perf_counter()
+        catalog.set_pricing(engine)
+        elapsed = time.perf_counter() - started
+        print(f"Repriced {len(catalog)} products in {elapsed * 1000:.1f} ms"
+              f" ({'NumPy' if numpy is not None else 'no NumPy'}).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -3,46 +3,191 @@ Read.py is for reading the text file.
 Handles all file reading operations for the WeCare management system
 """
 
-def read_products_file(filename):
+import csv
+import os
+
+import metrics
+from catalog import ProductCatalog
+from snapshot import is_snapshot, load_snapshot, snapshot_source
+from write import file_signature
+
+
+def read_products_file(filename, journal_file=None, snapshot_file=None):
     """
     Reads product data from a file and creates a list of product dictionaries.
 
     Arguments:
-        filename (str): Name of the file containing product data
+        filename (str): Name of the file containing product data, either the
+            text format or a binary snapshot
+        journal_file (str): Optional transaction journal to replay on top of the file
+        snapshot_file (str): Optional binary snapshot, used instead of the text
+            file when it is at least as new
 
     Returns:
         list: List of dictionaries containing product information
     """
-    products = []
+    return [dict(product) for product in load_catalog(filename, journal_file, snapshot_file)]
+
+
+@metrics.timed('load_catalog')
+def load_catalog(filename, journal_file=None, snapshot_file=None):
+    """
+    Reads product data straight into a ProductCatalog without building a
+    dictionary per product.
+
+    Arguments:
+        filename (str): Name of the file containing product data, either the
+            text format or a binary snapshot
+        journal_file (str): Optional transaction journal to replay on top of the file
+        snapshot_file (str): Optional binary snapshot, used instead of the text
+            file when it is at least as new
+
+    Returns:
+        ProductCatalog: The loaded catalog, empty if the file could not be read
+    """
+    catalog = ProductCatalog()
+    if snapshot_file and _is_current(snapshot_file, filename):
+        filename = snapshot_file
+
+    if is_snapshot(filename):
+        if not load_snapshot(catalog, filename):
+            return ProductCatalog()
+    else:
+        try:
+            with open(filename, 'r') as file:
+                if metrics.ENABLED:
+                    metrics.count('read_bytes', os.fstat(file.fileno()).st_size)
+                for line in file:
+                    if not line.strip():
+                        continue
+
+                    # Five required fields, then the supplier if one is known;
+                    # the supplier is last so it may itself contain commas.
+                    # Fields containing commas are quoted, which is rare
+                    if '"' in line:
+                        data = [item.strip() for item in next(csv.reader([line], skipinitialspace=True))]
+                        if len(data) > 6:
+                            data[5:] = [','.join(data[5:])]
+                    else:
+                        data = [item.strip() for item in line.strip().split(',', 5)]
+                    if len(data) not in (5, 6):
+                        continue
+
+                    try:
+                        catalog.add_row(data[0], data[1], int(data[2]), int(data[3]), data[4],
+                                        data[5] if len(data) == 6 else '')
+                    except (ValueError, IndexError):
+                        print(f"Warning: Skipping invalid line: {line.strip()}")
+                        continue
+
+        except FileNotFoundError:
+            print(f"Error: File '{filename}' not found.")
+            return ProductCatalog()
+        except Exception as e:
+            print(f"Error reading file: {e}")
+            return ProductCatalog()
+
+    if journal_file:
+        replay_journal(catalog, journal_file)
+    # Loading is not a change that needs saving
+    catalog.take_changes()
+    return catalog
+
+
+def _is_current(snapshot_file, filename):
+    """
+    Check whether a snapshot reflects the latest version of the products file.
+
+    Arguments:
+        snapshot_file (str): Name of the binary snapshot
+        filename (str): Name of the text products file
+
+    Returns:
+        bool: True if the snapshot was written from the current products
+            file, or for snapshots that do not record it, is not older
+    """
+    try:
+        source = snapshot_source(snapshot_file)
+        snapshot_time = os.path.getmtime(snapshot_file)
+    except OSError:
+        return False
+    if source is not None:
+        return source == file_signature(filename)
+    try:
+        return snapshot_time >= os.path.getmtime(filename)
+    except OSError:
+        return True
+
+
+@metrics.timed('read_journal')
+def read_journal(journal_file, offset=0):
+    """
+    Reads the change records from a transaction journal.
+
+    Arguments:
+        journal_file (str): Name of the journal file
+        offset (int): Byte position to start reading from, e.g. where the
+            last read stopped
+
+    Returns:
+        list: Change records as tuples, oldest first
+    """
+    records = []
     try:
-        with open(filename, 'r') as file:
-            for line in file:
-                if not line.strip():
-                    continue
-
-                data = [item.strip() for item in line.strip().split(',')]
-                if len(data) != 5:  # Ensure we have all required fields
-                    continue
-                    
+        with open(journal_file, 'r', newline='') as file:
+            if metrics.ENABLED:
+                metrics.count('read_bytes', os.fstat(file.fileno()).st_size - offset)
+            file.seek(offset)
+            for row in csv.reader(file):
                 try:
-                    product = {
-                        'name': data[0],
-                        'brand': data[1],
-                        'quantity': int(data[2]),
-                        'cost_price': int(data[3]),
-                        'origin': data[4],
-                        'selling_price': int(data[3]) * 2  # 2x markup
-                    }
-                    products.append(product)
+                    if row[0] == 'Q' and len(row) == 3:
+                        records.append(('Q', row[1], int(row[2])))
+                    elif row[0] == 'A' and len(row) in (6, 7):
+                        records.append(('A', row[1], row[2], int(row[3]), int(row[4])) + tuple(row[5:]))
+                    elif row[0] == 'S' and len(row) == 3:
+                        records.append(('S', row[1], row[2]))
+                    elif row[0] == 'D' and len(row) == 2:
+                        records.append(('D', row[1]))
+                    elif row[0] == 'I' and len(row) == 2:
+                        records.append(('I', row[1]))
+                    else:
+                        raise ValueError
                 except (ValueError, IndexError):
-                    print(f"Warning: Skipping invalid line: {line.strip()}")
-                    continue
-                    
-        return products
+                    print(f"Warning: Skipping invalid journal record: {row}")
     except FileNotFoundError:
-        print(f"Error: File '{filename}' not found.")
-        return []
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return []
- 
\ No newline at end of file
+        pass
+    return records
+
+
+def replay_journal(catalog, journal_file, offset=0):
+    """
+    Applies the journal records on top of a catalog.
+
+    Quantity records hold the resulting stock level, so replaying a journal
+    that was already folded into the products file gives the same result.
+    Invoice markers change nothing; they are passed on so they count as
+    replayed records.
+
+    Arguments:
+        catalog (ProductCatalog): Catalog loaded from the products file
+        journal_file (str): Name of the journal file
+        offset (int): Byte position of the first record to apply
+
+    Returns:
+        ProductCatalog: The updated catalog
+    """
+    for record in read_journal(journal_file, offset):
+        if record[0] == 'Q':
+            product = catalog.get(record[1])
+            if product is not None:
+                product['quantity'] = record[2]
+        elif record[0] == 'A':
+            catalog.add_row(*record[1:])
+        elif record[0] == 'D':
+            catalog.remove(record[1])
+        elif record[0] == 'S':
+            catalog.set_supplier(record[1], record[2])
+        elif record[0] == 'I':
+            catalog.record_invoice(record[1])
+
+    return catalog
@@ -0,0 +1,414 @@
+"""
+Records Module
+Fixed-width product records, read through mmap and updated in place.
+
+Every product takes the same number of bytes, so its record can be found from
+its row number alone and a sale rewrites just the bytes of one quantity
+field. The file stays plain text, one product per line:
+
+    WCREC01 changes=00000000000000000042 name=32 brand=16 quantity=12 cost_price=12 origin=16 supplier=24
+    Sunscreen                       |Aqualogica      |         200|         700|India           |Acme Traders            |
+    Skin Cleanser                   |Cetaphil        |          95|         280|Switzerland     |                        |D
+
+The header gives the byte width of each field and counts the transactions
+saved so far, so other processes can tell when the file changed. Text fields
+are UTF-8, padded with spaces; numbers are right-aligned. The last column is
+'D' for a removed product; removed records are dropped the next time the file
+is rewritten. A value too wide for its field also needs a rewrite, which
+widens the field.
+
+Two kinds of record hold no product, only a value in the name field: 'I'
+marks the invoice number of a saved transaction, and 'C' the time the file
+was last rewritten, which is written after the products. A rewrite drops the
+invoice markers, so it is a checkpoint for crash recovery (recovery.py).
+
+Updates are written with seek and write rather than through the mapping,
+which sees them at once since both share the page cache. On Linux an fsync
+after writing through a shared mapping took time proportional to the file
+size (0.8 ms at 100,000 records against 0.08 ms), which a sale cannot afford.
+"""
+
+import mmap
+import os
+import time
+
+import metrics
+from write import atomic_write
+
+MAGIC = b'WCREC01'
+FIELDS = ('name', 'brand', 'quantity', 'cost_price', 'origin', 'supplier')
+TEXT_FIELDS = ('name', 'brand', 'origin', 'supplier')
+# Narrowest widths a rewrite gives each field, in bytes
+MIN_WIDTHS = {'name': 32, 'brand': 16, 'quantity': 12, 'cost_price': 12, 'origin': 16, 'supplier': 24}
+
+# Transaction counter: fixed position and width in the header
+COUNTER_START = len(MAGIC) + len(b' changes=')
+COUNTER_WIDTH = 20
+PRODUCT = b' '
+REMOVED = b'D'
+MARKER = b'I'
+CHECKPOINT = b'C'
+
+
+def _header(widths, changes):
+    """
+    Format the header line.
+
+    Args:
+        widths (dict): Width in bytes of each field
+        changes (int): Transaction counter
+
+    Returns:
+        bytes: The header line
+    """
+    fields = ' '.join(f'{field}={widths[field]}' for field in FIELDS)
+    return MAGIC + f' changes={changes:0{COUNTER_WIDTH}d} {fields}\n'.encode()
+
+
+def _format(widths, values, flag=PRODUCT):
+    """
+    Format one record.
+
+    Args:
+        widths (dict): Width in bytes of each field
+        values (tuple): Field values in FIELDS order
+        flag (bytes): PRODUCT, MARKER or CHECKPOINT
+
+    Returns:
+        bytes: The record line, or None if a value is too wide for its field
+    """
+    parts = []
+    for field, value in zip(FIELDS, values):
+        width = widths[field]
+        if field in TEXT_FIELDS:
+            data = value.encode().ljust(width)
+        else:
+            data = str(value).encode().rjust(width)
+        if len(data) > width:
+            return None
+        parts.append(data)
+    parts.append(flag)
+    return b'|'.join(parts) + b'\n'
+
+
+def _note(value):
+    """
+    Field values of a marker or checkpoint record.
+
+    Args:
+        value (str): Invoice number or checkpoint time
+
+    Returns:
+        tuple: Field values in FIELDS order
+    """
+    return (value, '', 0, 0, '', '')
+
+
+def _widths(products):
+    """
+    Choose field widths that fit every product with room to spare.
+
+    Args:
+        products (list): Field value tuples in FIELDS order
+
+    Returns:
+        dict: Width in bytes of each field
+    """
+    widths = dict(MIN_WIDTHS)
+    for index, field in enumerate(FIELDS):
+        if field in TEXT_FIELDS:
+            longest = max((len(values[index].encode()) for values in products), default=0)
+        else:
+            longest = max((len(str(values[index])) for values in products), default=0)
+        if longest > widths[field]:
+            # Leave a quarter spare so the next slightly longer value fits
+            widths[field] = longest + longest // 4
+    return widths
+
+
+@metrics.timed('write_records')
+def write_records(products, filename, changes=0, fsync=True):
+    """
+    Write the whole record file, replacing it atomically, and end it with a
+    checkpoint record.
+
+    Args:
+        products (iterable): Products to write, e.g. a list or ProductCatalog
+        filename (str): Name of the record file
+        changes (int): Transaction counter to start from
+        fsync (bool): Flush the new file to disk before renaming it into place
+
+    Returns:
+        bool: True if the file was written, False otherwise
+    """
+    rows = [(product['name'], product['brand'], product['quantity'], product['cost_price'],
+             product['origin'], product.get('supplier') or '') for product in products]
+    widths = _widths(rows)
+    lines = [_header(widths, changes)]
+    lines.extend(_format(widths, values) for values in rows)
+    lines.append(_format(widths, _note(repr(time.time())), CHECKPOINT))
+    try:
+        atomic_write(filename, b''.join(lines), fsync)
+        return True
+    except Exception as e:
+        print(f"Error writing record file: {e}")
+        return False
+
+
+class RecordFile:
+    """
+    An open record file, mapped into memory for reading and updated in place.
+    """
+
+    def __init__(self, filename):
+        """
+        Open and map a record file.
+
+        Args:
+            filename (str): Name of the record file
+
+        Raises:
+            OSError: If the file cannot be opened
+            ValueError: If it is not a record file
+        """
+        self.filename = filename
+        # Unbuffered, so every write reaches the page cache the mapping reads
+        self._file = open(filename, 'r+b', buffering=0)
+        try:
+            self.inode = os.fstat(self._file.fileno()).st_ino
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            end = self._map.find(b'\n')
+            header = self._map[:end].split()
+            if end < 0 or header[0] != MAGIC:
+                raise ValueError(f"'{filename}' is not a record file")
+            self.widths = {}
+            for part in header[2:]:
+                field, _, width = part.decode().partition('=')
+                self.widths[field] = int(width)
+            if tuple(self.widths) != FIELDS:
+                raise ValueError(f"'{filename}' has unknown fields")
+        except Exception:
+            self.close()
+            raise
+        self.header_length = end + 1
+        # Start of each field within a record; fields are separated by '|'
+        self.offsets = {}
+        offset = 0
+        for field in FIELDS:
+            self.offsets[field] = offset
+            offset += self.widths[field] + 1
+        self.flag_offset = offset
+        self.record_length = offset + 2
+
+    @property
+    def count(self):
+        """
+        Number of records, including removed ones.
+
+        Returns:
+            int: Record count
+        """
+        return (len(self._map) - self.header_length) // self.record_length
+
+    @property
+    def changes(self):
+        """
+        Transaction counter from the header.
+
+        Returns:
+            int: Transactions saved to the file
+        """
+        return int(self._map[COUNTER_START:COUNTER_START + COUNTER_WIDTH])
+
+    def set_changes(self, changes):
+        """
+        Update the transaction counter in place.
+
+        Args:
+            changes (int): New counter value
+
+        Returns:
+            None
+        """
+        self._write(COUNTER_START, f'{changes:0{COUNTER_WIDTH}d}'.encode())
+
+    def _write(self, offset, data):
+        """
+        Overwrite bytes of the file in place.
+
+        Args:
+            offset (int): Position in the file
+            data (bytes): Bytes to write
+
+        Returns:
+            None
+        """
+        self._file.seek(offset)
+        self._file.write(data)
+
+    def records(self):
+        """
+        Read every record in file order.
+
+        Yields:
+            tuple: Field values in FIELDS order, then the record's flag:
+                PRODUCT, REMOVED, MARKER or CHECKPOINT
+        """
+        data = self._map
+        start = self.header_length
+        length = self.record_length
+        spans = [(self.offsets[field], self.offsets[field] + self.widths[field]) for field in FIELDS]
+        (n0, n1), (b0, b1), (q0, q1), (c0, c1), (o0, o1), (s0, s1) = spans
+        flag = self.flag_offset
+        for row in range(self.count):
+            record = data[start:start + length]
+            start += length
+            yield (record[n0:n1].decode().rstrip(), record[b0:b1].decode().rstrip(),
+                   int(record[q0:q1]), int(record[c0:c1]), record[o0:o1].decode().rstrip(),
+                   record[s0:s1].decode().rstrip(), record[flag:flag + 1])
+
+    def read(self, row):
+        """
+        Read one record.
+
+        Args:
+            row (int): Record number
+
+        Returns:
+            tuple: Field values in FIELDS order, then the record's flag
+        """
+        start = self.header_length + row * self.record_length
+        record = self._map[start:start + self.record_length]
+        values = []
+        for field in FIELDS:
+            data = record[self.offsets[field]:self.offsets[field] + self.widths[field]]
+            values.append(data.decode().rstrip() if field in TEXT_FIELDS else int(data))
+        values.append(record[self.flag_offset:self.flag_offset + 1])
+        return tuple(values)
+
+    def fits(self, field, value):
+        """
+        Check whether a value fits its field.
+
+        Args:
+            field (str): Field name
+            value: Field value
+
+        Returns:
+            bool: True if set() can store the value in place
+        """
+        text = value if field in TEXT_FIELDS else str(value)
+        return len(text.encode()) <= self.widths[field]
+
+    def set(self, row, field, value):
+        """
+        Overwrite one field of one record in place. The value must fit.
+
+        Args:
+            row (int): Record number
+            field (str): Field name
+            value: New value
+
+        Returns:
+            int: Bytes written
+        """
+        width = self.widths[field]
+        if field in TEXT_FIELDS:
+            data = value.encode().ljust(width)
+        else:
+            data = str(value).encode().rjust(width)
+        self._write(self.header_length + row * self.record_length + self.offsets[field], data)
+        return width
+
+    def remove(self, row):
+        """
+        Mark a record as removed.
+
+        Args:
+            row (int): Record number
+
+        Returns:
+            None
+        """
+        self._write(self.header_length + row * self.record_length + self.flag_offset, REMOVED)
+
+    def append(self, values, flag=PRODUCT):
+        """
+        Add a record at the end of the file.
+
+        Args:
+            values (tuple): Field values in FIELDS order
+            flag (bytes): PRODUCT, or MARKER or CHECKPOINT for a record that
+                holds no product
+
+        Returns:
+            int: Record number of the new record, or None if a value is too wide
+        """
+        record = _format(self.widths, values, flag)
+        if record is None:
+            return None
+        row = self.count
+        self._write(self.header_length + row * self.record_length, record)
+        # Map the longer file; the pages already mapped stay in the page cache
+        self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return row
+
+    def mark(self, invoice_number):
+        """
+        Add an invoice marker record.
+
+        Args:
+            invoice_number (str): Invoice number
+
+        Returns:
+            int: Record number of the marker, or None if the number is too wide
+        """
+        return self.append(_note(invoice_number), MARKER)
+
+    def marks(self):
+        """
+        Read the invoice markers and the time of the last rewrite.
+
+        Returns:
+            tuple: (float, list) - The checkpoint time, or None if the file
+                has no checkpoint record, and the invoice numbers marked
+        """
+        data = self._map
+        length = self.record_length
+        flag = self.header_length + self.flag_offset
+        name = self.header_length + self.offsets['name']
+        width = self.widths['name']
+        checkpoint = None
+        numbers = []
+        for row in range(self.count):
+            kind = data[flag + row * length:flag + row * length + 1]
+            if kind == MARKER or kind == CHECKPOINT:
+                start = name + row * length
+                value = data[start:start + width].decode().rstrip()
+                if kind == MARKER:
+                    numbers.append(value)
+                else:
+                    checkpoint = float(value)
+        return checkpoint, numbers
+
+    def fileno(self):
+        """
+        File descriptor of the record file, for fsync.
+
+        Returns:
+            int: The descriptor
+        """
+        return self._file.fileno()
+
+    def close(self):
+        """
+        Unmap and close the file.
+
+        Returns:
+            None
+        """
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
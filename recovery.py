@@ -0,0 +1,236 @@
+"""
+Recovery Module
+Checks after a crash that the saved catalog and the invoices written agree.
+
+Stock changes and invoices are saved separately: the catalog by the storage
+backend, the invoice by the background invoice writer. A crash between the two
+can leave stock taken without an invoice, or an invoice for stock that was
+never taken. Every sale, restock and purchase therefore puts a marker with
+its invoice number into the catalog's change records ('I' records, see
+storage.py), saved in the same transaction as the stock it covers.
+
+The backend's checkpoint bounds the work: for products.txt the last
+compaction, which leaves the whole catalog in products.txt and every change
+since in the journal; for SQLite the last time the marker table was emptied.
+Recovery replays at most one checkpoint interval of records and compares:
+
+    markers since the checkpoint         against the ledger lines written
+                                         since then, the invoice archive and
+                                         the one-file-per-invoice directories
+    ledger lines after the checkpoint    against the markers
+
+Invoices from before the last checkpoint are taken as reconciled, and ledger
+lines in the checkpoint's own second are not checked for a marker, as
+dates only have whole seconds. Gaps are reported, not repaired. Run it before
+the other tills start again, as their next checkpoint drops the markers.
+
+Usage:
+    python main.py --recover
+"""
+
+import csv
+import os
+import time
+from datetime import datetime, timedelta
+
+import metrics
+from invoice_store import InvoiceStore, LEGACY_DIRS
+
+# Ledger lines are appended when the invoice writer gets to them, so they are
+# not quite in date order; start reading this much before the checkpoint
+LEDGER_MARGIN = timedelta(minutes=5)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _date_of(line):
+    """
+    Get the date column of a ledger line.
+
+    Args:
+        line (bytes): One ledger line
+
+    Returns:
+        str: The date and time, or None if the line is not a ledger line
+    """
+    try:
+        row = next(csv.reader([line.decode('utf-8')]))
+    except (ValueError, StopIteration, csv.Error):
+        return None
+    return row[1] if len(row) == 9 else None
+
+
+def _seek_date(file, size, date):
+    """
+    Find the first ledger line dated at or after a date by binary search.
+
+    Args:
+        file (file): Ledger opened in binary mode
+        size (int): Size of the ledger in bytes
+        date (str): Date and time in DATE_FORMAT
+
+    Returns:
+        int: Byte position of the line
+    """
+    low, high = 0, size
+    while low < high:
+        middle = (low + high) // 2
+        # The first line starting at or after middle
+        file.seek(middle - 1 if middle else 0)
+        if middle:
+            file.readline()
+        line_date = _date_of(file.readline())
+        if line_date is not None and line_date < date:
+            low = middle + 1
+        else:
+            high = middle
+    file.seek(low - 1 if low else 0)
+    if low:
+        file.readline()
+    return file.tell()
+
+
+def ledger_since(ledger_file, since):
+    """
+    Read the invoices in the ledger dated at or after a time.
+
+    Only the end of the ledger from LEDGER_MARGIN before the time is read,
+    so this costs the same however long the ledger is.
+
+    Args:
+        ledger_file (str): Name of the ledger file
+        since (str): Date and time in DATE_FORMAT
+
+    Returns:
+        dict: Invoice number -> {'kind', 'date', 'party', 'lines'}, lines
+            being (product, quantity, free items) tuples
+    """
+    invoices = {}
+    start = (datetime.strptime(since, DATE_FORMAT) - LEDGER_MARGIN).strftime(DATE_FORMAT)
+    try:
+        with open(ledger_file, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            first = _seek_date(file, size, start)
+            file.seek(first)
+            read = first
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # Still being written
+                read += len(line)
+                try:
+                    number, date, kind, party, product, quantity, free_items, _, _ = next(
+                        csv.reader([line.decode('utf-8')]))
+                except (ValueError, StopIteration, csv.Error):
+                    continue
+                if date < since:
+                    continue
+                invoice = invoices.get(number)
+                if invoice is None:
+                    invoice = invoices[number] = {'kind': kind, 'date': date, 'party': party, 'lines': []}
+                invoice['lines'].append((product, quantity, free_items))
+            metrics.count('read_bytes', read - first)
+    except FileNotFoundError:
+        pass
+    return invoices
+
+
+def _written(invoice_number, archive):
+    """
+    Check whether an invoice was saved by the invoice archive or as its own file.
+
+    Args:
+        invoice_number (str): Invoice number
+        archive (InvoiceStore): The invoice archive, or None
+
+    Returns:
+        bool: True if the invoice was saved
+    """
+    if archive is not None and invoice_number in archive:
+        return True
+    return any(os.path.exists(os.path.join(directory, prefix + invoice_number + ".txt"))
+               for directory, prefix in LEGACY_DIRS.values())
+
+
+def reconcile(log, ledger_file=None, archive_dir=None):
+    """
+    Compare the invoice markers since the last checkpoint with the invoices written.
+
+    Args:
+        log (tuple): (checkpoint time, invoice numbers marked, records) as
+            returned by StorageBackend.recovery_log
+        ledger_file (str): Name of the ledger file, or None if there is no ledger
+        archive_dir (str): Invoice archive directory, or None if there is no archive
+
+    Returns:
+        tuple: (list, dict) - Marked invoice numbers that were never written,
+            and the invoices written after the checkpoint without a marker
+    """
+    checkpoint, marks, _ = log
+    since = datetime.fromtimestamp(checkpoint).strftime(DATE_FORMAT)
+    written = ledger_since(ledger_file, since) if ledger_file else {}
+
+    missing = sorted(number for number in marks if number not in written)
+    if missing:
+        # Only opened when needed: loading its index reads the whole history
+        archive = InvoiceStore(archive_dir) if archive_dir and os.path.isdir(archive_dir) else None
+        try:
+            missing = [number for number in missing if not _written(number, archive)]
+        finally:
+            if archive is not None:
+                archive.close()
+
+    unrecorded = {number: invoice for number, invoice in written.items()
+                  if invoice['date'] > since and number not in marks}
+    return missing, unrecorded
+
+
+@metrics.timed('recover')
+def recover(store, ledger_file=None, archive_dir=None):
+    """
+    Reconcile an opened catalog with the invoices written and print the gaps.
+
+    Args:
+        store (CatalogStore): Opened products store; opening it replayed the
+            changes since the last checkpoint
+        ledger_file (str): Name of the ledger file, or None if there is no ledger
+        archive_dir (str): Invoice archive directory, or None if there is no archive
+
+    Returns:
+        tuple: (list, dict) as returned by reconcile, or None if the storage
+            backend keeps no invoice markers
+    """
+    start = time.perf_counter()
+    store.backend.lock()
+    try:
+        log = store.backend.recovery_log()
+    finally:
+        store.backend.unlock()
+    if log is None:
+        print("Error: This storage backend keeps no record of changes since a checkpoint to recover from.")
+        return None
+    missing, unrecorded = reconcile(log, ledger_file, archive_dir)
+    elapsed = time.perf_counter() - start
+
+    print("\nRecovery Summary")
+    print("-" * 30)
+    print(f"Last checkpoint:   {datetime.fromtimestamp(log[0]).strftime(DATE_FORMAT)}")
+    print(f"Records after it:  {log[2]}")
+    print(f"Invoices marked:   {len(log[1])}")
+    print(f"Products:          {len(store.catalog)}")
+    print(f"Elapsed:           {elapsed:.3f} s")
+    if not ledger_file:
+        print("No ledger: invoices written without a saved stock change cannot be found.")
+
+    if not missing and not unrecorded:
+        print("\nThe catalog and the invoices agree.")
+        return missing, unrecorded
+    if missing:
+        print("\nStock changes saved but their invoice was never written:")
+        for number in missing:
+            print("  " + number)
+    if unrecorded:
+        print("\nInvoices written but their stock change was never saved:")
+        for number, invoice in sorted(unrecorded.items()):
+            lines = ", ".join(f"{product} x{quantity}" + (f" (+{free} free)" if free not in ('', '0') else '')
+                              for product, quantity, free in invoice['lines'])
+            print(f"  {number}  {invoice['date']}  {invoice['kind']}  {invoice['party']}: {lines}")
+    return missing, unrecorded
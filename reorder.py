@@ -0,0 +1,192 @@
+"""
+Reorder Module
+Finds products that are running out and restocks them with one purchase
+order per supplier.
+
+The catalog tells the reorder engine about every stock change, and the engine
+keeps a min-heap of (stock above the reorder point, row). A sale that leaves
+a product at or below the point pushes one entry, so keeping the heap costs
+O(log n) however large the catalog is; products with plenty of stock are not
+kept in it at all. Entries left behind by later changes are skipped when the
+heap is read, and the heap is rebuilt once it holds more entries than twice
+the catalog's products.
+
+A reorder reads the current entries off the heap, lowest stock first, groups
+the products by supplier and issues, for each
+supplier, one purchase invoice and one store transaction that tops every
+product up to the reorder level. Products without a known supplier are
+reported and left alone.
+"""
+
+import heapq
+
+import invoice_writer
+import metrics
+from catalog import normalize_name
+from operation import generate_purchase_invoice
+
+class ReorderEngine:
+    """
+    Heap of the catalog's products by stock, kept up to date by the catalog.
+    """
+
+    def __init__(self, reorder_point, reorder_level):
+        """
+        Create an engine; attach() it to a catalog before use.
+
+        Args:
+            reorder_point (int): Stock at or below which a product is reordered
+            reorder_level (int): Stock a reorder tops a product up to
+
+        Raises:
+            ValueError: If the reorder level is not above the reorder point
+        """
+        if reorder_level <= reorder_point:
+            raise ValueError("The reorder level must be above the reorder point")
+        self.reorder_point = reorder_point
+        self.reorder_level = reorder_level
+        self.catalog = None
+        self._heap = []
+
+    def attach(self, catalog):
+        """
+        Follow a catalog's stock, rebuilding the heap if it is a different
+        catalog from last time, e.g. after the store reloaded it.
+
+        Args:
+            catalog (ProductCatalog): The catalog
+
+        Returns:
+            None
+        """
+        if catalog is not self.catalog:
+            self.catalog = catalog
+            catalog.set_reorder(self)
+
+    def rebuild(self):
+        """
+        Rebuild the heap from the catalog's quantity column in O(n).
+
+        Returns:
+            None
+        """
+        catalog = self.catalog
+        point = self.reorder_point
+        names = catalog._names
+        self._heap = [(quantity - point, row) for row, quantity in enumerate(catalog._quantity)
+                      if quantity <= point and names[row] is not None]
+        heapq.heapify(self._heap)
+
+    def update(self, row, quantity):
+        """
+        Record a row's new stock. Called by the catalog on every stock change.
+
+        Args:
+            row (int): Row number
+            quantity (int): New units in stock
+
+        Returns:
+            None
+        """
+        ahead = quantity - self.reorder_point
+        if ahead > 0:
+            return  # An entry from when it was lower is dropped when read
+        heap = self._heap
+        heapq.heappush(heap, (ahead, row))
+        if len(heap) > 2 * len(self.catalog) + 1024:
+            # Mostly stale entries: start again rather than let the heap grow
+            self.rebuild()
+
+    def due(self):
+        """
+        Find the products at or below the reorder point.
+
+        Pops every entry, drops stale ones and pushes the current ones back,
+        so this costs O(k log k) for the k entries in the heap.
+
+        Returns:
+            list: Row numbers, lowest stock first
+        """
+        heap = self._heap
+        names = self.catalog._names
+        quantity = self.catalog._quantity
+        point = self.reorder_point
+        rows = []
+        seen = set()
+        while heap:
+            ahead, row = heapq.heappop(heap)
+            if row in seen or names[row] is None or quantity[row] - point != ahead:
+                continue  # Left behind by a later change, a removal or a duplicate
+            seen.add(row)
+            rows.append(row)
+        for row in rows:
+            heapq.heappush(heap, (quantity[row] - point, row))
+        return rows
+
+    def plan(self):
+        """
+        Work out what to order from each supplier.
+
+        Returns:
+            tuple: (dict, list) - supplier -> [(product name, units to order)],
+                and the names of products due for reorder without a known supplier
+        """
+        catalog = self.catalog
+        orders = {}
+        labels = {}
+        unknown = []
+        for row in self.due():
+            product = catalog.get(catalog._names[row])
+            supplier = product['supplier']
+            if not supplier:
+                unknown.append(product['name'])
+                continue
+            key = normalize_name(supplier)
+            labels.setdefault(key, supplier)
+            orders.setdefault(key, []).append((product['name'], self.reorder_level - product['quantity']))
+        return {labels[key]: lines for key, lines in orders.items()}, unknown
+
+
+@metrics.timed('reorder')
+def reorder_low_stock(store, engine):
+    """
+    Restock every product at or below the reorder point, one purchase invoice
+    and one transaction per supplier.
+
+    Each supplier's products are checked again inside its transaction, so
+    stock another till restocked in the meantime is not ordered twice. Its
+    purchase invoice is queued only once the transaction is saved, and never
+    while the products lock is held.
+
+    Args:
+        store (CatalogStore): Opened products store
+        engine (ReorderEngine): The reorder engine
+
+    Returns:
+        tuple: (dict, list) - supplier -> units ordered, and the names of
+            products due for reorder without a known supplier
+
+    Raises:
+        OSError: If a supplier's order could not be saved; the orders from
+            the suppliers before it were
+    """
+    engine.attach(store.refresh())
+    orders, unknown = engine.plan()
+    ordered = {}
+    for supplier, lines in orders.items():
+        with invoice_writer.get_writer().deferred(), store.transaction() as catalog:
+            engine.attach(catalog)
+            items = []
+            for name, _ in lines:
+                product = catalog.get(name)
+                if (product is None or product['quantity'] > engine.reorder_point or
+                        normalize_name(product['supplier']) != normalize_name(supplier)):
+                    continue
+                quantity = engine.reorder_level - product['quantity']
+                catalog.adjust_quantity(name, quantity)
+                items.append({'product': product, 'quantity': quantity, 'cost_price': product['cost_price']})
+            if items:
+                catalog.record_invoice(generate_purchase_invoice(items, supplier))
+                ordered[supplier] = sum(item['quantity'] for item in items)
+                metrics.count('restocks', len(items))
+    return ordered, unknown
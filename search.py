@@ -0,0 +1,315 @@
+"""
+Search Module
+Prefix completion and typo-tolerant matching over product names and brands.
+
+Prefix queries use a sorted list of normalized keys searched with bisect.
+Fuzzy queries work word by word: each typed word is matched against the words
+that appear in product names and brands through a trigram index (overlapping
+three-character pieces), and the products containing the matched words are
+ranked by how similar their whole name is to the query.
+"""
+
+import re
+from itertools import islice
+from bisect import bisect_left, insort
+from collections import Counter
+
+from catalog import normalize_name
+
+# Products rescored exactly once the word matches have narrowed the field
+FUZZY_CANDIDATES = 30
+# Smallest similarity (0 to 1) for a word to be corrected or a product suggested
+MIN_SIMILARITY = 0.3
+
+# Vocabulary trigram postings counted per word correction, rarest first
+CORRECTION_WORK = 5000
+
+_WORD = re.compile(r"\w+")
+
+
+def words(key):
+    """
+    Split a normalized name into its words.
+
+    Args:
+        key (str): Normalized name
+
+    Returns:
+        list: Words, without punctuation
+    """
+    return _WORD.findall(key)
+
+
+def trigrams(key):
+    """
+    Split a normalized name into the set of its three-character pieces.
+
+    The name is padded so that short names and word starts still match.
+
+    Args:
+        key (str): Normalized name
+
+    Returns:
+        set: Trigram strings
+    """
+    padded = "  " + key + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query_grams, key):
+    """
+    Dice similarity between a query's trigrams and a name.
+
+    Args:
+        query_grams (set): Trigrams of the query
+        key (str): Normalized name to compare with
+
+    Returns:
+        float: 1.0 for identical names down to 0.0 for nothing in common
+    """
+    key_grams = trigrams(key)
+    return 2 * len(query_grams & key_grams) / (len(query_grams) + len(key_grams))
+
+
+class ProductSearch:
+    """
+    Search index over the names and brands of a ProductCatalog.
+
+    Get one with catalog.search_index(); the catalog keeps it up to date as
+    products are added and removed.
+    """
+
+    def __init__(self, catalog):
+        """
+        Build the index from every product currently in the catalog.
+
+        Args:
+            catalog (ProductCatalog): Catalog to index
+        """
+        self._catalog = catalog
+        self._keys = []
+        self._word_rows = {}
+        self._word_grams = {}
+        names = catalog._names
+        brands = catalog._brands
+        for row in range(len(names)):
+            if names[row] is not None:
+                self._keys.append((normalize_name(names[row]), row))
+                self._keys.append((normalize_name(brands[row]), row))
+                self._index_row(row)
+        self._keys.sort()
+
+    def _row_words(self, name, brand):
+        """
+        Get the distinct words of a product's name and brand.
+
+        Args:
+            name (str): Product name
+            brand (str): Product brand
+
+        Returns:
+            set: Normalized words
+        """
+        return set(words(normalize_name(name))) | set(words(normalize_name(brand)))
+
+    def _index_row(self, row):
+        """
+        Add a row to the word index, adding new words to the vocabulary.
+
+        Args:
+            row (int): Catalog row number
+
+        Returns:
+            None
+        """
+        for word in self._row_words(self._catalog._names[row], self._catalog._brands[row]):
+            rows = self._word_rows.get(word)
+            if rows is None:
+                rows = self._word_rows[word] = set()
+                for gram in trigrams(word):
+                    self._word_grams.setdefault(gram, set()).add(word)
+            rows.add(row)
+
+    def add(self, row):
+        """
+        Index a product that was just added to the catalog.
+
+        Args:
+            row (int): Catalog row number
+
+        Returns:
+            None
+        """
+        insort(self._keys, (normalize_name(self._catalog._names[row]), row))
+        insort(self._keys, (normalize_name(self._catalog._brands[row]), row))
+        self._index_row(row)
+
+    def discard(self, row, name, brand):
+        """
+        Remove a product from the index.
+
+        Args:
+            row (int): Catalog row number the product had
+            name (str): Name of the removed product
+            brand (str): Brand of the removed product
+
+        Returns:
+            None
+        """
+        for key in (normalize_name(name), normalize_name(brand)):
+            position = bisect_left(self._keys, (key, row))
+            if position < len(self._keys) and self._keys[position] == (key, row):
+                del self._keys[position]
+        # Words stay in the vocabulary; they just stop matching this row
+        for word in self._row_words(name, brand):
+            self._word_rows.get(word, set()).discard(row)
+
+    def complete(self, prefix, limit=10):
+        """
+        Find products whose name or brand starts with the given text.
+
+        Args:
+            prefix (str): Start of a product name or brand, any case
+            limit (int): Most names to return
+
+        Returns:
+            list: Product names, matching names first in alphabetical order
+        """
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        keys = self._keys
+        names = self._catalog._names
+        found = []
+        by_brand = []
+        seen = set()
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            key, row = keys[position]
+            position += 1
+            if row in seen:
+                continue
+            if normalize_name(names[row]) == key:
+                seen.add(row)
+                found.append(names[row])
+                if len(found) >= limit:
+                    break
+            elif len(by_brand) < limit:
+                by_brand.append(row)
+        for row in by_brand:
+            if len(found) >= limit:
+                break
+            if row not in seen:
+                seen.add(row)
+                found.append(names[row])
+        return found
+
+    def _correction(self, word):
+        """
+        Find the known word a typed word most likely stands for.
+
+        Args:
+            word (str): Normalized word as typed
+
+        Returns:
+            str: The word itself if it is known, otherwise the closest known
+                word, or None if nothing is close
+        """
+        if self._word_rows.get(word):
+            return word
+        # Count shared trigrams, starting with the rarest so common pieces
+        # such as digits do not dominate the work
+        grams = trigrams(word)
+        postings = sorted((self._word_grams.get(gram, ()) for gram in grams), key=len)
+        shared = Counter()
+        work = 0
+        for known_words in postings:
+            if work and work + len(known_words) > CORRECTION_WORK:
+                break
+            shared.update(known_words)
+            work += len(known_words)
+        best = None
+        best_score = MIN_SIMILARITY
+        for known, _ in shared.most_common(FUZZY_CANDIDATES):
+            score = similarity(grams, known)
+            if score >= best_score and self._word_rows[known]:
+                best = known
+                best_score = score
+        return best
+
+    def fuzzy(self, query, limit=5):
+        """
+        Find products whose name or brand looks like the query, allowing typos.
+
+        Args:
+            query (str): Product name or brand as typed
+            limit (int): Most names to return
+
+        Returns:
+            list: Product names, most similar first
+        """
+        key = normalize_name(query)
+        matches = []
+        for word in words(key):
+            known = self._correction(word)
+            if known is not None:
+                matches.append(self._word_rows[known])
+        if not matches:
+            return []
+
+        # Walk the rarest word's products and keep those having every other
+        # word, stopping as soon as there are enough to rank
+        matches.sort(key=len)
+        rarest, others = matches[0], matches[1:]
+        having_all = iter(rarest)
+        for rows in others:
+            having_all = filter(rows.__contains__, having_all)
+        candidates = list(islice(having_all, FUZZY_CANDIDATES))
+        if not candidates:
+            # No product has all the words: narrow down skipping the words
+            # that would leave nothing
+            narrowed = rarest
+            for rows in others:
+                both = narrowed & rows
+                if both:
+                    narrowed = both
+            candidates = islice(narrowed, FUZZY_CANDIDATES)
+
+        grams = trigrams(key)
+        names = self._catalog._names
+        brands = self._catalog._brands
+        brand_scores = {}
+        scored = []
+        for row in candidates:
+            # Brands are shared by many rows, so each is only scored once
+            brand = brands[row]
+            brand_score = brand_scores.get(brand)
+            if brand_score is None:
+                brand_score = brand_scores[brand] = similarity(grams, normalize_name(brand))
+            score = max(similarity(grams, normalize_name(names[row])), brand_score)
+            if score >= MIN_SIMILARITY:
+                scored.append((-score, row))
+        scored.sort()
+        return [names[row] for _, row in scored[:limit]]
+
+    def suggest(self, text, limit=5):
+        """
+        Suggest products for a name that did not match exactly.
+
+        Prefix matches come first, then fuzzy matches.
+
+        Args:
+            text (str): Product name as typed
+            limit (int): Most names to return
+
+        Returns:
+            list: Product names
+        """
+        found = self.complete(text, limit)
+        if len(found) < limit:
+            for name in self.fuzzy(text, limit):
+                if name not in found:
+                    found.append(name)
+                    if len(found) >= limit:
+                        break
+        return found
@@ -0,0 +1,636 @@
+"""
+Service Module
+HTTP/JSON interface to the catalog, for web shops and other programs.
+
+One asyncio event loop serves every connection from the single in-memory
+catalog, so queries never wait for the disk. Changes are group committed:
+the change requests that arrive while the previous group is being forced to
+disk are applied together in one store transaction. The group is saved with
+one journal write and one fsync, and each request is answered once its group
+is safe. Invoices are written by the background invoice writer.
+
+Endpoints (request and response bodies are JSON):
+    GET  /products          ?sort=&descending=&brand=&origin=&supplier=&max_quantity=&page=&page_size=
+    GET  /products/<name>
+    GET  /search            ?q=&limit=
+    GET  /reports/<field>   ?value=   field is brand, origin or supplier
+    GET  /metrics           Prometheus text, see metrics.py
+    POST /sell              name, quantity, customer  (or items: [{name, quantity}], customer)
+    POST /restock           name, quantity, supplier
+    POST /add               name, brand, quantity, cost_price, origin, supplier
+
+Usage:
+    python main.py --serve 127.0.0.1:8080
+"""
+
+import asyncio
+import io
+import json
+import time
+from contextlib import redirect_stdout
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+import metrics
+import operation
+import invoice_writer
+from batch import validate_transaction, apply_transaction
+from catalog import FIELDS
+from groups import GROUP_FIELDS
+from operation import sell_cart, PAGE_SIZE
+from reorder import reorder_low_stock
+from validation import validate_text, validate_positive_int
+
+# Largest page GET /products returns
+MAX_PAGE_SIZE = 500
+# Largest request body accepted, in bytes
+MAX_BODY = 64 * 1024
+# Most change requests applied in one store transaction
+MAX_BATCH = 256
+# Seconds without change requests after which other tills' changes are picked up
+REFRESH_INTERVAL = 0.1
+# Filtered and sorted product lists kept for paging until the catalog changes
+MAX_CACHED_LISTS = 64
+
+# URL path of each change request and the batch operation it runs
+CHANGES = {'/sell': 'sell', '/restock': 'restock', '/add': 'add'}
+
+_REASONS = {200: b'OK', 400: b'Bad Request', 404: b'Not Found', 409: b'Conflict',
+            413: b'Payload Too Large', 500: b'Internal Server Error'}
+_RESPONSE_HEAD = (b'HTTP/1.1 %d %s\r\nContent-Type: %s\r\n'
+                  b'Content-Length: %d\r\nConnection: %s\r\n\r\n')
+_JSON = b'application/json'
+_TEXT = b'text/plain; version=0.0.4'
+
+
+def _error(status, message):
+    """
+    Build an error response.
+
+    Args:
+        status (int): HTTP status code
+        message (str): Error message for the client
+
+    Returns:
+        tuple: (int, dict) - Status and response body
+    """
+    return status, {'error': message}
+
+
+def _query_int(query, key, default, maximum=None):
+    """
+    Read a positive whole number from the query string.
+
+    Args:
+        query (dict): Parsed query string
+        key (str): Parameter name
+        default (int): Value used when the parameter is missing
+        maximum (int): Largest value allowed, or None for no limit
+
+    Returns:
+        tuple: (int, str) - The number and an error message, one of which is None
+    """
+    if not query.get(key):
+        return default, None
+    number, error = validate_positive_int(query[key], key)
+    if error:
+        return None, key + ": " + error
+    if maximum is not None:
+        number = min(number, maximum)
+    return number, None
+
+
+class CatalogService:
+    """
+    Answers HTTP requests from a CatalogStore's catalog.
+
+    Queries read the catalog directly. Change requests are queued and applied
+    by a single commit task, one group at a time, so a change never runs while
+    another group is half saved and the products lock is only ever taken by
+    that task.
+    """
+
+    def __init__(self, store, max_batch=MAX_BATCH, refresh_interval=REFRESH_INTERVAL, reorder=None,
+                 reorder_interval=None):
+        """
+        Create a service; call start() from a running event loop.
+
+        Args:
+            store (CatalogStore): Opened products store
+            max_batch (int): Most change requests applied in one transaction
+            refresh_interval (float): Seconds without changes after which
+                changes saved by other tills are picked up
+            reorder (ReorderEngine): Restocks low stock every reorder_interval, or None
+            reorder_interval (float): Seconds between reorders
+        """
+        self.store = store
+        self.max_batch = max_batch
+        self.refresh_interval = refresh_interval
+        self.reorder = reorder if reorder_interval else None
+        self.reorder_interval = reorder_interval
+        self._next_reorder = time.monotonic() + (reorder_interval or 0)
+        self._changes = None
+        self._committer = None
+        self._lists = {}
+        self._version = store.version
+
+    async def start(self, host, port):
+        """
+        Start listening and start the commit task.
+
+        Args:
+            host (str): Address to listen on
+            port (int): TCP port to listen on
+
+        Returns:
+            asyncio.Server: The listening server
+        """
+        self._changes = asyncio.Queue()
+        self._committer = asyncio.create_task(self._commit_changes())
+        return await asyncio.start_server(self.handle, host, port, backlog=1024)
+
+    def stop(self):
+        """
+        Stop the commit task. Requests still queued are not answered.
+
+        Returns:
+            None
+        """
+        if self._committer is not None:
+            self._committer.cancel()
+            self._committer = None
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of one connection, keeping it open between requests.
+
+        Args:
+            reader (asyncio.StreamReader): Incoming side of the connection
+            writer (asyncio.StreamWriter): Outgoing side of the connection
+
+        Returns:
+            None
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head[:-4].decode('latin-1').split('\r\n')
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.split(' ')
+                length = headers.get('content-length', '0')
+                keep_alive = False
+                if len(parts) != 3 or not length.isdigit():
+                    status, body = _error(400, "Malformed request.")
+                elif int(length) > MAX_BODY:
+                    status, body = _error(413, "Request body is too large.")
+                else:
+                    method, target, version = parts
+                    connection = headers.get('connection', '').lower()
+                    if version == 'HTTP/1.1':
+                        keep_alive = connection != 'close'
+                    else:
+                        keep_alive = connection == 'keep-alive'
+                    try:
+                        data = await reader.readexactly(int(length)) if length != '0' else b''
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        return
+                    started = metrics.start()
+                    try:
+                        status, body = await self.dispatch(method, target, data)
+                    except Exception as e:
+                        print(f"Error handling {method} {target}: {e}")
+                        status, body = _error(500, "Internal error.")
+                    metrics.stop('http_' + method.lower(), started)
+
+                # Handlers answer with a dict for JSON or a str for plain text
+                if isinstance(body, str):
+                    content_type, payload = _TEXT, body.encode('utf-8')
+                else:
+                    content_type, payload = _JSON, json.dumps(body).encode('utf-8')
+                writer.write(_RESPONSE_HEAD % (status, _REASONS[status], content_type, len(payload),
+                                               b'keep-alive' if keep_alive else b'close') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, data):
+        """
+        Route a request to its handler.
+
+        Args:
+            method (str): HTTP method
+            target (str): Request path and query string
+            data (bytes): Request body
+
+        Returns:
+            tuple: (int, dict) - Status and response body; the body is a str
+                for plain text responses
+        """
+        url = urlsplit(target)
+        path = url.path
+        if method == 'GET':
+            query = dict(parse_qsl(url.query))
+            if path == '/products':
+                return self.list_products(query)
+            if path.startswith('/products/'):
+                return self.get_product(unquote(path[len('/products/'):]))
+            if path == '/search':
+                return self.search(query)
+            if path.startswith('/reports/'):
+                return self.report(path[len('/reports/'):], query)
+            if path == '/metrics':
+                return 200, metrics.render_prometheus()
+        elif method == 'POST' and path in CHANGES:
+            try:
+                record = json.loads(data)
+            except ValueError:
+                return _error(400, "Request body is not valid JSON.")
+            if not isinstance(record, dict):
+                return _error(400, "Request body must be a JSON object.")
+            return await self.change(CHANGES[path], record)
+        return _error(404, "No such endpoint: " + method + " " + path)
+
+    def list_products(self, query):
+        """
+        One page of the products, filtered and sorted like the display option.
+
+        The matching rows are kept until the catalog changes, so paging
+        through a large result only formats the page asked for.
+
+        Args:
+            query (dict): sort, descending, brand, origin, supplier,
+                max_quantity, page and page_size parameters
+
+        Returns:
+            tuple: (int, dict) - Status and a body with total, page, pages and products
+        """
+        sort_by = query.get('sort') or None
+        if sort_by is not None and sort_by not in FIELDS:
+            return _error(400, "Unknown column '" + sort_by + "'.")
+        page, error = _query_int(query, 'page', 1)
+        if error is None:
+            page_size, error = _query_int(query, 'page_size', PAGE_SIZE, MAX_PAGE_SIZE)
+        max_quantity = None
+        if error is None and query.get('max_quantity') not in (None, '', '0'):
+            max_quantity, error = _query_int(query, 'max_quantity', None)
+        if error:
+            return _error(400, error)
+
+        options = (sort_by, query.get('descending') in ('1', 'true', 'yes'),
+                   query.get('brand') or None, query.get('origin') or None,
+                   query.get('supplier') or None, max_quantity)
+        catalog = self.store.catalog
+        rows = self._lists.get(options)
+        if rows is None:
+            if len(self._lists) >= MAX_CACHED_LISTS:
+                self._lists.clear()
+            rows = self._lists[options] = catalog.select_rows(*options)
+
+        start = (page - 1) * page_size
+        view = catalog.view
+        return 200, {
+            'total': len(rows),
+            'page': page,
+            'pages': max(1, -(-len(rows) // page_size)),
+            'products': [dict(view(row)) for row in rows[start:start + page_size]]
+        }
+
+    def get_product(self, name):
+        """
+        Look up one product by name ignoring case.
+
+        Args:
+            name (str): Product name
+
+        Returns:
+            tuple: (int, dict) - Status and the product, or an error with suggestions
+        """
+        catalog = self.store.catalog
+        product = catalog.get(name)
+        if product is None:
+            return 404, {'error': "Product not found.",
+                         'suggestions': catalog.search_index().suggest(name)}
+        return 200, dict(product)
+
+    def search(self, query):
+        """
+        Product names starting with or resembling the search text.
+
+        Args:
+            query (dict): q (the search text) and limit parameters
+
+        Returns:
+            tuple: (int, dict) - Status and a body with the matching names
+        """
+        text = query.get('q', '')
+        if not text.strip():
+            return _error(400, "Search text cannot be empty!")
+        limit, error = _query_int(query, 'limit', 5, 50)
+        if error:
+            return _error(400, error)
+        return 200, {'products': self.store.catalog.search_index().suggest(text, limit)}
+
+    def report(self, field, query):
+        """
+        Stock totals per brand, origin or supplier, like the stock report option.
+
+        Args:
+            field (str): One of GROUP_FIELDS
+            query (dict): value parameter to report on one group only
+
+        Returns:
+            tuple: (int, dict) - Status and a body with the groups' totals
+        """
+        if field not in GROUP_FIELDS:
+            return _error(404, "Choose brand, origin or supplier.")
+        catalog = self.store.catalog
+        value = query.get('value', '').strip()
+        if value:
+            totals = catalog.group_totals(field, value)
+            if totals is None:
+                return _error(404, "No products found for " + field + " '" + value + "'.")
+            return 200, {'groups': [totals]}
+        groups = sorted(catalog.group_index(field), key=lambda totals: totals[field].casefold())
+        return 200, {'groups': groups}
+
+    async def change(self, op, record):
+        """
+        Queue a change request and wait until its group has been saved.
+
+        Args:
+            op (str): 'sell', 'restock' or 'add'
+            record (dict): Request body with the fields batch records use
+
+        Returns:
+            tuple: (int, dict) - Status and response body
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._changes.put_nowait((op, record, future))
+        return await future
+
+    async def _commit_changes(self):
+        """
+        Apply queued change requests a group at a time until cancelled.
+
+        Each group is applied and saved under the products lock without
+        leaving the event loop, which takes microseconds. Forcing it to disk
+        and queueing its invoices run on a worker thread, and the requests
+        that arrive meanwhile form the next group.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        changes = self._changes
+        while True:
+            if self.reorder is not None and time.monotonic() >= self._next_reorder:
+                self._reorder()
+            try:
+                group = [await asyncio.wait_for(changes.get(), self.refresh_interval)]
+            except asyncio.TimeoutError:
+                self._refresh()
+                continue
+            while len(group) < self.max_batch and not changes.empty():
+                group.append(changes.get_nowait())
+
+            started = metrics.start()
+            try:
+                results, invoices, saved = self._apply_group(group)
+                saved = await loop.run_in_executor(None, self._finish_group, invoices) and saved
+            except Exception as e:
+                print(f"Error saving changes: {e}")
+                results, saved = [None] * len(group), False
+            metrics.stop('commit_group', started)
+
+            for (op, record, future), result in zip(group, results):
+                if future.done():
+                    continue
+                if not saved and (result is None or result[0] == 200):
+                    result = _error(500, "Changes could not be saved.")
+                future.set_result(result)
+
+    def _apply_group(self, group):
+        """
+        Apply a group of change requests in one store transaction.
+
+        A request that raises gets a 500 and the group is rolled back,
+        dropping its invoices, then applied again without it, so the other
+        requests are saved once and a client retrying the failed one does
+        not sell twice.
+
+        Args:
+            group (list): (op, record, future) tuples
+
+        Returns:
+            tuple: (list, list, bool) - Response per request, the invoices to
+                queue and whether the changes were saved
+        """
+        results = [None] * len(group)
+        pending = list(range(len(group)))
+        while True:
+            with invoice_writer.get_writer().deferred() as held:
+                catalog = self.store.begin()
+                index = None
+                try:
+                    for index in pending:
+                        op, record, future = group[index]
+                        results[index] = self._apply(catalog, op, record, held)
+                except Exception as e:
+                    print(f"Error applying change request: {e}")
+                    del held[:]
+                    self.store.rollback()
+                    results[index] = _error(500, "The change could not be applied.")
+                    pending.remove(index)
+                    continue
+                saved = self.store.commit(sync=False)
+                if not saved:
+                    # Nothing to invoice: the changes never reached the disk
+                    del held[:]
+                    self.store.revert()
+                # Queued by _finish_group instead, so waiting for room in the
+                # invoice queue never blocks the event loop
+                invoices = held[:]
+                del held[:]
+            break
+        self._lists.clear()
+        self._version = self.store.version
+        return results, invoices, saved
+
+    def _finish_group(self, invoices):
+        """
+        Force a saved group to disk and queue its invoices. Runs on a worker thread.
+
+        Args:
+            invoices (list): (kind, invoice_number, text, entries) tuples
+
+        Returns:
+            bool: True if the group is committed, False otherwise
+        """
+        saved = self.store.sync()
+        writer = invoice_writer.get_writer()
+        for invoice in invoices:
+            writer.submit(*invoice)
+        return saved
+
+    def _apply(self, catalog, op, record, held):
+        """
+        Apply one change request with the batch validation rules.
+
+        Args:
+            catalog (ProductCatalog): Catalog being changed under the products lock
+            op (str): 'sell', 'restock' or 'add'
+            record (dict): Request body
+            held (list): Invoices held back so far in this group
+
+        Returns:
+            tuple: (int, dict) - Status and response body
+        """
+        invoices = len(held)
+        output = io.StringIO()
+        if op == 'sell' and 'items' in record:
+            lines, error = self._cart_lines(record)
+            if error:
+                metrics.count('rejects')
+                return _error(400, error)
+            with redirect_stdout(output):
+                success, catalog = sell_cart(catalog, lines, str(record['customer']).strip())
+            names = [name for name, quantity in lines]
+        else:
+            record = dict(record, op=op)
+            op, error = validate_transaction(catalog, record)
+            if error:
+                metrics.count('rejects')
+                return _error(409, error)
+            with redirect_stdout(output):
+                success = apply_transaction(catalog, op, record)
+            names = [str(record['name']).strip()]
+
+        if not success:
+            # The operations print their own error messages
+            return _error(409, output.getvalue().strip() or "Transaction failed.")
+        body = {'invoice': held[-1][1] if len(held) > invoices else None}
+        products = [dict(catalog.get(name)) for name in dict.fromkeys(names)]
+        if len(products) == 1:
+            body['product'] = products[0]
+        else:
+            body['products'] = products
+        return 200, body
+
+    @staticmethod
+    def _cart_lines(record):
+        """
+        Check the items and customer of a cart sale.
+
+        Args:
+            record (dict): Request body with items and customer
+
+        Returns:
+            tuple: (list, str) - (product_name, quantity) pairs and an error
+                message, one of which is None
+        """
+        items = record.get('items')
+        if not isinstance(items, list) or not items:
+            return None, "The cart is empty."
+        lines = []
+        for item in items:
+            if not isinstance(item, dict):
+                return None, "Each item needs a name and quantity."
+            name = str(item.get('name') or '').strip()
+            if not name:
+                return None, "Product name cannot be empty!"
+            quantity, error = validate_positive_int(item.get('quantity'), "quantity")
+            if error:
+                return None, error
+            lines.append((name, quantity))
+        error = validate_text(str(record.get('customer') or ''), "Customer name")
+        if error:
+            return None, error
+        return lines, None
+
+    def _reorder(self):
+        """
+        Restock low stock, one transaction per supplier, between groups.
+
+        Returns:
+            None
+        """
+        self._next_reorder = time.monotonic() + self.reorder_interval
+        try:
+            ordered, unknown = reorder_low_stock(self.store, self.reorder)
+        except Exception as e:
+            print(f"Error reordering stock: {e}")
+            return
+        for supplier, units in ordered.items():
+            print(f"Reordered {units} units from {supplier}.")
+        self._lists.clear()
+        self._version = self.store.version
+
+    def _refresh(self):
+        """
+        Pick up changes saved by other tills while no change requests are waiting.
+
+        Returns:
+            None
+        """
+        self.store.refresh()
+        if self.store.version != self._version:
+            self._lists.clear()
+            self._version = self.store.version
+
+
+async def _serve(store, host, port, reorder, reorder_interval):
+    """
+    Run the service until the task is cancelled.
+
+    Args:
+        store (CatalogStore): Opened products store
+        host (str): Address to listen on
+        port (int): TCP port to listen on
+        reorder (ReorderEngine): Restocks low stock on a schedule, or None
+        reorder_interval (float): Seconds between reorders
+
+    Returns:
+        None
+    """
+    service = CatalogService(store, reorder=reorder, reorder_interval=reorder_interval)
+    server = await service.start(host, port)
+    print(f"Serving {len(store.catalog)} products on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.stop()
+
+
+def serve(store, host='127.0.0.1', port=8080, reorder=None, reorder_interval=None):
+    """
+    Serve the catalog over HTTP until interrupted.
+
+    Args:
+        store (CatalogStore): Opened products store
+        host (str): Address to listen on
+        port (int): TCP port to listen on
+        reorder (ReorderEngine): Restocks low stock on a schedule, or None
+        reorder_interval (float): Seconds between reorders
+
+    Returns:
+        None
+    """
+    echo = operation.ECHO_INVOICES
+    operation.ECHO_INVOICES = False
+    try:
+        asyncio.run(_serve(store, host, port, reorder, reorder_interval))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        operation.ECHO_INVOICES = echo
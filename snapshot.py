@@ -0,0 +1,478 @@
+"""
+Snapshot Module
+Binary columnar snapshot of the catalog that loads through mmap.
+
+Layout (little-endian, every section 8-byte aligned):
+    header       magic b'WCSNAP03', row count, string count, names length,
+                 keys length, then the inode, modification time (ns) and size
+                 of the products file it was written from (all u64)
+    quantity     int64 x rows
+    cost_price   int64 x rows
+    brand        uint32 x rows   index into the string table
+    origin       uint32 x rows   index into the string table
+    supplier     uint32 x rows   index into the string table
+    offsets      uint64 x (strings + 1)   start of each string in the blob
+    blob         UTF-8 bytes of the brands, origins and suppliers, each
+                 distinct string stored once
+    names        UTF-8 product names separated by NUL
+    keys         the names' catalog lookup keys (normalize_name), separated by NUL
+
+Names and keys are decoded with one decode and one split each, and the keys
+become the catalog's name index without normalizing every name again.
+WCSNAP02 and WCSNAP01 files, which keep names in the string table and have
+no keys or products file stamp, can still be read.
+
+Usage:
+    python snapshot.py to-binary products.txt products.snap
+    python snapshot.py to-text products.snap products.txt
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+import metrics
+from catalog import MARKUP, ProductCatalog, normalize_name
+from write import atomic_write, file_signature, update_product_file
+
+MAGIC = b'WCSNAP03'
+# Older snapshots, still readable: names in the string table, and before
+# WCSNAP02 no suppliers
+MAGIC_V2 = b'WCSNAP02'
+MAGIC_V1 = b'WCSNAP01'
+HEADER = struct.Struct('<8sQQQQQQQ')
+HEADER_V2 = struct.Struct('<8sQQ')
+# Separates the names, and the keys, in their sections
+SEPARATOR = '\0'
+
+
+def _pad(length):
+    """
+    Number of padding bytes needed to reach the next 8-byte boundary.
+
+    Args:
+        length (int): Current length in bytes
+
+    Returns:
+        int: Padding length
+    """
+    return -length % 8
+
+
+def _le(values):
+    """
+    Convert an array to little-endian byte order in place if needed.
+
+    Args:
+        values (array): Array to convert
+
+    Returns:
+        array: The same array
+    """
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def snapshot_columns(products):
+    """
+    Copy the columns a snapshot is written from.
+
+    Copying is quick next to encoding, so a store can take the copy while it
+    holds the products lock and write the snapshot after releasing it.
+
+    Args:
+        products (iterable): Products to write, e.g. a list or ProductCatalog
+
+    Returns:
+        tuple: Columns as returned by ProductCatalog.columns
+    """
+    if isinstance(products, ProductCatalog):
+        return products.columns()
+    products = list(products)
+    names = [product['name'] for product in products]
+    return (names, [product['brand'] for product in products],
+            array('q', [product['quantity'] for product in products]),
+            array('q', [product['cost_price'] for product in products]),
+            [product['origin'] for product in products],
+            [product.get('supplier') or '' for product in products],
+            list(map(normalize_name, names)))
+
+
+@metrics.timed('write_snapshot')
+def write_columns(columns, snapshot_file, source=None):
+    """
+    Write columns copied by snapshot_columns to a binary snapshot file.
+
+    Args:
+        columns (tuple): Columns as returned by snapshot_columns
+        snapshot_file (str): Name of the snapshot file
+        source (tuple): file_signature of the products file the snapshot
+            matches, or None to match it by modification time
+
+    Returns:
+        bool: True if the snapshot was written, False otherwise
+    """
+    names, brands, quantity, cost_price, origins, suppliers, keys = columns
+    names_text = SEPARATOR.join(names)
+    if names_text.count(SEPARATOR) != max(len(names) - 1, 0):
+        print("Error writing snapshot: A product name contains a NUL character.")
+        return False
+    names_data = names_text.encode('utf-8')
+    keys_data = SEPARATOR.join(keys).encode('utf-8')
+
+    string_ids = {}
+    id_columns = [array('I', [string_ids.setdefault(text, len(string_ids)) for text in column])
+                  for column in (brands, origins, suppliers)]
+    strings = [text.encode('utf-8') for text in string_ids]
+    offsets = array('Q', [0])
+    for encoded in strings:
+        offsets.append(offsets[-1] + len(encoded))
+
+    sections = [HEADER.pack(MAGIC, len(names), len(strings), len(names_data), len(keys_data),
+                            *(source or (0, 0, 0)))]
+    for values in [quantity, cost_price] + id_columns + [offsets]:
+        data = _le(values).tobytes()
+        sections.append(data + b'\0' * _pad(len(data)))
+    for data in (b''.join(strings), names_data):
+        sections.append(data + b'\0' * _pad(len(data)))
+    sections.append(keys_data)
+
+    try:
+        atomic_write(snapshot_file, b''.join(sections))
+        return True
+    except Exception as e:
+        print(f"Error writing snapshot: {e}")
+        return False
+
+
+def write_snapshot(products, snapshot_file, source=None):
+    """
+    Write the products to a binary snapshot file.
+
+    Args:
+        products (iterable): Products to write, e.g. a list or ProductCatalog
+        snapshot_file (str): Name of the snapshot file
+        source (tuple): file_signature of the products file the snapshot
+            matches, or None to match it by modification time
+
+    Returns:
+        bool: True if the snapshot was written, False otherwise
+    """
+    return write_columns(snapshot_columns(products), snapshot_file, source)
+
+
+def snapshot_source(snapshot_file):
+    """
+    Read which version of the products file a snapshot was written from.
+
+    Args:
+        snapshot_file (str): Name of the snapshot file
+
+    Returns:
+        tuple: file_signature of the products file, or None if the snapshot
+            does not record it
+    """
+    with open(snapshot_file, 'rb') as file:
+        header = file.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        return None
+    source = HEADER.unpack(header)[5:]
+    return source if any(source) else None
+
+
+def is_snapshot(filename):
+    """
+    Check whether a file is a binary snapshot.
+
+    Args:
+        filename (str): Name of the file
+
+    Returns:
+        bool: True if the file starts with the snapshot magic bytes
+    """
+    try:
+        with open(filename, 'rb') as file:
+            return file.read(len(MAGIC)) in (MAGIC, MAGIC_V2, MAGIC_V1)
+    except OSError:
+        return False
+
+
+class SnapshotReader:
+    """
+    Read-only view over a memory-mapped snapshot file.
+
+    Opening a snapshot only maps the file and checks its header; the numeric
+    columns are read straight from the mapping and strings are decoded the
+    first time they are used.
+    """
+
+    def __init__(self, snapshot_file):
+        """
+        Map a snapshot file into memory.
+
+        Args:
+            snapshot_file (str): Name of the snapshot file
+
+        Raises:
+            ValueError: If the file is not a valid snapshot
+        """
+        with open(snapshot_file, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._map[:len(MAGIC)]
+        if magic not in (MAGIC, MAGIC_V2, MAGIC_V1) or len(self._map) < (
+                HEADER if magic == MAGIC else HEADER_V2).size:
+            self._map.close()
+            raise ValueError(f"'{snapshot_file}' is not a snapshot file")
+        if magic == MAGIC:
+            _, rows, string_count, names_length, keys_length = HEADER.unpack_from(self._map)[:5]
+            position = HEADER.size
+            layout = (('q', rows),) * 2 + (('I', rows),) * 3
+        else:
+            _, rows, string_count = HEADER_V2.unpack_from(self._map)
+            position = HEADER_V2.size
+            layout = (('q', rows),) * 2 + (('I', rows),) * (4 if magic == MAGIC_V2 else 3)
+
+        view = memoryview(self._map)
+        sections = []
+        for code, count in layout + (('Q', string_count + 1),):
+            length = count * array(code).itemsize
+            sections.append(view[position:position + length].cast(code))
+            position += length + _pad(length)
+        if sys.byteorder != 'little':
+            # The mapping is little-endian, so copy and swap on big-endian hosts
+            sections = [_le(array(section.format, section)) for section in sections]
+        self.row_count = rows
+        self.quantity, self.cost_price = sections[:2]
+        self._offsets = sections[-1]
+        self._strings = [None] * string_count
+        self._table = None
+        self._names = None
+        self._keys = None
+        if magic == MAGIC:
+            self._name = None
+            self._brand, self._origin, self._supplier = sections[2:5]
+            self._blob = view[position:position + self._offsets[-1]]
+            position += self._offsets[-1] + _pad(self._offsets[-1])
+            self._names_data = view[position:position + names_length]
+            position += names_length + _pad(names_length)
+            self._keys_data = view[position:position + keys_length]
+        else:
+            self._name, self._brand, self._origin = sections[2:5]
+            self._supplier = sections[5] if magic == MAGIC_V2 else None
+            self._blob = view[position:]
+            self._names_data = self._keys_data = None
+
+    def string(self, string_id):
+        """
+        Decode an entry of the string table, caching the result.
+
+        Args:
+            string_id (int): Index into the string table
+
+        Returns:
+            str: The decoded string
+        """
+        text = self._strings[string_id]
+        if text is None:
+            start = self._offsets[string_id]
+            end = self._offsets[string_id + 1]
+            text = self._strings[string_id] = str(self._blob[start:end], 'utf-8')
+        return text
+
+    def _split(self, data):
+        """
+        Decode a names or keys section.
+
+        Args:
+            data (memoryview): The section
+
+        Returns:
+            list: The strings, one per row
+        """
+        return str(data, 'utf-8').split(SEPARATOR) if self.row_count else []
+
+    def names(self):
+        """
+        Get the product names, decoding them all on first use.
+
+        Returns:
+            list: Product name of each row
+        """
+        if self._names is None:
+            if self._names_data is not None:
+                self._names = self._split(self._names_data)
+            else:
+                self._names = [self.string(i) for i in self._name]
+        return self._names
+
+    def keys(self):
+        """
+        Get the catalog lookup key of each product name, if the snapshot has them.
+
+        Returns:
+            list: normalize_name of each row's name, or None for older snapshots
+        """
+        if self._keys is None and self._keys_data is not None:
+            self._keys = self._split(self._keys_data)
+        return self._keys
+
+    def _column(self, ids):
+        """
+        Decode a column of string table indexes.
+
+        Args:
+            ids (memoryview): String table index of each row
+
+        Returns:
+            list: The strings, one per row
+        """
+        if self._name is not None:
+            # Older snapshots keep every name in the table too: decode only what is used
+            string = self.string
+            return [string(i) for i in ids]
+        if self._table is None:
+            self._table = [sys.intern(self.string(i)) for i in range(len(self._strings))]
+        return list(map(self._table.__getitem__, ids))
+
+    def row(self, index):
+        """
+        Build the product dictionary for one row.
+
+        Args:
+            index (int): Row number
+
+        Returns:
+            dict: Product information in the same form as read_products_file
+        """
+        cost_price = self.cost_price[index]
+        return {
+            'name': self.names()[index] if self._name is None else self.string(self._name[index]),
+            'brand': self.string(self._brand[index]),
+            'quantity': self.quantity[index],
+            'cost_price': cost_price,
+            'origin': self.string(self._origin[index]),
+            'selling_price': cost_price * MARKUP,
+            'supplier': self.string(self._supplier[index]) if self._supplier is not None else ''
+        }
+
+    def columns(self):
+        """
+        Decode the whole snapshot as columns for ProductCatalog.extend_columns.
+
+        The numeric columns are returned as views of the mapping, so they must
+        be copied before the reader is closed.
+
+        Returns:
+            tuple: (names, brands, quantity, cost_price, origins, suppliers,
+                keys), suppliers being None for snapshots written without
+                them and keys None for snapshots without keys
+        """
+        suppliers = self._column(self._supplier) if self._supplier is not None else None
+        return (self.names(), self._column(self._brand), self.quantity, self.cost_price,
+                self._column(self._origin), suppliers, self.keys())
+
+    def __len__(self):
+        return self.row_count
+
+    def __iter__(self):
+        for index in range(self.row_count):
+            yield self.row(index)
+
+    def close(self):
+        """
+        Release the memory views and unmap the file.
+
+        Returns:
+            None
+        """
+        for name in ('quantity', 'cost_price', '_name', '_brand', '_origin', '_supplier',
+                     '_offsets', '_blob', '_names_data', '_keys_data'):
+            section = self.__dict__.pop(name, None)
+            if isinstance(section, memoryview):
+                section.release()
+        self._map.close()
+
+
+@metrics.timed('load_snapshot')
+def load_snapshot(catalog, snapshot_file):
+    """
+    Load a snapshot file into a catalog column by column.
+
+    Arguments:
+        catalog (ProductCatalog): Catalog to fill
+        snapshot_file (str): Name of the snapshot file
+
+    Returns:
+        bool: True if the snapshot was loaded, False otherwise
+    """
+    try:
+        reader = SnapshotReader(snapshot_file)
+    except FileNotFoundError:
+        print(f"Error: File '{snapshot_file}' not found.")
+        return False
+    except Exception as e:
+        print(f"Error reading snapshot: {e}")
+        return False
+    try:
+        metrics.count('read_bytes', len(reader._map))
+        catalog.extend_columns(*reader.columns())
+        return True
+    finally:
+        reader.close()
+
+
+def read_snapshot(snapshot_file):
+    """
+    Read a snapshot file into a list of product dictionaries.
+
+    Arguments:
+        snapshot_file (str): Name of the snapshot file
+
+    Returns:
+        list: List of dictionaries containing product information
+    """
+    try:
+        reader = SnapshotReader(snapshot_file)
+    except FileNotFoundError:
+        print(f"Error: File '{snapshot_file}' not found.")
+        return []
+    except Exception as e:
+        print(f"Error reading snapshot: {e}")
+        return []
+    try:
+        return list(reader)
+    finally:
+        reader.close()
+
+
+def main(argv):
+    """
+    Convert between products.txt and the binary snapshot format.
+
+    Args:
+        argv (list): Command line arguments without the program name
+
+    Returns:
+        int: Exit status
+    """
+    from read import load_catalog  # read imports this module
+
+    if len(argv) != 3 or argv[0] not in ('to-binary', 'to-text'):
+        print(__doc__.split('Usage:')[1].rstrip())
+        return 2
+
+    command, source, target = argv
+    products = load_catalog(source)
+    if command == 'to-binary':
+        ok = bool(products) and write_snapshot(products, target, file_signature(source))
+    else:
+        ok = bool(products) and update_product_file(products, target)
+    if ok:
+        print(f"Converted {len(products)} products from '{source}' to '{target}'.")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
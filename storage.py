@@ -0,0 +1,966 @@
+"""
+Storage Module
+Storage engines that keep the catalog on disk, behind one interface.
+
+    TextBackend    products.txt with its journal and binary snapshot (default)
+    SQLiteBackend  an SQLite database in WAL mode, one row per product, so a
+                   sale is a single-row UPDATE
+    RecordBackend  a fixed-width record file (records.py) read through mmap
+                   and updated in place, so a sale rewrites one quantity field
+
+CatalogStore (store.py) runs every change through a backend:
+
+    lock()                     take the backend's write lock
+    catch_up(catalog)          apply what other processes saved
+    apply_changes(changes)     save the catalog's change records
+    snapshot(catalog)          rewrite everything, when needs_snapshot() says so
+    unlock()                   make the changes visible and release the lock
+    rollback()                 or release it without saving anything
+    sync()                     force them to disk if that waits until after unlock
+
+Usage:
+    python storage.py to-sqlite products.txt products.db [--journal products.journal]
+    python storage.py to-records products.txt products.rec [--journal products.journal]
+    python storage.py to-text products.db products.txt [--journal products.journal]
+
+The source's backend is chosen by its extension: .db is SQLite, .rec is a
+record file, anything else is a text products file.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from array import array
+
+import metrics
+from catalog import ProductCatalog, MARKUP, normalize_name
+from filelock import FileLock
+from read import load_catalog, read_journal, replay_journal
+from records import MARKER, PRODUCT, RecordFile, write_records
+from snapshot import snapshot_columns, write_columns
+from write import Journal, DurabilityPolicy, file_signature, update_product_file
+
+
+class StorageBackend:
+    """
+    Interface of the storage engines.
+
+    Change records are the tuples returned by ProductCatalog.take_changes:
+    ('A', name, brand, quantity, cost_price, origin, supplier), ('Q', name,
+    quantity), ('S', name, supplier), ('D', name) and ('I', invoice_number),
+    which marks the invoice covering the changes before it. Every method
+    except get() and close() must be called between lock() and unlock().
+    """
+
+    def lock(self):
+        """
+        Wait for the backend's write lock and take it.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    def unlock(self):
+        """
+        Make the changes saved under the lock visible and release it.
+
+        Returns:
+            bool: True if the changes are saved, False otherwise
+        """
+        raise NotImplementedError
+
+    def rollback(self):
+        """
+        Release the lock, abandoning a transaction before apply_changes().
+
+        Returns:
+            None
+        """
+        self.unlock()
+
+    def load(self):
+        """
+        Read the whole catalog.
+
+        Returns:
+            ProductCatalog: The loaded catalog, empty if it could not be read
+        """
+        raise NotImplementedError
+
+    def catch_up(self, catalog):
+        """
+        Apply what other processes saved since this one last looked.
+
+        Args:
+            catalog (ProductCatalog): Catalog with no unsaved changes
+
+        Returns:
+            ProductCatalog: The up-to-date catalog, possibly a new object
+        """
+        raise NotImplementedError
+
+    def get(self, name):
+        """
+        Read one product straight from storage.
+
+        Args:
+            name (str): Product name, any case
+
+        Returns:
+            dict: Product information, or None if there is no such product
+        """
+        raise NotImplementedError
+
+    def apply_change(self, change):
+        """
+        Save one change record.
+
+        Args:
+            change (tuple): Change record
+
+        Returns:
+            bool: True if the change was saved, False otherwise
+        """
+        return self.apply_changes([change])
+
+    def apply_changes(self, changes):
+        """
+        Save change records in order.
+
+        Args:
+            changes (list): Change records
+
+        Returns:
+            bool: True if the changes were saved, False otherwise
+        """
+        raise NotImplementedError
+
+    def needs_snapshot(self):
+        """
+        Check whether the whole catalog should be rewritten after apply_changes.
+
+        Returns:
+            bool: True if snapshot() should be called
+        """
+        return False
+
+    def snapshot(self, products):
+        """
+        Replace the stored catalog with the given products.
+
+        Args:
+            products (iterable): Products to store, e.g. a ProductCatalog
+
+        Returns:
+            bool: True if the products were saved, False otherwise
+        """
+        raise NotImplementedError
+
+    def sync(self):
+        """
+        Force the changes of the last transaction to disk if unlock() did not.
+
+        Returns:
+            bool: True if the changes are on disk as the durability policy requires
+        """
+        return True
+
+    def recovery_log(self):
+        """
+        Describe what was saved since the last checkpoint, for crash recovery
+        (recovery.py).
+
+        Returns:
+            tuple: (float, set, int) - Time of the last checkpoint, the invoice
+                numbers marked since then and the number of change records
+                since then; None if the backend keeps no such log
+        """
+        return None
+
+    @property
+    def recoverable(self):
+        """
+        Whether the backend saves invoice markers for recovery_log().
+
+        Returns:
+            bool: True if crash recovery can check this backend
+        """
+        return False
+
+    @property
+    def version(self):
+        """
+        Stamp that changes whenever the catalog this process sees changes.
+
+        Returns:
+            tuple: Opaque version stamp
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release files and connections. The lock must not be held.
+
+        Returns:
+            None
+        """
+
+
+def _size(filename):
+    """
+    Get the size of a file, treating a missing file as empty.
+
+    Args:
+        filename (str): Name of the file
+
+    Returns:
+        int: Size in bytes
+    """
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+class TextBackend(StorageBackend):
+    """
+    products.txt, shared between processes through an advisory file lock.
+
+    With a journal, changes are appended to it and folded back into the
+    products file once it grows past max_records or max_bytes; without one,
+    every change rewrites the products file. Other processes' changes are
+    found by comparing the products file's identity and the journal length
+    with the ones this process last saw, so when nothing changed catching up
+    costs two stat calls.
+
+    Each compaction is a checkpoint: the products file holds the whole
+    catalog as of its modification time and the journal every change since,
+    so recovering from a crash replays at most max_records records.
+    """
+
+    def __init__(self, filename, journal_file=None, snapshot_file=None, policy=None,
+                 max_records=1000, max_bytes=64 * 1024, lock_file=None):
+        """
+        Describe the files; nothing is read until load().
+
+        Args:
+            filename (str): Name of the products file
+            journal_file (str): Transaction journal, or None to rewrite the
+                products file on every change
+            snapshot_file (str): Binary snapshot refreshed after each compaction, or None
+            policy (DurabilityPolicy): When changes are forced to disk, fsync by default
+            max_records (int): Journal records that trigger compaction
+            max_bytes (int): Journal size in bytes that triggers compaction
+            lock_file (str): Lock shared by every process using the products
+                file, the products file name plus '.lock' by default
+        """
+        self.filename = filename
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.policy = policy or DurabilityPolicy()
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.journal = None
+        self.offset = 0
+        self._stamp = None
+        self._dirty = False
+        self._pending_snapshot = None
+        self._lock = FileLock(lock_file or filename + '.lock')
+
+    def lock(self):
+        self._lock.acquire()
+
+    def unlock(self):
+        self._lock.release()
+        return True
+
+    def _open_journal(self):
+        """
+        Open the journal on first use, dropping a half-written last record.
+        The lock must be held.
+
+        Returns:
+            None
+        """
+        if self.journal_file and self.journal is None:
+            self.journal = Journal(self.journal_file, self.max_records, self.max_bytes, self.policy)
+
+    def load(self):
+        self._open_journal()
+        if self.journal is not None:
+            catalog = load_catalog(self.filename, self.journal_file, self.snapshot_file)
+            self.offset = self.journal.size
+        else:
+            catalog = load_catalog(self.filename)
+        self._stamp = file_signature(self.filename)
+        return catalog
+
+    def catch_up(self, catalog):
+        if file_signature(self.filename) != self._stamp:
+            # Rewritten by another process: start again from the new file
+            if self.journal is not None:
+                self.journal.reopen()
+            return self.load()
+        if self.journal is None:
+            return catalog
+        size = _size(self.journal_file)
+        if size == self.offset:
+            return catalog
+        if size < self.offset:
+            self.journal.reopen()
+            return self.load()
+        replay_journal(catalog, self.journal_file, self.offset)
+        # Replayed records are already saved; they count towards compaction
+        self.journal.count(catalog.take_changes())
+        self.journal.size = size
+        self.offset = size
+        return catalog
+
+    def get(self, name):
+        # The text file has no index, so this reads the whole catalog
+        product = load_catalog(self.filename, self.journal_file, self.snapshot_file).get(name)
+        return dict(product) if product is not None else None
+
+    def apply_changes(self, changes):
+        if not changes:
+            return True
+        if self.journal is None:
+            # Saved by the full rewrite in snapshot()
+            self._dirty = True
+            return True
+        if not self.journal.write(changes):
+            return False
+        self.offset = self.journal.size
+        return True
+
+    def needs_snapshot(self):
+        if self.journal is None:
+            return self._dirty
+        return self.journal.needs_compaction()
+
+    def snapshot(self, products):
+        self._open_journal()
+        if self.journal is None:
+            saved = update_product_file(products, self.filename, fsync=self.policy.mode != 'buffered')
+        else:
+            saved = self.journal.compact(products, self.filename)
+        if saved:
+            self._dirty = False
+            self._stamp = file_signature(self.filename)
+            self.offset = 0
+            if self.journal is not None and self.snapshot_file:
+                # Only copied under the lock; sync() writes it once other
+                # tills can go on. It names the products file it matches, so
+                # a snapshot written after a newer compaction is not used.
+                self._pending_snapshot = (snapshot_columns(products), self._stamp)
+        return saved
+
+    def _write_snapshot(self):
+        """
+        Write the snapshot copied by the last compaction, if any. The lock
+        need not be held.
+
+        Returns:
+            None
+        """
+        if self._pending_snapshot is not None:
+            columns, source = self._pending_snapshot
+            self._pending_snapshot = None
+            write_columns(columns, self.snapshot_file, source)
+
+    def sync(self):
+        if self.journal is None:
+            return True
+        saved = self.journal.commit()
+        self._write_snapshot()
+        return saved
+
+    def recovery_log(self):
+        if self.journal is None:
+            return None
+        try:
+            checkpoint = os.path.getmtime(self.filename)
+        except OSError:
+            checkpoint = 0.0
+        records = read_journal(self.journal_file)
+        return checkpoint, {record[1] for record in records if record[0] == 'I'}, len(records)
+
+    @property
+    def recoverable(self):
+        # Without a journal every save rewrites the file and keeps no markers
+        return self.journal_file is not None
+
+    @property
+    def version(self):
+        return (self._stamp, self.offset)
+
+    def close(self):
+        self._write_snapshot()
+        if self.journal is not None:
+            self.journal.close()
+        self._lock.close()
+
+
+# One row per product. Removed products are kept as tombstones so other
+# processes catching up by version can see that they were removed.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    cost_price INTEGER NOT NULL,
+    origin TEXT NOT NULL,
+    supplier TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS products_version ON products (version);
+CREATE TABLE IF NOT EXISTS invoice_marks (
+    number TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    time REAL NOT NULL
+);
+"""
+
+_COLUMNS = "name, brand, quantity, cost_price, origin, supplier"
+
+_UPSERT = (
+    "INSERT INTO products (key, " + _COLUMNS + ", version, deleted) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0) "
+    "ON CONFLICT (key) DO UPDATE SET name = excluded.name, brand = excluded.brand, "
+    "quantity = excluded.quantity, cost_price = excluded.cost_price, origin = excluded.origin, "
+    "supplier = excluded.supplier, version = excluded.version, deleted = 0"
+)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The catalog in an SQLite database, shared between processes by SQLite's
+    own locking.
+
+    The database runs in WAL mode, so readers never wait for a till that is
+    saving a sale. Products are looked up by their case-folded name through
+    a unique index, and each change record is one single-row statement, so
+    the cost of a sale does not depend on the size of the catalog. Every
+    transaction stamps the rows it changes with a new version number; other
+    processes catch up by reading only the rows with a newer version.
+
+    Invoice markers go into the invoice_marks table in the same transaction
+    as the stock they cover. Once it holds max_records of them it is emptied
+    and the checkpoint time moved on, so crash recovery only looks at the
+    invoices since then.
+    """
+
+    def __init__(self, database_file, policy=None, max_records=1000):
+        """
+        Open (and if needed create) the database.
+
+        Args:
+            database_file (str): Name of the database file
+            policy (DurabilityPolicy): 'fsync' syncs the WAL on every commit;
+                'group' and 'buffered' leave it to SQLite's checkpoints, which
+                can lose the last transactions on power loss but never corrupt
+                the database
+            max_records (int): Invoice markers that trigger a checkpoint
+        """
+        self.database_file = database_file
+        self.policy = policy or DurabilityPolicy()
+        # Transactions are started and ended explicitly
+        self._connection = sqlite3.connect(database_file, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = " + ("FULL" if self.policy.mode == 'fsync' else "NORMAL"))
+        self._connection.executescript(_SCHEMA)
+        # Invoices from before the first start are not tracked
+        self._connection.execute("INSERT OR IGNORE INTO checkpoint (id, time) VALUES (1, ?)", (time.time(),))
+        self.max_records = max_records
+        self._seen = 0
+        self._data_version = None
+        self._failed = False
+
+    def lock(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+        self._failed = False
+
+    def unlock(self):
+        if self._failed:
+            # Never commit half of a transaction
+            self._connection.execute("ROLLBACK")
+            return False
+        try:
+            self._connection.execute("COMMIT")
+            return True
+        except sqlite3.Error as e:
+            print(f"Error saving to database: {e}")
+            self._connection.execute("ROLLBACK")
+            return False
+
+    def rollback(self):
+        self._connection.execute("ROLLBACK")
+
+    def _data_version_now(self):
+        """
+        Get SQLite's counter of commits made by other connections.
+
+        Returns:
+            int: The counter
+        """
+        return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self):
+        catalog = ProductCatalog()
+        try:
+            rows = self._connection.execute(
+                "SELECT " + _COLUMNS + " FROM products WHERE deleted = 0 ORDER BY id").fetchall()
+            self._seen = self._connection.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM products").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error reading database: {e}")
+            return catalog
+        self._data_version = self._data_version_now()
+        if rows:
+            names, brands, quantity, cost_price, origins, suppliers = zip(*rows)
+            catalog.extend_columns(names, brands, array('q', quantity), array('q', cost_price),
+                                   origins, suppliers)
+        return catalog
+
+    def catch_up(self, catalog):
+        data_version = self._data_version_now()
+        if data_version == self._data_version:
+            return catalog
+        rows = self._connection.execute(
+            "SELECT " + _COLUMNS + ", deleted, version FROM products WHERE version > ? "
+            "ORDER BY version, id", (self._seen,)).fetchall()
+        for name, brand, quantity, cost_price, origin, supplier, deleted, version in rows:
+            product = catalog.get(name)
+            if deleted:
+                if product is not None:
+                    catalog.remove(name)
+            elif product is None:
+                catalog.add_row(name, brand, quantity, cost_price, origin, supplier)
+            else:
+                if product['quantity'] != quantity:
+                    product['quantity'] = quantity
+                if product['cost_price'] != cost_price:
+                    product['cost_price'] = cost_price
+                catalog.set_supplier(name, supplier)
+            self._seen = version
+        # Changes read from the database are already saved
+        catalog.take_changes()
+        self._data_version = data_version
+        return catalog
+
+    def get(self, name):
+        row = self._connection.execute(
+            "SELECT " + _COLUMNS + " FROM products WHERE key = ? AND deleted = 0",
+            (normalize_name(name),)).fetchone()
+        if row is None:
+            return None
+        product = dict(zip(('name', 'brand', 'quantity', 'cost_price', 'origin', 'supplier'), row))
+        product['selling_price'] = product['cost_price'] * MARKUP
+        return product
+
+    def _next_version(self):
+        """
+        Version number for the rows changed by this transaction. The lock must be held.
+
+        Returns:
+            int: One more than the newest version in the database
+        """
+        return self._connection.execute(
+            "SELECT COALESCE(MAX(version), 0) + 1 FROM products").fetchone()[0]
+
+    @metrics.timed('sqlite_apply_changes')
+    def apply_changes(self, changes):
+        if not changes:
+            return True
+        execute = self._connection.execute
+        marked = False
+        try:
+            version = self._next_version()
+            for change in changes:
+                kind = change[0]
+                if kind == 'Q':
+                    execute("UPDATE products SET quantity = ?, version = ? WHERE key = ?",
+                            (change[2], version, normalize_name(change[1])))
+                elif kind == 'A':
+                    supplier = change[6] if len(change) > 6 else ''
+                    execute(_UPSERT, (normalize_name(change[1]),) + tuple(change[1:6]) + (supplier, version))
+                elif kind == 'S':
+                    execute("UPDATE products SET supplier = ?, version = ? WHERE key = ?",
+                            (change[2], version, normalize_name(change[1])))
+                elif kind == 'D':
+                    execute("UPDATE products SET deleted = 1, version = ? WHERE key = ?",
+                            (version, normalize_name(change[1])))
+                elif kind == 'I':
+                    execute("INSERT OR IGNORE INTO invoice_marks (number) VALUES (?)", (change[1],))
+                    marked = True
+            if marked and execute("SELECT COUNT(*) FROM invoice_marks").fetchone()[0] >= self.max_records:
+                execute("DELETE FROM invoice_marks")
+                execute("UPDATE checkpoint SET time = ? WHERE id = 1", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"Error saving to database: {e}")
+            self._failed = True
+            return False
+        self._seen = version
+        return True
+
+    def snapshot(self, products):
+        execute = self._connection.execute
+        try:
+            version = self._next_version()
+            # Mark everything removed, then bring back what is in the catalog
+            execute("UPDATE products SET deleted = 1, version = ? WHERE deleted = 0", (version,))
+            self._connection.executemany(_UPSERT, (
+                (normalize_name(product['name']), product['name'], product['brand'],
+                 product['quantity'], product['cost_price'], product['origin'],
+                 product.get('supplier') or '', version)
+                for product in products))
+        except sqlite3.Error as e:
+            print(f"Error saving to database: {e}")
+            self._failed = True
+            return False
+        self._seen = version
+        return True
+
+    def recovery_log(self):
+        execute = self._connection.execute
+        try:
+            checkpoint = execute("SELECT time FROM checkpoint WHERE id = 1").fetchone()[0]
+            marks = {number for number, in execute("SELECT number FROM invoice_marks")}
+        except sqlite3.Error as e:
+            print(f"Error reading database: {e}")
+            return None
+        return checkpoint, marks, len(marks)
+
+    @property
+    def recoverable(self):
+        return True
+
+    @property
+    def version(self):
+        return (self.database_file, self._seen)
+
+    def close(self):
+        self._connection.close()
+
+
+class RecordBackend(StorageBackend):
+    """
+    A fixed-width record file, shared between processes through an advisory
+    file lock.
+
+    The backend keeps the record number of every product, so a sale or
+    restock overwrites the quantity field of one record in place, a removal
+    marks one record and a new product is one append. Values too wide
+    for their field, and nothing else, make the next save rewrite the file.
+
+    Other processes notice a change by the transaction counter in the header
+    and reload the file, so this layout suits one till or the HTTP service
+    rather than many tills saving at once. A crash can leave a transaction
+    partly saved, but never a record half written.
+
+    Invoice markers are appended as marker records, before the stock changes
+    of their transaction. Once the file holds max_records of them it is
+    rewritten without them, which records a new checkpoint time.
+    """
+
+    def __init__(self, filename, policy=None, lock_file=None, max_records=1000):
+        """
+        Describe the file; nothing is read until load().
+
+        Args:
+            filename (str): Name of the record file
+            policy (DurabilityPolicy): When changes are forced to disk, fsync by default
+            lock_file (str): Lock shared by every process using the file, the
+                file name plus '.lock' by default
+            max_records (int): Invoice markers that trigger a rewrite
+        """
+        self.filename = filename
+        self.policy = policy or DurabilityPolicy()
+        self.max_records = max_records
+        self.records = None
+        self._marks = 0
+        self._rows = {}
+        self._seen = 0
+        self._rewrite = False
+        self._uncommitted = False
+        self._lock = FileLock(lock_file or filename + '.lock')
+
+    def lock(self):
+        self._lock.acquire()
+
+    def unlock(self):
+        self._lock.release()
+        return True
+
+    def _close_records(self):
+        """
+        Flush outstanding group commits and unmap the file.
+
+        Returns:
+            None
+        """
+        if self.records is not None:
+            if self._uncommitted:
+                self.policy.sync(self.records)
+                self._uncommitted = False
+            self.records.close()
+            self.records = None
+
+    def load(self):
+        self._close_records()
+        catalog = ProductCatalog()
+        try:
+            self.records = RecordFile(self.filename)
+        except FileNotFoundError:
+            print(f"Error: File '{self.filename}' not found.")
+            return catalog
+        except (OSError, ValueError) as e:
+            print(f"Error reading file: {e}")
+            return catalog
+        self._rows = {}
+        self._marks = 0
+        columns = ([], [], array('q'), array('q'), [], [])
+        for row, record in enumerate(self.records.records()):
+            if record[6] != PRODUCT:
+                self._marks += record[6] == MARKER
+                continue
+            self._rows[normalize_name(record[0])] = row
+            for column, value in zip(columns, record):
+                column.append(value)
+        catalog.extend_columns(*columns)
+        self._seen = self.records.changes
+        self._rewrite = False
+        return catalog
+
+    def catch_up(self, catalog):
+        if self.records is None:
+            return self.load()
+        try:
+            inode = os.stat(self.filename).st_ino
+        except OSError:
+            inode = None
+        if inode != self.records.inode or self.records.changes != self._seen:
+            # Saved by another process: read the file again
+            return self.load()
+        return catalog
+
+    def get(self, name):
+        if self.records is None:
+            self.load()
+        row = self._rows.get(normalize_name(name))
+        if row is None:
+            return None
+        product = dict(zip(('name', 'brand', 'quantity', 'cost_price', 'origin', 'supplier'),
+                           self.records.read(row)))
+        product['selling_price'] = product['cost_price'] * MARKUP
+        return product
+
+    @metrics.timed('records_apply_changes')
+    def apply_changes(self, changes):
+        if not changes or self._rewrite:
+            return True
+        if self.records is None:
+            # Nothing to update in place; snapshot() writes the file
+            self._rewrite = True
+            return True
+        records = self.records
+        written = 0
+        # Markers first: a crash part way then reports the invoice as
+        # missing rather than leaving a stock change nobody can find
+        changes = sorted(changes, key=lambda change: change[0] != 'I')
+        try:
+            for change in changes:
+                kind = change[0]
+                if kind == 'I':
+                    if records.mark(change[1]) is None:
+                        self._rewrite = True
+                        break
+                    self._marks += 1
+                    written += records.record_length
+                    continue
+                key = normalize_name(change[1])
+                if kind == 'A':
+                    supplier = change[6] if len(change) > 6 else ''
+                    row = records.append(tuple(change[1:6]) + (supplier,))
+                    if row is None:
+                        self._rewrite = True
+                        break
+                    self._rows[key] = row
+                    written += records.record_length
+                    continue
+                row = self._rows.get(key)
+                if row is None:
+                    continue
+                if kind == 'D':
+                    records.remove(row)
+                    del self._rows[key]
+                    written += 1
+                    continue
+                field, value = ('quantity', change[2]) if kind == 'Q' else ('supplier', change[2])
+                if not records.fits(field, value):
+                    self._rewrite = True
+                    break
+                written += records.set(row, field, value)
+            if self._marks >= self.max_records:
+                self._rewrite = True
+            self._seen += 1
+            records.set_changes(self._seen)
+        except (OSError, ValueError) as e:
+            print(f"Error writing record file: {e}")
+            return False
+        metrics.count('written_bytes', written)
+        self._uncommitted = True
+        return True
+
+    def needs_snapshot(self):
+        return self._rewrite
+
+    def snapshot(self, products):
+        self._close_records()
+        if not write_records(products, self.filename, self._seen + 1,
+                             fsync=self.policy.mode != 'buffered'):
+            return False
+        try:
+            self.records = RecordFile(self.filename)
+        except (OSError, ValueError) as e:
+            print(f"Error reading file: {e}")
+            return False
+        self._rows = {normalize_name(product['name']): row for row, product in enumerate(products)}
+        self._seen = self.records.changes
+        self._marks = 0
+        self._rewrite = False
+        return True
+
+    def sync(self):
+        if not self._uncommitted or self.records is None:
+            return True
+        self._uncommitted = False
+        try:
+            self.policy.committed(self.records)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Error writing record file: {e}")
+            return False
+
+    def recovery_log(self):
+        if self.records is None:
+            return None
+        try:
+            checkpoint, marks = self.records.marks()
+            if checkpoint is None:
+                # Written before files kept a checkpoint record
+                checkpoint = os.path.getmtime(self.filename)
+        except (OSError, ValueError) as e:
+            print(f"Error reading record file: {e}")
+            return None
+        return checkpoint, set(marks), len(marks)
+
+    @property
+    def recoverable(self):
+        return True
+
+    @property
+    def version(self):
+        return (self.records.inode if self.records is not None else None, self._seen)
+
+    def close(self):
+        self._close_records()
+        self._lock.close()
+
+
+def open_backend(filename, journal_file=None, policy=None):
+    """
+    Open the backend that suits a file, chosen by its extension.
+
+    Args:
+        filename (str): .db for SQLite, .rec for a record file, anything else
+            for a text products file
+        journal_file (str): Journal of a text products file, or None
+        policy (DurabilityPolicy): When changes are forced to disk
+
+    Returns:
+        StorageBackend: The backend
+    """
+    extension = os.path.splitext(filename)[1]
+    if extension == '.db':
+        return SQLiteBackend(filename, policy)
+    if extension == '.rec':
+        return RecordBackend(filename, policy)
+    return TextBackend(filename, journal_file, policy=policy)
+
+
+def migrate(source, target):
+    """
+    Copy the whole catalog from one backend to another.
+
+    Args:
+        source (StorageBackend): Backend to read
+        target (StorageBackend): Backend to replace the contents of
+
+    Returns:
+        int: Number of products copied, or -1 if the copy failed
+    """
+    source.lock()
+    try:
+        catalog = source.load()
+    finally:
+        source.unlock()
+    if not catalog:
+        return -1
+    saved = False
+    target.lock()
+    try:
+        saved = target.snapshot(catalog)
+    finally:
+        saved = target.unlock() and saved
+    # A text target may still need its journal flushed
+    saved = target.sync() and saved
+    return len(catalog) if saved else -1
+
+
+def main(argv):
+    """
+    Convert the catalog between the text and SQLite backends.
+
+    Args:
+        argv (list): Command line arguments without the program name
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(prog='storage.py', description="Convert between storage backends")
+    parser.add_argument('command', choices=('to-sqlite', 'to-records', 'to-text'))
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--journal', help="journal of the products file, replayed when reading "
+                                          "it and removed when writing it")
+    args = parser.parse_args(argv)
+
+    source = open_backend(args.source, args.journal)
+    if args.command == 'to-sqlite':
+        target = SQLiteBackend(args.target)
+    elif args.command == 'to-records':
+        target = RecordBackend(args.target)
+    else:
+        target = TextBackend(args.target, args.journal)
+    try:
+        copied = migrate(source, target)
+    finally:
+        source.close()
+        target.close()
+    if copied < 0:
+        print(f"Error: Could not convert '{args.source}' to '{args.target}'.")
+        return 1
+    print(f"Converted {copied} products from '{args.source}' to '{args.target}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,251 @@
+"""
+Store Module
+Shares one catalog between several running copies of the system.
+
+Every change runs as a short transaction under the storage backend's lock
+(storage.py):
+
+    1. take the lock
+    2. catch up with what other processes saved: for products.txt another
+       till's journal records are replayed or a compacted file is reloaded,
+       for SQLite the rows with a newer version are read
+    3. run the operation, which checks stock against the up-to-date catalog
+    4. save the changes and release the lock
+    5. force the changes to disk as the durability policy requires
+
+Only steps 2 to 4 hold the lock, and when nothing changed step 2 costs a
+couple of system calls, so the lock is held for microseconds and the slow
+fsync happens outside it.
+"""
+
+from contextlib import contextmanager
+
+
+class CatalogStore:
+    """
+    A catalog kept in a storage backend, shared safely between processes.
+
+    Use transaction() (or begin() and commit() or rollback()) around every change. The
+    catalog object may be replaced when another process rewrites the
+    products file, so always use the one returned by the store.
+    """
+
+    def __init__(self, backend, pricing=None, reorder=None):
+        """
+        Describe a store; call open() to load it.
+
+        Args:
+            backend (StorageBackend): Where the catalog is kept, e.g.
+                storage.TextBackend or storage.SQLiteBackend
+            pricing (PricingEngine): Prices the catalog, or None for MARKUP
+                and buy 3 get 1 free
+            reorder (ReorderEngine): Follows the catalog's stock, or None
+        """
+        self.backend = backend
+        self.pricing = pricing
+        self.reorder = reorder
+        self.catalog = None
+
+    @property
+    def version(self):
+        """
+        Version stamp of the data this process has seen.
+
+        Returns:
+            tuple: The backend's version stamp, then the pricing rules' version
+        """
+        return self.backend.version + (self.pricing.version if self.pricing is not None else None,)
+
+    def _price(self):
+        """
+        Price a newly loaded catalog, or reprice it if the rules file changed.
+
+        Returns:
+            None
+        """
+        if self.pricing is None:
+            return
+        self.pricing.refresh()
+        if self.catalog._pricing is not self.pricing or self.catalog._pricing_version != self.pricing.version:
+            self.catalog.set_pricing(self.pricing)
+
+    def _follow(self):
+        """
+        Point the reorder engine at the catalog, e.g. after it was reloaded,
+        so it keeps following every stock change.
+
+        Returns:
+            None
+        """
+        if self.reorder is not None:
+            self.reorder.attach(self.catalog)
+
+    def open(self):
+        """
+        Load the catalog.
+
+        Returns:
+            ProductCatalog: The loaded catalog, empty if it could not be read
+        """
+        self.backend.lock()
+        try:
+            self.catalog = self.backend.load()
+            self._price()
+            self._follow()
+        finally:
+            self.backend.unlock()
+        return self.catalog
+
+    def refresh(self):
+        """
+        Bring the catalog up to date with changes saved by other processes.
+
+        Returns:
+            ProductCatalog: The current catalog
+        """
+        self.backend.lock()
+        try:
+            self.catalog = self.backend.catch_up(self.catalog)
+            self._price()
+            self._follow()
+        finally:
+            self.backend.unlock()
+        return self.catalog
+
+    def begin(self):
+        """
+        Start a transaction: take the lock and catch up with other processes.
+
+        Every begin() must be followed by commit() or rollback().
+
+        Returns:
+            ProductCatalog: The up-to-date catalog to change
+        """
+        self.backend.lock()
+        try:
+            self.catalog = self.backend.catch_up(self.catalog)
+            self._price()
+            self._follow()
+        except BaseException:
+            self.backend.unlock()
+            raise
+        return self.catalog
+
+    def save(self):
+        """
+        Write the catalog's changes so far without ending the transaction.
+
+        Returns:
+            bool: True if the changes were saved, False otherwise
+        """
+        changes = self.catalog.take_changes()
+        if not self.backend.apply_changes(changes):
+            return False
+        if self.backend.needs_snapshot():
+            return self.backend.snapshot(self.catalog)
+        return True
+
+    def commit(self, sync=True):
+        """
+        Save the changes, release the lock and force the changes to disk.
+
+        Args:
+            sync (bool): Force the changes to disk before returning; if False
+                the caller must call sync() before starting the next transaction
+
+        Returns:
+            bool: True if the changes were saved, False otherwise
+        """
+        saved = False
+        try:
+            saved = self.save()
+        finally:
+            saved = self.backend.unlock() and saved
+        # Other processes can already read the changes; only the wait for
+        # the disk happens outside the lock
+        if sync:
+            saved = self.sync() and saved
+        return saved
+
+    def sync(self):
+        """
+        Force the changes of the last commit to disk as the durability
+        policy requires.
+
+        Returns:
+            bool: True if the changes are committed, False otherwise
+        """
+        return self.backend.sync()
+
+    def rollback(self):
+        """
+        Abandon a transaction: forget its changes, reload the catalog as saved
+        and release the lock.
+
+        Returns:
+            ProductCatalog: The catalog as saved
+        """
+        try:
+            self._reload()
+        finally:
+            self.backend.rollback()
+        return self.catalog
+
+    def revert(self):
+        """
+        Reload the catalog as saved after a commit that failed, so it no
+        longer shows changes that never reached the backend.
+
+        Returns:
+            ProductCatalog: The catalog as saved
+        """
+        self.backend.lock()
+        try:
+            self._reload()
+        finally:
+            self.backend.unlock()
+        return self.catalog
+
+    def _reload(self):
+        """
+        Forget unsaved changes and load the catalog again. The lock must be held.
+
+        Returns:
+            None
+        """
+        self.catalog.take_changes()
+        self.catalog = self.backend.load()
+        self._price()
+        self._follow()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a change as a transaction; the changes are saved when the block
+        ends, or abandoned if it raises.
+
+        Yields:
+            ProductCatalog: The up-to-date catalog to change
+
+        Raises:
+            OSError: If the changes could not be saved; the catalog is
+                reloaded as saved first
+        """
+        catalog = self.begin()
+        try:
+            yield catalog
+        except BaseException:
+            self.rollback()
+            raise
+        if not self.commit():
+            self.revert()
+            raise OSError("The catalog changes were not saved.")
+
+    def close(self):
+        """
+        Flush outstanding group commits and close the backend's files.
+
+        Returns:
+            None
+        """
+        self.backend.close()
@@ -0,0 +1,70 @@
+"""
+Shared fixtures. The modules live at the top of the repository, so it is put
+on the import path here; run the tests from the repository root with
+python -m pytest.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import invoice_ids  # noqa: E402
+import invoice_writer  # noqa: E402
+from storage import TextBackend  # noqa: E402
+from store import CatalogStore  # noqa: E402
+from write import DurabilityPolicy  # noqa: E402
+
+PRODUCTS = ("Vitamin C Serum, Garnier, 200, 1000, France\n"
+            "Skin Cleanser, Cetaphil, 100, 280, Switzerland\n")
+
+
+@pytest.fixture
+def products_file(tmp_path):
+    """A products.txt with two products, in a temporary directory."""
+    path = tmp_path / 'products.txt'
+    path.write_text(PRODUCTS)
+    return str(path)
+
+
+@pytest.fixture
+def open_store(products_file):
+    """Open journaled stores on products_file; every store opened is closed afterwards."""
+    stores = []
+
+    def open_store(max_records=1000):
+        backend = TextBackend(products_file, products_file + '.journal',
+                              policy=DurabilityPolicy('buffered'), max_records=max_records)
+        store = CatalogStore(backend)
+        store.open()
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+class ListSink:
+    """Invoice sink that keeps the numbers of the invoices it is given."""
+
+    def __init__(self):
+        self.saved = []
+
+    def save(self, kind, invoice_number, text):
+        self.saved.append(invoice_number)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    """Shared invoice writer saving to a ListSink, numbering from a temporary counter."""
+    monkeypatch.setattr(invoice_ids, '_service', invoice_ids.InvoiceIdService(str(tmp_path / 'invoice_counter.txt')))
+    shared = invoice_writer.InvoiceWriter(ListSink())
+    monkeypatch.setattr(invoice_writer, '_writer', shared)
+    yield shared
+    shared.close()
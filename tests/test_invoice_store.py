@@ -0,0 +1,40 @@
+"""Tests for the invoice archive shared between tills (invoice_store.py)."""
+
+import os
+
+from invoice_store import INDEX_FILE, InvoiceStore
+
+
+def test_invoice_saved_by_another_till_is_found(tmp_path):
+    directory = str(tmp_path / 'archive')
+    till, other = InvoiceStore(directory), InvoiceStore(directory)
+    try:
+        till.save('sales', "20261017-000001", "first invoice")
+        other.save('purchase', "20261017-000002", "second invoice")
+
+        assert till.get("20261017-000002") == "second invoice"
+        assert till.kind_of("20261017-000002") == 'purchase'
+        assert "20261017-000001" in other
+        assert till.get("20261017-000003") is None
+    finally:
+        till.close()
+        other.close()
+
+
+def test_half_written_index_line_is_read_once_complete(tmp_path):
+    directory = str(tmp_path / 'archive')
+    till = InvoiceStore(directory)
+    try:
+        till.save('sales', "20261017-000001", "first invoice")
+        with open(os.path.join(directory, '20261017.seg'), 'ab') as segment:
+            segment.write(b"second invoice")
+        index = os.path.join(directory, INDEX_FILE)
+        with open(index, 'a') as file:
+            file.write("20261017-000002,sales,20261017.seg,13,1")
+        assert "20261017-000002" not in till
+
+        with open(index, 'a') as file:
+            file.write("4\n")
+        assert till.get("20261017-000002") == "second invoice"
+    finally:
+        till.close()
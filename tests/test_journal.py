@@ -0,0 +1,66 @@
+"""Tests for the transaction journal (write.Journal) and its replay by other processes."""
+
+import os
+
+from read import load_catalog, read_journal
+from write import DurabilityPolicy, Journal
+
+
+def _journal(path, max_records=1000, max_bytes=64 * 1024):
+    return Journal(str(path), max_records, max_bytes, DurabilityPolicy('buffered'))
+
+
+def test_records_are_read_back_in_order(tmp_path):
+    journal = _journal(tmp_path / 'j')
+    assert journal.append([('Q', "Skin Cleanser", 90), ('S', "Skin Cleanser", "Glow Ltd")])
+    assert journal.append([('D', "Vitamin C Serum")])
+    journal.close()
+
+    assert read_journal(str(tmp_path / 'j')) == [
+        ('Q', "Skin Cleanser", 90), ('S', "Skin Cleanser", "Glow Ltd"), ('D', "Vitamin C Serum")]
+
+
+def test_partial_last_record_is_dropped_on_open(tmp_path):
+    path = tmp_path / 'j'
+    path.write_bytes(b"Q,Skin Cleanser,90\nQ,Skin Cle")
+
+    journal = _journal(path)
+
+    assert journal.record_count == 1
+    assert path.read_bytes() == b"Q,Skin Cleanser,90\n"
+
+
+def test_invoice_markers_do_not_count_towards_compaction(tmp_path):
+    journal = _journal(tmp_path / 'j', max_records=3, max_bytes=40)
+    for number in range(2):
+        journal.append([('Q', "Serum", number), ('I', "20261017-00000%d" % number)])
+    assert not journal.needs_compaction()
+    journal.close()
+
+    # Measured again from the file, as another process would
+    journal = _journal(tmp_path / 'j', max_records=3, max_bytes=40)
+    assert journal.record_count == 2
+    assert not journal.needs_compaction()
+    journal.append([('Q', "Serum", 5)])
+    assert journal.needs_compaction()
+
+
+def test_compaction_folds_the_journal_into_the_products_file(open_store, products_file):
+    store = open_store(max_records=2)
+    for _ in range(2):
+        with store.transaction() as catalog:
+            catalog.adjust_quantity("Skin Cleanser", -1)
+
+    assert not os.path.exists(products_file + '.journal')
+    assert load_catalog(products_file).get("Skin Cleanser")['quantity'] == 98
+
+
+def test_other_store_catches_up_with_the_journal(open_store):
+    till, other = open_store(), open_store()
+    with till.transaction() as catalog:
+        catalog.adjust_quantity("Skin Cleanser", -3)
+
+    assert other.refresh().get("Skin Cleanser")['quantity'] == 97
+    with other.transaction() as catalog:
+        catalog.adjust_quantity("Skin Cleanser", -1)
+    assert till.refresh().get("Skin Cleanser")['quantity'] == 96
@@ -0,0 +1,67 @@
+"""Tests for the ledger's running totals when several tills append (ledger.py)."""
+
+import builtins
+import os
+
+import ledger
+from ledger import Ledger
+
+
+def _line(number, product, quantity, party="Asha"):
+    return (number, "2026-10-17 10:00:00", 'sale', party, product, quantity, 0, 100.0 * quantity, 13.0 * quantity)
+
+
+def _units(book, product):
+    totals = book.totals('sale', 'product', product)
+    return totals['units'] if totals else 0
+
+
+def test_each_till_sees_the_others_lines(tmp_path):
+    path = str(tmp_path / 'ledger.csv')
+    till, other = Ledger(path), Ledger(path)
+    till.record([_line("1", "Serum", 2)])
+    other.record([_line("2", "Serum", 3), _line("2", "Cleanser", 1)])
+    till.record([_line("3", "Cleanser", 4)])
+
+    for book in (till, other, Ledger(path)):
+        assert _units(book, "Serum") == 5
+        assert _units(book, "Cleanser") == 5
+        assert book.totals('sale', 'customer', "Asha")['lines'] == 4
+
+
+def test_line_appended_while_recording_is_counted_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ledger.csv')
+    till, other = Ledger(path), Ledger(path)
+    till.record([_line("1", "Serum", 1)])
+
+    # Another till appends between our open() and our write
+    real_open = builtins.open
+    appending = []
+
+    def open_then_race(file, mode='r', *args, **kwargs):
+        handle = real_open(file, mode, *args, **kwargs)
+        if 'a' in mode and not appending:
+            appending.append(True)
+            other.record([_line("2", "Cleanser", 7, party="Bo")])
+        return handle
+
+    monkeypatch.setattr(ledger, 'open', open_then_race, raising=False)
+    till.record([_line("3", "Serum", 2)])
+    monkeypatch.undo()
+
+    assert appending
+    assert till.offset == os.path.getsize(path)
+    assert _units(till, "Serum") == 3
+    assert _units(till, "Cleanser") == 7
+    assert till.totals('sale', 'day', "2026-10-17") == Ledger(path, str(tmp_path / 'fresh.json')).totals(
+        'sale', 'day', "2026-10-17")
+
+
+def test_saved_totals_resume_from_their_offset(tmp_path):
+    path = str(tmp_path / 'ledger.csv')
+    book = Ledger(path)
+    book.record([_line("1", "Serum", 2)])
+    book.close()
+    Ledger(path, str(tmp_path / 'other.json')).record([_line("2", "Serum", 1)])
+
+    assert _units(Ledger(path), "Serum") == 3
@@ -0,0 +1,50 @@
+"""Tests for checking pricing rules (pricing.py)."""
+
+import json
+
+import pytest
+
+from pricing import PricingEngine, Promotion
+
+
+@pytest.mark.parametrize('fields', [
+    {'buy': 2.5, 'get': 1},
+    {'buy': 3, 'get': True},
+    {'buy': "3", 'get': 1},
+    {'buy': -3, 'get': 1, 'percent_off': 10},
+    {'percent_off': True},
+    {'percent_off': 10, 'start': "2026-13-01"},
+    {'percent_off': 10, 'end': "next week"},
+    {'percent_off': 10, 'start': 20261101},
+    {'percent_off': 10, 'start': "2026-11-08", 'end': "2026-11-01"},
+])
+def test_invalid_promotion_is_rejected(fields):
+    with pytest.raises(ValueError):
+        Promotion("Bad", **fields)
+
+
+def test_valid_promotion_keeps_its_days():
+    promotion = Promotion("Garnier Week", percent_off=10, brand="Garnier", start="2026-11-01", end="2026-11-07")
+
+    assert promotion.runs_on("2026-11-07")
+    assert not promotion.runs_on("2026-11-08")
+    assert Promotion("Buy 3 Get 1 Free", buy=3, get=1).free_items(7) == 2
+
+
+def test_rules_file_with_a_fractional_buy_is_refused(tmp_path):
+    path = tmp_path / 'pricing.json'
+    path.write_text(json.dumps({'promotions': [{'name': "Half", 'buy': 2.5, 'get': 1}]}))
+
+    with pytest.raises(ValueError, match="whole number"):
+        PricingEngine.load(str(path))
+
+
+def test_invalid_rules_keep_the_current_prices(tmp_path):
+    path = tmp_path / 'pricing.json'
+    path.write_text(json.dumps({'markup': 3}))
+    engine = PricingEngine.load(str(path))
+    path.write_text(json.dumps({'markup': 3, 'promotions': [{'name': "Typo", 'percent_off': 5,
+                                                              'start': "2026-13-01"}]}))
+
+    assert not engine.refresh()
+    assert engine.markup == 3
@@ -0,0 +1,78 @@
+"""Tests for the record file backend's invoice markers (storage.RecordBackend)."""
+
+import recovery
+from storage import RecordBackend
+from store import CatalogStore
+from write import DurabilityPolicy
+
+
+def _open(tmp_path, max_records=1000):
+    store = CatalogStore(RecordBackend(str(tmp_path / 'products.rec'), DurabilityPolicy('buffered'),
+                                       max_records=max_records))
+    store.open()
+    return store
+
+
+def _sell(store, number):
+    with store.transaction() as catalog:
+        catalog.adjust_quantity("Skin Cleanser", -1)
+        catalog.record_invoice(number)
+
+
+def _create(tmp_path):
+    store = _open(tmp_path)
+    with store.transaction() as catalog:
+        catalog.add_row("Skin Cleanser", "Cetaphil", 100, 280, "Switzerland", "Glow Ltd")
+    store.close()
+
+
+def test_markers_are_kept_but_are_not_products(tmp_path):
+    _create(tmp_path)
+    store = _open(tmp_path)
+    _sell(store, "20261017-000001")
+    _sell(store, "20261017-000002")
+    store.close()
+
+    store = _open(tmp_path)
+    assert len(store.catalog) == 1
+    assert store.catalog.get("Skin Cleanser")['quantity'] == 98
+    store.backend.lock()
+    try:
+        checkpoint, marks, records = store.backend.recovery_log()
+    finally:
+        store.backend.unlock()
+    assert marks == {"20261017-000001", "20261017-000002"}
+    assert checkpoint > 0
+    store.close()
+
+
+def test_rewrite_after_max_records_markers_is_a_checkpoint(tmp_path):
+    _create(tmp_path)
+    store = _open(tmp_path, max_records=2)
+    store.backend.lock()
+    first = store.backend.recovery_log()[0]
+    store.backend.unlock()
+    _sell(store, "20261017-000001")
+    _sell(store, "20261017-000002")
+    _sell(store, "20261017-000003")
+
+    store.backend.lock()
+    checkpoint, marks, records = store.backend.recovery_log()
+    store.backend.unlock()
+    assert marks == {"20261017-000003"}
+    assert checkpoint >= first
+    assert _open(tmp_path).catalog.get("Skin Cleanser")['quantity'] == 97
+    store.close()
+
+
+def test_recover_finds_a_marked_invoice_that_was_never_written(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _create(tmp_path)
+    store = _open(tmp_path)
+    _sell(store, "20261017-000009")
+
+    missing, unrecorded = recovery.recover(store)
+
+    assert missing == ["20261017-000009"]
+    assert unrecorded == {}
+    store.close()
@@ -0,0 +1,37 @@
+"""Tests for reordering low stock (reorder.py)."""
+
+import pytest
+
+from reorder import ReorderEngine, reorder_low_stock
+
+
+def _run_low(store):
+    with store.transaction() as catalog:
+        catalog.adjust_quantity("Skin Cleanser", -95)
+        catalog.set_supplier("Skin Cleanser", "Glow Ltd")
+
+
+def test_reorder_queues_the_invoice_after_saving(open_store, writer):
+    store = open_store()
+    _run_low(store)
+
+    ordered, unknown = reorder_low_stock(store, ReorderEngine(10, 50))
+
+    assert ordered == {"Glow Ltd": 45}
+    assert unknown == []
+    writer.close()
+    assert len(writer.sink.saved) == 1
+    assert open_store().catalog.get("Skin Cleanser")['quantity'] == 50
+
+
+def test_reorder_that_was_not_saved_queues_no_invoice(open_store, writer, monkeypatch):
+    store = open_store()
+    _run_low(store)
+    monkeypatch.setattr(store.backend, 'apply_changes', lambda changes: False)
+
+    with pytest.raises(OSError):
+        reorder_low_stock(store, ReorderEngine(10, 50))
+
+    writer.close()
+    assert writer.sink.saved == []
+    assert store.catalog.get("Skin Cleanser")['quantity'] == 5
@@ -0,0 +1,42 @@
+"""Tests for group commits in the HTTP service (service.py)."""
+
+from service import CatalogService
+
+
+def _sell(name, quantity):
+    return ('sell', {'name': name, 'quantity': quantity, 'customer': "Asha"}, None)
+
+
+def test_group_rolls_back_only_the_request_that_raised(open_store, writer):
+    store = open_store()
+    service = CatalogService(store)
+    apply = service._apply
+
+    def failing_apply(catalog, op, record, held):
+        if record['name'] == "Broken":
+            raise RuntimeError("request failed")
+        return apply(catalog, op, record, held)
+
+    service._apply = failing_apply
+    results, invoices, saved = service._apply_group(
+        [_sell("Skin Cleanser", 2), _sell("Broken", 1), _sell("Vitamin C Serum", 1)])
+
+    assert [status for status, body in results] == [200, 500, 200]
+    assert saved
+    assert len(invoices) == 2
+    catalog = open_store().catalog
+    assert catalog.get("Skin Cleanser")['quantity'] == 98
+    assert catalog.get("Vitamin C Serum")['quantity'] == 199
+
+
+def test_group_that_was_not_saved_has_no_invoices(open_store, writer, monkeypatch):
+    store = open_store()
+    service = CatalogService(store)
+    monkeypatch.setattr(store.backend, 'apply_changes', lambda changes: False)
+
+    results, invoices, saved = service._apply_group([_sell("Skin Cleanser", 2)])
+
+    assert not saved
+    assert invoices == []
+    assert writer._queue.empty()
+    assert store.catalog.get("Skin Cleanser")['quantity'] == 100
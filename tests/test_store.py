@@ -0,0 +1,70 @@
+"""Tests for CatalogStore transactions (store.py)."""
+
+import pytest
+
+from invoice_writer import InvoiceWriter
+
+
+class ListSink:
+    """Invoice sink that keeps what it is given."""
+
+    def __init__(self):
+        self.saved = []
+
+    def save(self, kind, invoice_number, text):
+        self.saved.append(invoice_number)
+
+    def close(self):
+        pass
+
+
+def test_transaction_saves_changes(open_store):
+    store = open_store()
+    with store.transaction() as catalog:
+        catalog.adjust_quantity("Skin Cleanser", -5)
+
+    assert open_store().catalog.get("Skin Cleanser")['quantity'] == 95
+
+
+def test_transaction_that_raises_is_rolled_back(open_store):
+    store = open_store()
+    with pytest.raises(ValueError):
+        with store.transaction() as catalog:
+            catalog.adjust_quantity("Skin Cleanser", -5)
+            raise ValueError("operation failed")
+
+    assert store.catalog.get("Skin Cleanser")['quantity'] == 100
+    assert open_store().catalog.get("Skin Cleanser")['quantity'] == 100
+    # The lock was released: another transaction can run
+    with store.transaction() as catalog:
+        catalog.adjust_quantity("Skin Cleanser", -1)
+    assert open_store().catalog.get("Skin Cleanser")['quantity'] == 99
+
+
+def test_failed_commit_raises_and_queues_no_invoice(open_store, monkeypatch):
+    store = open_store()
+    monkeypatch.setattr(store.backend, 'apply_changes', lambda changes: False)
+    writer = InvoiceWriter(ListSink())
+
+    with pytest.raises(OSError):
+        with writer.deferred(), store.transaction() as catalog:
+            catalog.adjust_quantity("Skin Cleanser", -5)
+            writer.submit('sales', 'INV-1', "invoice text")
+
+    assert writer._queue.empty()
+    # The catalog matches the disk again
+    assert store.catalog.get("Skin Cleanser")['quantity'] == 100
+    assert not store.catalog.take_changes()
+
+
+def test_rollback_forgets_changes_and_releases_the_lock(open_store):
+    store = open_store()
+    catalog = store.begin()
+    catalog.adjust_quantity("Vitamin C Serum", -10)
+    catalog = store.rollback()
+
+    assert catalog.get("Vitamin C Serum")['quantity'] == 200
+    catalog = store.begin()
+    catalog.adjust_quantity("Vitamin C Serum", -1)
+    assert store.commit()
+    assert open_store().catalog.get("Vitamin C Serum")['quantity'] == 199
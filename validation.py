@@ -0,0 +1,62 @@
+"""
+Validation Module
+Input rules shared by the interactive menu and batch processing.
+"""
+
+import re
+
+# A character int() accepts on its own, i.e. any Unicode decimal digit
+_DIGIT = re.compile(r'\d')
+
+def check_digit_(string):
+    """
+    Check whether a value contains a digit, which names may not.
+
+    Args:
+        string (str): The value entered
+
+    Returns:
+        bool: True if any character is a digit
+    """
+    return _DIGIT.search(string) is not None
+
+def validate_text(value, label):
+    """
+    Check a free-text field such as a product, customer or supplier name.
+
+    Args:
+        value (str): The value entered
+        label (str): Name of the field used in the error message, e.g. "Brand name"
+
+    Returns:
+        str: Error message, or None if the value is valid
+    """
+    if not value.strip():
+        return label + " cannot be empty!"
+    if check_digit_(value):
+        return "Error: " + label + " cannot be just numbers."
+    return None
+
+def validate_positive_int(value, label):
+    """
+    Check a quantity or price field.
+
+    Only whole numbers are accepted, as by int(input()) at the menu: a string
+    int() accepts or an int, but not a float such as 2.7 or a JSON true.
+
+    Args:
+        value: The value entered, as a string or number
+        label (str): Name of the field used in the error message, e.g. "quantity"
+
+    Returns:
+        tuple: (int, str) - The parsed number and an error message, one of which is None
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None, "Invalid input! Please enter a number."
+    try:
+        number = int(value)
+    except ValueError:
+        return None, "Invalid input! Please enter a number."
+    if number <= 0:
+        return None, "Invalid " + label + "! Please enter a positive number."
+    return number, None
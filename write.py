@@ -3,23 +3,427 @@ File Writing Module
 Handles all file writing operations for the product system.
 """
 
-def update_product_file(products, filename):
+import csv
+import os
+import tempfile
+import threading
+import time
+
+import metrics
+
+# How journal appends reach the disk:
+#   'fsync'    - fsync after every transaction (nothing acknowledged is lost)
+#   'group'    - fsync once per group of transactions or time interval
+#   'buffered' - leave flushing to the operating system
+DURABILITY_MODES = ('fsync', 'group', 'buffered')
+
+
+@metrics.timed('update_product_file')
+def update_product_file(products, filename, fsync=True):
     """
     Update the product file with current product information.
+
+    The rows are written to a temporary file in the same directory which is
+    then renamed over the old file, so a crash leaves either the old or the
+    new catalog on disk, never a truncated one.
     
     Args:
-        products (list): List of dictionaries containing product information
+        products (iterable): Products to write, e.g. a list or ProductCatalog
         filename (str): Name of the file to update
+        fsync (bool): Flush the new file to disk before renaming it into place
         
     Returns:
         bool: True if update was successful, False otherwise
     """
+    lines = []
+    for product in products:
+        # The supplier is only written once it is known, keeping older files unchanged
+        supplier = product.get('supplier')
+        supplier = "," + _quote(supplier) if supplier else ""
+        lines.append(f"{_quote(product['name'])},{_quote(product['brand'])},{product['quantity']},"
+                     f"{product['cost_price']},{_quote(product['origin'])}{supplier}\n")
     try:
-        with open(filename, 'w') as file:
-            for product in products:
-                line = f"{product['name']},{product['brand']},{product['quantity']},{product['cost_price']},{product['origin']}\n"
-                file.write(line)
+        atomic_write(filename, ''.join(lines).encode(), fsync)
         return True
     except Exception as e:
         print(f"Error updating file: {e}")
         return False
+
+
+def _quote(value):
+    """
+    Quote a text field the CSV way if it contains a comma or a double quote.
+    Other fields are written as they are, so existing files do not change.
+
+    Args:
+        value (str): Field value
+
+    Returns:
+        str: The value as written to the products file
+    """
+    if ',' in value or '"' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def atomic_write(filename, data, fsync=True):
+    """
+    Replace a file with new contents so readers see either the old or the new data.
+
+    The data is written to a temporary file in the same directory, which is
+    then renamed over the target. The target's permissions are kept.
+
+    Args:
+        filename (str): Name of the file to replace
+        data (bytes): New contents of the file
+        fsync (bool): Flush the file and directory to disk before returning
+
+    Returns:
+        None
+
+    Raises:
+        OSError: If the file could not be written
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    try:
+        mode = os.stat(filename).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            if fsync:
+                os.fsync(file.fileno())
+        os.chmod(temp_name, mode)
+        os.replace(temp_name, filename)
+        metrics.count('written_bytes', len(data))
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        _fsync_directory(directory)
+
+
+def file_signature(filename):
+    """
+    Identify the current version of a file that is replaced by rename.
+
+    Args:
+        filename (str): Name of the file
+
+    Returns:
+        tuple: (inode, modification time, size), or None if the file is missing
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _fsync_directory(directory):
+    """
+    Flush a directory entry so a rename inside it survives a power loss.
+
+    Args:
+        directory (str): Path of the directory
+
+    Returns:
+        None
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform (e.g. Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DurabilityPolicy:
+    """
+    Decides when committed journal records are forced to disk.
+    """
+
+    def __init__(self, mode='fsync', group_interval_ms=50, group_size=32):
+        """
+        Create a durability policy.
+
+        Args:
+            mode (str): One of DURABILITY_MODES
+            group_interval_ms (int): In 'group' mode, longest time between fsyncs
+            group_size (int): In 'group' mode, transactions per fsync
+        """
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {mode}")
+        self.mode = mode
+        self.group_interval = group_interval_ms / 1000
+        self.group_size = group_size
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def committed(self, file):
+        """
+        Called after a transaction has been written and flushed to the OS.
+
+        Args:
+            file: Open file object holding the transaction
+
+        Returns:
+            None
+        """
+        if self.mode == 'fsync':
+            os.fsync(file.fileno())
+        elif self.mode == 'group':
+            with self._lock:
+                self.pending += 1
+                due = (self.pending >= self.group_size or
+                       time.monotonic() - self.last_sync >= self.group_interval)
+                if not due and self._timer is None:
+                    # Make sure a quiet till still syncs within the interval
+                    self._timer = threading.Timer(self.group_interval, self._sync_later, [file])
+                    self._timer.daemon = True
+                    self._timer.start()
+            if due:
+                self.sync(file)
+
+    def _sync_later(self, file):
+        """
+        Timer callback that syncs transactions left waiting by a quiet period.
+
+        Args:
+            file: Open file object holding the transactions
+
+        Returns:
+            None
+        """
+        try:
+            if self.pending:
+                self.sync(file)
+        except (OSError, ValueError):
+            pass  # The journal was closed or compacted in the meantime
+
+    def sync(self, file):
+        """
+        Force any transactions still waiting for a group commit to disk.
+
+        Args:
+            file: Open file object holding the transactions
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.mode != 'buffered':
+                os.fsync(file.fileno())
+            self.pending = 0
+            self.last_sync = time.monotonic()
+
+
+class Journal:
+    """
+    Append-only log of catalog changes kept next to the products file.
+
+    Each change is written as one small CSV record, so the cost of saving a
+    sale no longer depends on the size of the catalog. Once the journal grows
+    past max_records or max_bytes it is folded back into the products file.
+    Invoice markers ('I' records) change no product, so they count towards
+    neither limit.
+    """
+
+    def __init__(self, journal_file, max_records=1000, max_bytes=64 * 1024, policy=None):
+        """
+        Open a journal, dropping any half-written record left by a crash.
+
+        Args:
+            journal_file (str): Name of the journal file
+            max_records (int): Record count that triggers compaction
+            max_bytes (int): File size in bytes that triggers compaction
+            policy (DurabilityPolicy): When appends are forced to disk, fsync by default
+        """
+        self.journal_file = journal_file
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.policy = policy or DurabilityPolicy()
+        self.record_count = 0
+        self.marker_bytes = 0
+        self.size = 0
+        self._file = None
+        self._uncommitted = False
+        self._scan()
+
+    def _scan(self):
+        """
+        Measure the journal file, cutting off a half-written last record.
+
+        Returns:
+            None
+        """
+        self.record_count = 0
+        self.marker_bytes = 0
+        self.size = 0
+        try:
+            with open(self.journal_file, 'rb+') as file:
+                data = file.read()
+                # A crash during an append can leave a partial last line
+                end = data.rfind(b'\n') + 1
+                if end != len(data):
+                    file.truncate(end)
+                lines = data[:end].splitlines(True)
+                markers = [line for line in lines if line.startswith(b'I,')]
+                self.record_count = len(lines) - len(markers)
+                self.marker_bytes = sum(map(len, markers))
+                self.size = end
+        except FileNotFoundError:
+            pass
+
+    def count(self, changes):
+        """
+        Add records written to the journal, by this or another process, to
+        the compaction thresholds.
+
+        Args:
+            changes (list): Change records as tuples
+
+        Returns:
+            None
+        """
+        markers = [change for change in changes if change[0] == 'I']
+        self.record_count += len(changes) - len(markers)
+        # 'I,' + invoice number + newline; invoice numbers need no quoting
+        self.marker_bytes += sum(len(marker[1]) + 3 for marker in markers)
+
+    def append(self, changes):
+        """
+        Append change records as returned by ProductCatalog.take_changes.
+
+        Args:
+            changes (list): Change records as tuples
+
+        Returns:
+            bool: True if the records were written, False otherwise
+        """
+        return self.write(changes) and self.commit()
+
+    @metrics.timed('journal_write')
+    def write(self, changes):
+        """
+        Append change records and hand them to the OS without forcing them to disk.
+
+        Other processes see the records as soon as this returns; call commit()
+        afterwards to apply the durability policy.
+
+        Args:
+            changes (list): Change records as tuples
+
+        Returns:
+            bool: True if the records were written, False otherwise
+        """
+        if not changes:
+            return True
+        try:
+            if self._file is None:
+                self._file = open(self.journal_file, 'a', newline='')
+                self._writer = csv.writer(self._file, lineterminator='\n')
+            self._writer.writerows(changes)
+            self._file.flush()
+            size = self._file.tell()
+            metrics.count('written_bytes', size - self.size)
+            self.size = size
+            self.count(changes)
+            self._uncommitted = True
+            return True
+        except Exception as e:
+            print(f"Error writing journal: {e}")
+            return False
+
+    @metrics.timed('journal_commit')
+    def commit(self):
+        """
+        Force the records written since the last commit to disk as the
+        durability policy requires.
+
+        Returns:
+            bool: True if the records are committed, False otherwise
+        """
+        if not self._uncommitted or self._file is None:
+            return True
+        self._uncommitted = False
+        try:
+            self.policy.committed(self._file)
+            return True
+        except Exception as e:
+            print(f"Error writing journal: {e}")
+            return False
+
+    def reopen(self):
+        """
+        Close the journal and measure it again, e.g. after another process
+        compacted it.
+
+        Returns:
+            None
+        """
+        self.close()
+        self._scan()
+
+    def needs_compaction(self):
+        """
+        Check whether the journal has reached its size or record threshold.
+
+        Returns:
+            bool: True if the journal should be folded into the products file
+        """
+        return self.record_count >= self.max_records or self.size - self.marker_bytes >= self.max_bytes
+
+    @metrics.timed('journal_compact')
+    def compact(self, products, filename):
+        """
+        Fold the journal into the products file and start an empty journal.
+
+        Args:
+            products (iterable): Current products, already including the journal
+            filename (str): Name of the products file
+
+        Returns:
+            bool: True if compaction was successful, False otherwise
+        """
+        if not update_product_file(products, filename, fsync=self.policy.mode != 'buffered'):
+            return False
+        self.close()
+        try:
+            # Replaying records is idempotent, so a crash before this point
+            # only means the same records are applied again on the next start.
+            os.remove(self.journal_file)
+        except FileNotFoundError:
+            pass
+        self.record_count = 0
+        self.marker_bytes = 0
+        self.size = 0
+        return True
+
+    def close(self):
+        """
+        Flush outstanding group commits and close the journal file.
+
+        Returns:
+            None
+        """
+        if self._file is not None:
+            self.policy.sync(self._file)
+            self._file.close()
+            self._file = None
+        self._uncommitted = False